@@ -0,0 +1,23 @@
+"""add optimistic concurrency version to tasks
+
+Revision ID: 0004_add_task_version
+Revises: 0003_add_event_threading
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_add_task_version"
+down_revision = "0003_add_event_threading"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("tasks", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    op.drop_column("tasks", "version")
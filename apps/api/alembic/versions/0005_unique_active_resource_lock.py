@@ -0,0 +1,42 @@
+"""enforce one active lock per resource key
+
+Revision ID: 0005_unique_active_resource_lock
+Revises: 0004_add_task_version
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_unique_active_resource_lock"
+down_revision = "0004_add_task_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keep only the newest active lock per key before the index can be built.
+    op.execute(
+        """
+        UPDATE resource_locks SET state = 'expired'
+        WHERE state = 'active' AND id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY resource_key ORDER BY created_at DESC) AS rn
+                FROM resource_locks WHERE state = 'active'
+            ) ranked WHERE rn = 1
+        )
+        """
+    )
+    op.create_index(
+        "uq_resource_locks_active_key",
+        "resource_locks",
+        ["resource_key"],
+        unique=True,
+        sqlite_where=sa.text("state = 'active'"),
+        postgresql_where=sa.text("state = 'active'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_resource_locks_active_key", table_name="resource_locks")
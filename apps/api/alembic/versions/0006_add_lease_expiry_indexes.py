@@ -0,0 +1,26 @@
+"""index lease deadlines for the expiry sweep
+
+Revision ID: 0006_add_lease_expiry_indexes
+Revises: 0005_unique_active_resource_lock
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+
+
+revision = "0006_add_lease_expiry_indexes"
+down_revision = "0005_unique_active_resource_lock"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_resource_locks_state_expires_at", "resource_locks", ["state", "expires_at"])
+    op.create_index("ix_task_claims_state_expires_at", "task_claims", ["state", "expires_at"])
+    op.create_index("ix_agent_sessions_status_expires_at", "agent_sessions", ["status", "expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_agent_sessions_status_expires_at", table_name="agent_sessions")
+    op.drop_index("ix_task_claims_state_expires_at", table_name="task_claims")
+    op.drop_index("ix_resource_locks_state_expires_at", table_name="resource_locks")
@@ -0,0 +1,45 @@
+"""add shared/exclusive mode to locks and claims
+
+Revision ID: 0007_add_lock_modes
+Revises: 0006_add_lease_expiry_indexes
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_add_lock_modes"
+down_revision = "0006_add_lease_expiry_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("resource_locks", sa.Column("mode", sa.String(length=20), nullable=False, server_default="exclusive"))
+    op.add_column("task_claims", sa.Column("mode", sa.String(length=20), nullable=False, server_default="exclusive"))
+    # Only exclusive locks are single-owner; shared holders may coexist.
+    op.drop_index("uq_resource_locks_active_key", table_name="resource_locks")
+    op.create_index(
+        "uq_resource_locks_active_key",
+        "resource_locks",
+        ["resource_key"],
+        unique=True,
+        sqlite_where=sa.text("state = 'active' AND mode = 'exclusive'"),
+        postgresql_where=sa.text("state = 'active' AND mode = 'exclusive'"),
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE resource_locks SET state = 'released' WHERE state = 'active' AND mode = 'shared'")
+    op.drop_index("uq_resource_locks_active_key", table_name="resource_locks")
+    op.create_index(
+        "uq_resource_locks_active_key",
+        "resource_locks",
+        ["resource_key"],
+        unique=True,
+        sqlite_where=sa.text("state = 'active'"),
+        postgresql_where=sa.text("state = 'active'"),
+    )
+    op.drop_column("task_claims", "mode")
+    op.drop_column("resource_locks", "mode")
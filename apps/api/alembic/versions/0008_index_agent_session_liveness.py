@@ -0,0 +1,26 @@
+"""index agent sessions for the set-based stale sweep
+
+Revision ID: 0008_index_agent_session_liveness
+Revises: 0007_add_lock_modes
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+
+
+revision = "0008_index_agent_session_liveness"
+down_revision = "0007_add_lock_modes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_agent_sessions_agent_status_expires_at",
+        "agent_sessions",
+        ["agent_id", "status", "expires_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_agent_sessions_agent_status_expires_at", table_name="agent_sessions")
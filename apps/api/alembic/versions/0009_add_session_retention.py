@@ -0,0 +1,45 @@
+"""current session pointer, session start times and uptime summaries
+
+Revision ID: 0009_add_session_retention
+Revises: 0008_index_agent_session_liveness
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_add_session_retention"
+down_revision = "0008_index_agent_session_liveness"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("agents", sa.Column("current_session_id", sa.String(length=36), nullable=True))
+    op.add_column("agent_sessions", sa.Column("started_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_table(
+        "agent_uptime",
+        sa.Column("agent_id", sa.String(length=36), sa.ForeignKey("agents.id"), primary_key=True),
+        sa.Column("sessions", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("uptime_seconds", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("first_started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("compacted_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE agents SET current_session_id = (
+            SELECT s.id FROM agent_sessions s
+            WHERE s.agent_id = agents.id
+            ORDER BY s.last_heartbeat_at DESC
+            LIMIT 1
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("agent_uptime")
+    op.drop_column("agent_sessions", "started_at")
+    op.drop_column("agents", "current_session_id")
@@ -0,0 +1,33 @@
+"""runtime leases for leader election across replicas
+
+Revision ID: 0010_add_runtime_leases
+Revises: 0009_add_session_retention
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_add_runtime_leases"
+down_revision = "0009_add_session_retention"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "runtime_leases",
+        sa.Column("name", sa.String(length=120), primary_key=True),
+        sa.Column("holder_id", sa.String(length=200), nullable=False),
+        sa.Column("fencing_token", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("acquired_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("renewed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_runtime_leases_expires_at", "runtime_leases", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_runtime_leases_expires_at", table_name="runtime_leases")
+    op.drop_table("runtime_leases")
@@ -0,0 +1,23 @@
+"""footprint locked for each dispatched task claim
+
+Revision ID: 0011_add_task_claim_footprint
+Revises: 0010_add_runtime_leases
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011_add_task_claim_footprint"
+down_revision = "0010_add_runtime_leases"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("task_claims", sa.Column("footprint", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("task_claims", "footprint")
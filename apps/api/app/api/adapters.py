@@ -43,4 +43,4 @@ def execute(
 
 @router.post('/tick')
 def tick(max_tasks_per_agent: int = Query(default=2, ge=1, le=10)) -> dict:
-    return adapter_runtime.run_once_sync(max_tasks_per_agent=max_tasks_per_agent)
+    return adapter_runtime.run_once_sync(max_tasks_per_agent=max_tasks_per_agent, wait=True)
@@ -4,8 +4,15 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_db_session, require_auth
-from app.schemas.common import AgentHeartbeatRequest, AgentRegisterRequest, AgentResponse
+from app.schemas.common import (
+    AgentBatchHeartbeatRequest,
+    AgentBatchHeartbeatResponse,
+    AgentHeartbeatRequest,
+    AgentRegisterRequest,
+    AgentResponse,
+)
 from app.services.agents import AgentService
+from app.services.session_retention import SessionRetentionService
 
 router = APIRouter(prefix='/v1/agents', tags=['agents'], dependencies=[Depends(require_auth)])
 
@@ -23,6 +30,20 @@ def register_agent(payload: AgentRegisterRequest, db: Session = Depends(get_db_s
     return AgentResponse.model_validate(agent, from_attributes=True)
 
 
+@router.post('/heartbeats', response_model=AgentBatchHeartbeatResponse)
+def heartbeat_many(payload: AgentBatchHeartbeatRequest, db: Session = Depends(get_db_session)) -> AgentBatchHeartbeatResponse:
+    result = AgentService(db).heartbeat_many(
+        beats=[item.model_dump() for item in payload.heartbeats],
+        renew_leases=payload.renew_leases,
+        lock_ttl=payload.lock_ttl,
+    )
+    return AgentBatchHeartbeatResponse(
+        agents=[AgentResponse.model_validate(item, from_attributes=True) for item in result['agents']],
+        renewed_locks=result['renewed_locks'],
+        renewed_claims=result['renewed_claims'],
+    )
+
+
 @router.post('/{agent_id}/heartbeat', response_model=AgentResponse)
 def heartbeat(agent_id: str, payload: AgentHeartbeatRequest, db: Session = Depends(get_db_session)) -> AgentResponse:
     agent = AgentService(db).heartbeat(agent_id=agent_id, status=payload.status, current_task=payload.current_task)
@@ -36,3 +57,8 @@ def list_agents(
 ) -> list[AgentResponse]:
     agents = AgentService(db).list(repo_id=repo_id)
     return [AgentResponse.model_validate(item, from_attributes=True) for item in agents]
+
+
+@router.get('/{agent_id}/uptime')
+def agent_uptime(agent_id: str, db: Session = Depends(get_db_session)) -> dict:
+    return SessionRetentionService(db).uptime(agent_id)
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
+from contextlib import contextmanager
+
 from fastapi import Depends
 from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
 
+from app.config.settings import get_settings
 from app.db import get_db
 from app.security.auth import require_token
 
@@ -11,5 +16,27 @@ def get_db_session(db: Session = Depends(get_db)) -> Session:
     return db
 
 
+@contextmanager
+def short_lived_session(connection: HTTPConnection) -> Iterator[Session]:
+    """A session for a single query on a long-lived stream, closed before streaming starts.
+
+    Honours dependency overrides of `get_db`, like `Depends(get_db_session)` does.
+    """
+    provider = connection.app.dependency_overrides.get(get_db, get_db)
+    sessions = provider()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
+
+
 def require_auth(_: None = Depends(require_token)) -> None:
     return None
+
+
+def authorize_ws_token(*, token: str | None, authorization: str | None) -> bool:
+    expected = get_settings().local_token
+    resolved = token
+    if not resolved and authorization and authorization.lower().startswith('bearer '):
+        resolved = authorization[7:]
+    return resolved == expected
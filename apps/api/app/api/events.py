@@ -6,46 +6,23 @@ from datetime import datetime
 
 from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db_session, require_auth
-from app.config.settings import get_settings
-from app.models.entities import Agent
+from app.api.deps import authorize_ws_token, get_db_session, require_auth
 from app.schemas.common import EventLogRequest, EventResponse
-from app.services.errors import AppError, ERROR_VALIDATION
+from app.services.agent_directory import resolve_agent_ref
 from app.services.event_stream import event_stream_broker
 from app.services.events import EventService
 
 router = APIRouter(prefix='/v1/events', tags=['events'], dependencies=[Depends(require_auth)])
 
 
-def _resolve_agent_ref(db: Session, *, reference: str, repo_id: str | None) -> str:
-    by_id = db.get(Agent, reference)
-    if by_id:
-        return by_id.id
-
-    stmt = select(Agent).where(Agent.name == reference)
-    if repo_id is not None:
-        stmt = stmt.where(Agent.repo_id == repo_id)
-    by_name = db.execute(stmt.order_by(Agent.created_at.desc())).scalars().first()
-    if by_name:
-        return by_name.id
-
-    raise AppError(
-        code=ERROR_VALIDATION,
-        message='Unknown recipient reference',
-        status_code=400,
-        details={'reference': reference},
-    )
-
-
 @router.post('', response_model=EventResponse)
 async def log_event(payload: EventLogRequest, db: Session = Depends(get_db_session)) -> EventResponse:
     message_payload = payload.payload or {}
 
     recipient_ref = payload.recipient_id or message_payload.get('recipient_id') or message_payload.get('to')
-    recipient_id = _resolve_agent_ref(db, reference=recipient_ref, repo_id=payload.repo_id) if recipient_ref else None
+    recipient_id = resolve_agent_ref(db, reference=recipient_ref, repo_id=payload.repo_id) if recipient_ref else None
     parent_message_id = payload.parent_message_id or message_payload.get('parent_message_id') or message_payload.get('reply_to')
     channel = payload.channel or message_payload.get('channel')
 
@@ -65,14 +42,6 @@ async def log_event(payload: EventLogRequest, db: Session = Depends(get_db_sessi
     return response
 
 
-def _authorize_ws_token(*, token: str | None, authorization: str | None) -> bool:
-    expected = get_settings().local_token
-    resolved = token
-    if not resolved and authorization and authorization.lower().startswith('bearer '):
-        resolved = authorization[7:]
-    return resolved == expected
-
-
 @router.websocket('/ws')
 async def websocket_events(
     websocket: WebSocket,
@@ -82,7 +51,7 @@ async def websocket_events(
 ) -> None:
     token = websocket.query_params.get('token') or websocket.headers.get('x-repomesh-token')
     authorization = websocket.headers.get('authorization')
-    if not _authorize_ws_token(token=token, authorization=authorization):
+    if not authorize_ws_token(token=token, authorization=authorization):
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason='Invalid API token')
         return
 
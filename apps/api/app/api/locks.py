@@ -1,19 +1,65 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.api.deps import get_db_session, require_auth
-from app.schemas.common import LockAcquireRequest, LockReleaseRequest, LockRenewRequest, LockResponse
+from app.schemas.common import (
+    LockAcquireRequest,
+    LockBatchAcquireRequest,
+    LockReleaseRequest,
+    LockRenewRequest,
+    LockResponse,
+)
+from app.services.lock_stats import lock_stats_for
+from app.services.lock_table import LockGrant
 from app.services.locks import LockService
 
 router = APIRouter(prefix='/v1/locks', tags=['locks'], dependencies=[Depends(require_auth)])
 
 
 @router.post('/acquire', response_model=LockResponse)
-def acquire_lock(payload: LockAcquireRequest, db: Session = Depends(get_db_session)) -> LockResponse:
-    lock = LockService(db).acquire(resource_key=payload.resource_key, agent_id=payload.agent_id, ttl=payload.ttl)
-    return LockResponse.model_validate(lock, from_attributes=True)
+async def acquire_lock(payload: LockAcquireRequest, db: Session = Depends(get_db_session)) -> LockResponse:
+    # Waiting callers park on the event loop; a parked worker thread each could starve
+    # the threadpool of the very release they wait for.
+    service = await run_in_threadpool(LockService, db)
+    grant = await service.reserve(
+        resource_key=payload.resource_key,
+        agent_id=payload.agent_id,
+        ttl=payload.ttl,
+        wait_seconds=payload.wait_seconds,
+        mode=payload.mode,
+    )
+    try:
+        return await run_in_threadpool(_write_grant, service, grant)
+    except BaseException:
+        # Cancelled or failed before the row was written: drop the in-memory
+        # reservation so it does not hold the key until its lease lapses.
+        if grant.created:
+            service.table.forget(grant.entry.id)
+        raise
+
+
+def _write_grant(service: LockService, grant: LockGrant) -> LockResponse:
+    lock = service.write_grant(grant)
+    response = LockResponse.model_validate(lock, from_attributes=True)
+    response.waited_ms = round(grant.waited_seconds * 1000)
+    response.queue_position = grant.queue_position
+    return response
+
+
+@router.post('/batch', response_model=list[LockResponse])
+def acquire_locks(payload: LockBatchAcquireRequest, db: Session = Depends(get_db_session)) -> list[LockResponse]:
+    locks = LockService(db).acquire_many(
+        resource_keys=payload.resource_keys, agent_id=payload.agent_id, ttl=payload.ttl, mode=payload.mode
+    )
+    return [LockResponse.model_validate(lock, from_attributes=True) for lock in locks]
+
+
+@router.get('/stats')
+def lock_stats(top: int = Query(default=50, ge=1, le=1000), db: Session = Depends(get_db_session)) -> dict:
+    return lock_stats_for(db).report(top=top)
 
 
 @router.post('/{lock_id}/renew', response_model=LockResponse)
@@ -4,14 +4,34 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_db_session, require_auth
-from app.services.agents import AgentService
-from app.services.tasks import TaskService
+from app.services.expiry import ExpiryService
+from app.services.expiry_runtime import expiry_runtime
+from app.services.session_retention import SessionRetentionService
 
 router = APIRouter(prefix='/v1/recovery', tags=['recovery'], dependencies=[Depends(require_auth)])
 
 
 @router.post('/reconcile')
 def reconcile(db: Session = Depends(get_db_session)) -> dict:
-    stale_sessions = AgentService(db).mark_stale_sessions()
-    stale_claims = TaskService(db).expire_stale_claims()
-    return {'stale_sessions': stale_sessions, 'stale_claims': stale_claims}
+    expired = ExpiryService(db).run_due(force=True)
+    return {'stale_sessions': expired['sessions'], 'stale_claims': expired['claims'], 'expired_locks': expired['locks']}
+
+
+@router.post('/sessions/compact')
+def compact_sessions(db: Session = Depends(get_db_session)) -> dict:
+    return SessionRetentionService(db).compact()
+
+
+@router.get('/expiry/status')
+def expiry_status() -> dict:
+    return expiry_runtime.status()
+
+
+@router.post('/expiry/start')
+async def expiry_start() -> dict:
+    return await expiry_runtime.start()
+
+
+@router.post('/expiry/stop')
+async def expiry_stop() -> dict:
+    return await expiry_runtime.stop()
@@ -1,15 +1,49 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, WebSocket, WebSocketDisconnect, status as ws_status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
 
-from app.api.deps import get_db_session, require_auth
-from app.schemas.common import TaskClaimRequest, TaskCreateRequest, TaskResponse, TaskUpdateRequest
+from app.api.deps import authorize_ws_token, get_db_session, require_auth, short_lived_session
+from app.schemas.common import (
+    TaskBatchUpdateRequest,
+    TaskClaimRequest,
+    TaskCreateRequest,
+    TaskResponse,
+    TaskUpdateRequest,
+)
+from app.services.change_feed import CHANGE_CHANNEL
+from app.services.errors import AppError, ERROR_VALIDATION
+from app.services.event_stream import event_stream_broker
+from app.services.task_watch import TaskWatch
 from app.services.tasks import TaskService
 
 router = APIRouter(prefix='/v1/tasks', tags=['tasks'], dependencies=[Depends(require_auth)])
 
 
+def _parse_if_match(value: str | None) -> int | None:
+    if value is None:
+        return None
+    tag = value.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    try:
+        return int(tag)
+    except ValueError as exc:
+        raise AppError(
+            code=ERROR_VALIDATION,
+            message='If-Match must carry a task version, for example "3"',
+            status_code=400,
+            details={'if_match': value},
+        ) from exc
+
+
 @router.post('', response_model=TaskResponse)
 def create_task(payload: TaskCreateRequest, db: Session = Depends(get_db_session)) -> TaskResponse:
     task = TaskService(db).create(
@@ -34,6 +68,98 @@ def list_tasks(
     return [TaskResponse.model_validate(item, from_attributes=True) for item in tasks]
 
 
+def _serialize_task(task) -> dict:
+    return TaskResponse.model_validate(task, from_attributes=True).model_dump(mode='json')
+
+
+def _snapshot(watch: TaskWatch, connection: HTTPConnection) -> dict:
+    # The watch outlives any one query, so it must not hold a pooled connection.
+    with short_lived_session(connection) as db:
+        return watch.snapshot(db, serialize=_serialize_task)
+
+
+async def _open_watch(watch: TaskWatch, connection: HTTPConnection, since_version: int | None) -> list[dict]:
+    """Initial messages for a watch: a replay of missed diffs when possible, else a snapshot."""
+    if since_version is not None:
+        replay = watch.resume(since_version)
+        if replay is not None:
+            return replay
+    return [await run_in_threadpool(_snapshot, watch, connection)]
+
+
+@router.get('/watch')
+async def watch_tasks(
+    request: Request,
+    status: str | None = Query(default=None),
+    scope: str | None = Query(default=None),
+    assignee: str | None = Query(default=None),
+    since_version: int | None = Query(default=None),
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    if since_version is None and last_event_id and last_event_id.isdigit():
+        since_version = int(last_event_id)
+
+    watch = TaskWatch(status=status, scope=scope, assignee=assignee)
+    # Subscribe before the snapshot so no change can fall between the two.
+    subscriber = await event_stream_broker.subscribe(recipient_id=None, channel=CHANGE_CHANNEL, include_broadcast=True)
+    try:
+        initial = await _open_watch(watch, request, since_version)
+    except Exception:
+        await event_stream_broker.unsubscribe(subscriber.id)
+        raise
+
+    def _frame(message: dict) -> str:
+        return f"id: {message['version']}\ndata: {json.dumps(message)}\n\n"
+
+    async def _generator():
+        try:
+            for message in initial:
+                yield _frame(message)
+            while True:
+                try:
+                    record = await asyncio.wait_for(subscriber.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                message = watch.diff(record)
+                if message is not None:
+                    yield _frame(message)
+        finally:
+            await event_stream_broker.unsubscribe(subscriber.id)
+
+    return StreamingResponse(_generator(), media_type='text/event-stream')
+
+
+@router.websocket('/watch/ws')
+async def watch_tasks_ws(
+    websocket: WebSocket,
+    status: str | None = Query(default=None),
+    scope: str | None = Query(default=None),
+    assignee: str | None = Query(default=None),
+    since_version: int | None = Query(default=None),
+) -> None:
+    token = websocket.query_params.get('token') or websocket.headers.get('x-repomesh-token')
+    authorization = websocket.headers.get('authorization')
+    if not authorize_ws_token(token=token, authorization=authorization):
+        await websocket.close(code=ws_status.WS_1008_POLICY_VIOLATION, reason='Invalid API token')
+        return
+
+    await websocket.accept()
+    watch = TaskWatch(status=status, scope=scope, assignee=assignee)
+    subscriber = await event_stream_broker.subscribe(recipient_id=None, channel=CHANGE_CHANNEL, include_broadcast=True)
+    try:
+        for message in await _open_watch(watch, websocket, since_version):
+            await websocket.send_json(message)
+        while True:
+            message = watch.diff(await subscriber.queue.get())
+            if message is not None:
+                await websocket.send_json(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await event_stream_broker.unsubscribe(subscriber.id)
+
+
 @router.post('/{task_id}/claim')
 def claim_task(task_id: str, payload: TaskClaimRequest, db: Session = Depends(get_db_session)) -> dict:
     claim = TaskService(db).claim(
@@ -41,24 +167,41 @@ def claim_task(task_id: str, payload: TaskClaimRequest, db: Session = Depends(ge
         agent_id=payload.agent_id,
         resource_key=payload.resource_key,
         lease_ttl=payload.lease_ttl,
+        mode=payload.mode,
     )
     return {
         'id': claim.id,
         'task_id': claim.task_id,
         'agent_id': claim.agent_id,
         'resource_key': claim.resource_key,
+        'mode': claim.mode,
         'state': claim.state,
         'expires_at': claim.expires_at,
     }
 
 
+@router.patch('', response_model=list[TaskResponse])
+def update_tasks(payload: TaskBatchUpdateRequest, db: Session = Depends(get_db_session)) -> list[TaskResponse]:
+    tasks = TaskService(db).update_many([item.model_dump() for item in payload.updates])
+    return [TaskResponse.model_validate(item, from_attributes=True) for item in tasks]
+
+
 @router.patch('/{task_id}', response_model=TaskResponse)
-def update_task(task_id: str, payload: TaskUpdateRequest, db: Session = Depends(get_db_session)) -> TaskResponse:
+def update_task(
+    task_id: str,
+    payload: TaskUpdateRequest,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db_session),
+) -> TaskResponse:
+    expected_version = _parse_if_match(if_match)
     task = TaskService(db).update(
         task_id=task_id,
         status=payload.status,
         progress=payload.progress,
         summary=payload.summary,
         blocked_reason=payload.blocked_reason,
+        expected_version=expected_version if expected_version is not None else payload.expected_version,
     )
+    response.headers['ETag'] = f'"{task.version}"'
     return TaskResponse.model_validate(task, from_attributes=True)
@@ -19,13 +19,29 @@ class Settings(BaseSettings):
     orchestrator_autostart: bool = Field(default=False, alias='ORCHESTRATOR_AUTOSTART')
     orchestrator_poll_seconds: int = Field(default=5, alias='ORCHESTRATOR_POLL_SECONDS')
     orchestrator_dispatch_limit: int = Field(default=10, alias='ORCHESTRATOR_DISPATCH_LIMIT')
+    orchestrator_debounce_seconds: float = Field(default=0.25, alias='ORCHESTRATOR_DEBOUNCE_SECONDS')
+    orchestrator_default_max_concurrency: int = Field(default=0, alias='ORCHESTRATOR_DEFAULT_MAX_CONCURRENCY')
+    orchestrator_priority_aging_seconds: float = Field(default=300.0, alias='ORCHESTRATOR_PRIORITY_AGING_SECONDS')
+    orchestrator_shards: int = Field(default=1, alias='ORCHESTRATOR_SHARDS')
+    leader_election: bool = Field(default=False, alias='LEADER_ELECTION')
+    leader_lease_seconds: float = Field(default=10.0, alias='LEADER_LEASE_SECONDS')
     adapter_autostart: bool = Field(default=False, alias='ADAPTER_AUTOSTART')
     adapter_poll_seconds: int = Field(default=5, alias='ADAPTER_POLL_SECONDS')
     adapter_max_tasks_per_agent_cycle: int = Field(default=2, alias='ADAPTER_MAX_TASKS_PER_AGENT_CYCLE')
     adapter_default_timeout_seconds: int = Field(default=600, alias='ADAPTER_DEFAULT_TIMEOUT_SECONDS')
+    adapter_max_processes: int = Field(default=0, alias='ADAPTER_MAX_PROCESSES')
+    adapter_max_processes_per_agent: int = Field(default=0, alias='ADAPTER_MAX_PROCESSES_PER_AGENT')
+    adapter_task_workers: int = Field(default=0, alias='ADAPTER_TASK_WORKERS')
     adapter_workspace_root: str = Field(default='.', alias='ADAPTER_WORKSPACE_ROOT')
     adapter_allowed_commands_csv: str = Field(default='', alias='ADAPTER_ALLOWED_COMMANDS')
     adapter_prepass_commands_csv: str = Field(default='', alias='ADAPTER_PREPASS_COMMANDS')
+    expiry_autostart: bool = Field(default=True, alias='EXPIRY_AUTOSTART')
+    expiry_max_sleep_seconds: float = Field(default=5.0, alias='EXPIRY_MAX_SLEEP_SECONDS')
+    expiry_batch_size: int = Field(default=500, alias='EXPIRY_BATCH_SIZE')
+    lock_max_blocking_waiters: int = Field(default=8, alias='LOCK_MAX_BLOCKING_WAITERS')
+    heartbeat_flush_seconds: float = Field(default=5.0, alias='HEARTBEAT_FLUSH_SECONDS')
+    session_retention_hours: float = Field(default=24.0, alias='SESSION_RETENTION_HOURS')
+    session_compaction_interval_seconds: int = Field(default=3600, alias='SESSION_COMPACTION_INTERVAL_SECONDS')
     summarizer_autostart: bool = Field(default=False, alias='SUMMARIZER_AUTOSTART')
     summarizer_poll_seconds: int = Field(default=30, alias='SUMMARIZER_POLL_SECONDS')
     summarizer_max_tasks_cycle: int = Field(default=10, alias='SUMMARIZER_MAX_TASKS_CYCLE')
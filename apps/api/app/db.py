@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import threading
+from collections.abc import Callable
+from typing import Any, TypeVar
+from weakref import WeakKeyDictionary
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, SessionTransaction, sessionmaker
 
 from app.config.settings import get_settings
 from app.models.base import Base
@@ -11,6 +17,11 @@ settings = get_settings()
 engine = create_engine(settings.database_url, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+T = TypeVar('T')
+
+_engine_state: WeakKeyDictionary[Engine, dict[str, Any]] = WeakKeyDictionary()
+_engine_state_lock = threading.Lock()
+
 
 def get_db() -> Session:
     db = SessionLocal()
@@ -22,3 +33,38 @@ def get_db() -> Session:
 
 def create_all() -> None:
     Base.metadata.create_all(bind=engine)
+
+
+def engine_state(db: Session, name: str, factory: Callable[[], T]) -> T:
+    """Process-local state scoped to the database a session is bound to."""
+    bound = db.get_bind()
+    key = getattr(bound, 'engine', bound)
+    with _engine_state_lock:
+        state = _engine_state.setdefault(key, {})
+        if name not in state:
+            state[name] = factory()
+        return state[name]
+
+
+def ends_transaction(session: Session) -> bool:
+    """Whether a commit/rollback hook fires for the outermost transaction rather than a SAVEPOINT."""
+    root = session.get_transaction()
+    return root is None or not root.is_active
+
+
+def begin_savepoint(db: Session) -> SessionTransaction:
+    """`db.begin_nested()`, first opening the outer transaction on pysqlite.
+
+    pysqlite defers BEGIN to the first write, so a SAVEPOINT issued before one would start
+    the transaction itself and its RELEASE would commit everything written so far.
+    """
+    connection = db.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+    return db.begin_nested()
+
+
+def existing_engine_state(bind: Any, name: str) -> Any | None:
+    key = getattr(bind, 'engine', bind)
+    with _engine_state_lock:
+        return _engine_state.get(key, {}).get(name)
@@ -6,11 +6,14 @@ from fastapi.responses import JSONResponse
 from app.api import adapters, agents, context, events, health, locks, orchestrator, recovery, summarizer, tasks
 from app.config.logging import configure_logging
 from app.config.settings import get_settings
-from app.db import create_all
+from app.db import SessionLocal, create_all
 from app.mcp import http
 from app.services.adapter_runtime import adapter_runtime
 from app.services.errors import AppError
+from app.services.expiry_runtime import expiry_runtime
+from app.services.lock_table import lock_table_for
 from app.services.orchestrator_runtime import orchestrator_runtime
+from app.services.session_table import session_table_for
 from app.services.summarizer_runtime import summarizer_runtime
 
 configure_logging()
@@ -33,6 +36,9 @@ app.include_router(http.router)
 @app.on_event('startup')
 async def on_startup() -> None:
     create_all()
+    with SessionLocal() as db:
+        # Recover the in-memory lock table before the first request needs it.
+        lock_table_for(db)
     settings = get_settings()
     if settings.orchestrator_autostart:
         await orchestrator_runtime.start()
@@ -40,6 +46,8 @@ async def on_startup() -> None:
         await adapter_runtime.start()
     if settings.summarizer_autostart:
         await summarizer_runtime.start()
+    if settings.expiry_autostart:
+        await expiry_runtime.start()
 
 
 @app.on_event('shutdown')
@@ -47,6 +55,9 @@ async def on_shutdown() -> None:
     await orchestrator_runtime.stop()
     await adapter_runtime.stop()
     await summarizer_runtime.stop()
+    await expiry_runtime.stop()
+    with SessionLocal() as db:
+        session_table_for(db).flush(db)
 
 
 @app.exception_handler(AppError)
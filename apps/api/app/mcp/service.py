@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import select
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from app.models.entities import Agent
+from app.schemas.common import MAX_PRIORITY, AgentBatchHeartbeatRequest, TaskBatchUpdateRequest
 from app.services.adapters import AdapterService
+from app.services.agent_directory import resolve_agent_ref
 from app.services.agents import AgentService
 from app.services.adapter_runtime import adapter_runtime
 from app.services.code_tools import CodeToolsService
@@ -50,6 +51,30 @@ TOOL_DEFINITIONS = [
             },
         },
     },
+    {
+        'name': 'agent.heartbeat_many',
+        'description': 'Record heartbeats for many agents in one transaction, optionally renewing their locks and claims.',
+        'inputSchema': {
+            'type': 'object',
+            'required': ['heartbeats'],
+            'properties': {
+                'heartbeats': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'required': ['agent_id', 'status'],
+                        'properties': {
+                            'agent_id': {'type': 'string'},
+                            'status': {'type': 'string'},
+                            'current_task': {'type': ['string', 'null']},
+                        },
+                    },
+                },
+                'renew_leases': {'type': 'boolean'},
+                'lock_ttl': {'type': 'integer'},
+            },
+        },
+    },
     {'name': 'agent.list', 'description': 'List agents.', 'inputSchema': {'type': 'object', 'properties': {'repo_id': {'type': ['string', 'null']}}}},
     {
         'name': 'task.create',
@@ -61,7 +86,7 @@ TOOL_DEFINITIONS = [
                 'goal': {'type': 'string'},
                 'description': {'type': 'string'},
                 'scope': {'type': 'object'},
-                'priority': {'type': 'integer'},
+                'priority': {'type': 'integer', 'minimum': 1, 'maximum': MAX_PRIORITY},
                 'acceptance_criteria': {'type': ['string', 'null']},
                 'repo_id': {'type': ['string', 'null']},
             },
@@ -79,6 +104,7 @@ TOOL_DEFINITIONS = [
                 'agent_id': {'type': 'string'},
                 'resource_key': {'type': 'string'},
                 'lease_ttl': {'type': 'integer'},
+                'mode': {'type': 'string', 'enum': ['shared', 'exclusive']},
             },
         },
     },
@@ -94,6 +120,32 @@ TOOL_DEFINITIONS = [
                 'progress': {'type': 'integer'},
                 'summary': {'type': 'string'},
                 'blocked_reason': {'type': 'string'},
+                'expected_version': {'type': ['integer', 'null']},
+            },
+        },
+    },
+    {
+        'name': 'task.update_many',
+        'description': 'Apply several task updates in one transaction (all or nothing).',
+        'inputSchema': {
+            'type': 'object',
+            'required': ['updates'],
+            'properties': {
+                'updates': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'required': ['task_id'],
+                        'properties': {
+                            'task_id': {'type': 'string'},
+                            'status': {'type': 'string'},
+                            'progress': {'type': 'integer'},
+                            'summary': {'type': 'string'},
+                            'blocked_reason': {'type': 'string'},
+                            'expected_version': {'type': ['integer', 'null']},
+                        },
+                    },
+                },
             },
         },
     },
@@ -107,6 +159,22 @@ TOOL_DEFINITIONS = [
                 'resource_key': {'type': 'string'},
                 'agent_id': {'type': 'string'},
                 'ttl': {'type': 'integer'},
+                'wait_seconds': {'type': 'number', 'description': 'Queue for the key up to this long instead of failing fast'},
+                'mode': {'type': 'string', 'enum': ['shared', 'exclusive']},
+            },
+        },
+    },
+    {
+        'name': 'lock.acquire_many',
+        'description': 'Acquire several resource locks atomically: all of them or none.',
+        'inputSchema': {
+            'type': 'object',
+            'required': ['resource_keys', 'agent_id'],
+            'properties': {
+                'resource_keys': {'type': 'array', 'items': {'type': 'string'}},
+                'agent_id': {'type': 'string'},
+                'ttl': {'type': 'integer'},
+                'mode': {'type': 'string', 'enum': ['shared', 'exclusive']},
             },
         },
     },
@@ -201,25 +269,6 @@ class MCPToolService:
             'latest_seen_at': latest_seen_at.isoformat() if latest_seen_at else arguments.get('since'),
         }
 
-    def _resolve_agent_ref(self, *, reference: str, repo_id: str | None) -> str:
-        by_id = self.db.get(Agent, reference)
-        if by_id:
-            return by_id.id
-
-        stmt = select(Agent).where(Agent.name == reference)
-        if repo_id is not None:
-            stmt = stmt.where(Agent.repo_id == repo_id)
-        by_name = self.db.execute(stmt.order_by(Agent.created_at.desc())).scalars().first()
-        if by_name:
-            return by_name.id
-
-        raise AppError(
-            code=ERROR_VALIDATION,
-            message='Unknown recipient reference',
-            status_code=400,
-            details={'reference': reference},
-        )
-
     def _normalize_event_log_arguments(self, arguments: dict) -> dict:
         payload = arguments.get('payload') or {}
         repo_id = arguments.get('repo_id')
@@ -234,7 +283,7 @@ class MCPToolService:
             'task_id': arguments.get('task_id'),
             'agent_id': arguments.get('agent_id'),
             'repo_id': repo_id,
-            'recipient_id': self._resolve_agent_ref(reference=recipient_ref, repo_id=repo_id) if recipient_ref else None,
+            'recipient_id': resolve_agent_ref(self.db, reference=recipient_ref, repo_id=repo_id) if recipient_ref else None,
             'parent_message_id': parent_message_id,
             'channel': channel,
         }
@@ -259,6 +308,29 @@ class MCPToolService:
             )
             return {'id': agent.id, 'status': agent.status, 'last_heartbeat_at': agent.last_heartbeat_at}
 
+        if tool_name == 'agent.heartbeat_many':
+            try:
+                payload = AgentBatchHeartbeatRequest.model_validate(arguments)
+            except ValidationError as exc:
+                raise AppError(
+                    code=ERROR_VALIDATION,
+                    message='Invalid heartbeats',
+                    status_code=400,
+                    details={'errors': exc.errors(include_url=False, include_context=False)},
+                ) from exc
+            result = self.agents.heartbeat_many(
+                beats=[item.model_dump() for item in payload.heartbeats],
+                renew_leases=payload.renew_leases,
+                lock_ttl=payload.lock_ttl,
+            )
+            return {
+                'items': [
+                    {'id': a.id, 'status': a.status, 'last_heartbeat_at': a.last_heartbeat_at} for a in result['agents']
+                ],
+                'renewed_locks': result['renewed_locks'],
+                'renewed_claims': result['renewed_claims'],
+            }
+
         if tool_name == 'agent.list':
             agents = self.agents.list(repo_id=arguments.get('repo_id'))
             return {'items': [{'id': a.id, 'name': a.name, 'type': a.type, 'status': a.status} for a in agents]}
@@ -288,8 +360,9 @@ class MCPToolService:
                 agent_id=arguments['agent_id'],
                 resource_key=arguments['resource_key'],
                 lease_ttl=arguments.get('lease_ttl', 1800),
+                mode=arguments.get('mode', 'exclusive'),
             )
-            return {'id': claim.id, 'task_id': claim.task_id, 'agent_id': claim.agent_id, 'state': claim.state}
+            return {'id': claim.id, 'task_id': claim.task_id, 'agent_id': claim.agent_id, 'mode': claim.mode, 'state': claim.state}
 
         if tool_name == 'task.update':
             task = self.tasks.update(
@@ -298,16 +371,58 @@ class MCPToolService:
                 progress=arguments.get('progress'),
                 summary=arguments.get('summary'),
                 blocked_reason=arguments.get('blocked_reason'),
+                expected_version=arguments.get('expected_version'),
             )
-            return {'id': task.id, 'status': task.status, 'progress': task.progress}
+            return {'id': task.id, 'status': task.status, 'progress': task.progress, 'version': task.version}
+
+        if tool_name == 'task.update_many':
+            try:
+                payload = TaskBatchUpdateRequest.model_validate({'updates': arguments.get('updates')})
+            except ValidationError as exc:
+                raise AppError(
+                    code=ERROR_VALIDATION,
+                    message='Invalid task updates',
+                    status_code=400,
+                    details={'errors': exc.errors(include_url=False, include_context=False)},
+                ) from exc
+            tasks = self.tasks.update_many([item.model_dump() for item in payload.updates])
+            return {
+                'items': [{'id': t.id, 'status': t.status, 'progress': t.progress, 'version': t.version} for t in tasks],
+                'count': len(tasks),
+            }
 
         if tool_name == 'lock.acquire':
             lock = self.locks.acquire(
                 resource_key=arguments['resource_key'],
                 agent_id=arguments['agent_id'],
                 ttl=arguments.get('ttl', 1800),
+                wait_seconds=min(float(arguments.get('wait_seconds') or 0), 300.0),
+                mode=arguments.get('mode', 'exclusive'),
             )
-            return {'id': lock.id, 'resource_key': lock.resource_key, 'state': lock.state, 'expires_at': lock.expires_at}
+            grant = self.locks.last_grant
+            return {
+                'id': lock.id,
+                'resource_key': lock.resource_key,
+                'mode': lock.mode,
+                'state': lock.state,
+                'expires_at': lock.expires_at,
+                'waited_ms': round(grant.waited_seconds * 1000) if grant else 0,
+            }
+
+        if tool_name == 'lock.acquire_many':
+            locks = self.locks.acquire_many(
+                resource_keys=list(arguments['resource_keys']),
+                agent_id=arguments['agent_id'],
+                ttl=arguments.get('ttl', 1800),
+                mode=arguments.get('mode', 'exclusive'),
+            )
+            return {
+                'items': [
+                    {'id': lock.id, 'resource_key': lock.resource_key, 'state': lock.state, 'expires_at': lock.expires_at}
+                    for lock in locks
+                ],
+                'count': len(locks),
+            }
 
         if tool_name == 'lock.renew':
             lock = self.locks.renew(
@@ -362,7 +477,7 @@ class MCPToolService:
             )
 
         if tool_name == 'adapter.tick':
-            return adapter_runtime.run_once_sync(max_tasks_per_agent=arguments.get('max_tasks_per_agent', 2))
+            return adapter_runtime.run_once_sync(max_tasks_per_agent=arguments.get('max_tasks_per_agent', 2), wait=True)
 
         if tool_name == 'adapter.status':
             return adapter_runtime.status()
@@ -1 +1,12 @@
-from .entities import Agent, AgentSession, Artifact, Event, Repo, ResourceLock, Task, TaskClaim  # noqa: F401
+from .entities import (  # noqa: F401
+    Agent,
+    AgentSession,
+    AgentUptime,
+    Artifact,
+    Event,
+    Repo,
+    ResourceLock,
+    RuntimeLease,
+    Task,
+    TaskClaim,
+)
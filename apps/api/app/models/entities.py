@@ -4,7 +4,7 @@ import uuid
 from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import DateTime, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy import DateTime, Float, ForeignKey, Index, Integer, JSON, String, Text, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base, TimestampMixin
@@ -30,19 +30,41 @@ class Agent(Base, TimestampMixin):
     status: Mapped[str] = mapped_column(String(50), default='active')
     capabilities: Mapped[dict[str, Any]] = mapped_column(JSON, default=dict)
     last_heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Latest session of this agent; heartbeats load it by primary key.
+    current_session_id: Mapped[str | None] = mapped_column(String(36), nullable=True)
 
 
 class AgentSession(Base):
     __tablename__ = 'agent_sessions'
+    __table_args__ = (
+        Index('ix_agent_sessions_status_expires_at', 'status', 'expires_at'),
+        Index('ix_agent_sessions_agent_status_expires_at', 'agent_id', 'status', 'expires_at'),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     agent_id: Mapped[str] = mapped_column(String(36), ForeignKey('agents.id'))
     status: Mapped[str] = mapped_column(String(50), default='active')
     current_task_id: Mapped[str | None] = mapped_column(String(36), nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True, default=lambda: datetime.now(timezone.utc)
+    )
     last_heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
 
 
+class AgentUptime(Base):
+    """Per-agent totals of sessions removed by the retention job."""
+
+    __tablename__ = 'agent_uptime'
+
+    agent_id: Mapped[str] = mapped_column(String(36), ForeignKey('agents.id'), primary_key=True)
+    sessions: Mapped[int] = mapped_column(Integer, default=0)
+    uptime_seconds: Mapped[float] = mapped_column(Float, default=0.0)
+    first_started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    compacted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
 class Task(Base, TimestampMixin):
     __tablename__ = 'tasks'
 
@@ -58,15 +80,24 @@ class Task(Base, TimestampMixin):
     blocked_reason: Mapped[str | None] = mapped_column(Text, nullable=True)
     progress: Mapped[int] = mapped_column(Integer, default=0)
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+
+    # Every UPDATE is issued as `... WHERE id = :id AND version = :loaded_version`,
+    # so concurrent writers fail loudly instead of overwriting each other.
+    __mapper_args__ = {'version_id_col': version}
 
 
 class TaskClaim(Base):
     __tablename__ = 'task_claims'
+    __table_args__ = (Index('ix_task_claims_state_expires_at', 'state', 'expires_at'),)
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     task_id: Mapped[str] = mapped_column(String(36), ForeignKey('tasks.id'))
     agent_id: Mapped[str] = mapped_column(String(36), ForeignKey('agents.id'))
     resource_key: Mapped[str] = mapped_column(String(500))
+    # Every key dispatch locked for the claim, released with it; None for a claim on its own key.
+    footprint: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
+    mode: Mapped[str] = mapped_column(String(20), nullable=False, default='exclusive', server_default='exclusive')
     lease_ttl_seconds: Mapped[int] = mapped_column(Integer)
     state: Mapped[str] = mapped_column(String(50), default='active')
     claimed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -76,10 +107,22 @@ class TaskClaim(Base):
 
 class ResourceLock(Base):
     __tablename__ = 'resource_locks'
+    __table_args__ = (
+        # At most one active exclusive lock per key, enforced by the database across API workers.
+        Index(
+            'uq_resource_locks_active_key',
+            'resource_key',
+            unique=True,
+            sqlite_where=text("state = 'active' AND mode = 'exclusive'"),
+            postgresql_where=text("state = 'active' AND mode = 'exclusive'"),
+        ),
+        Index('ix_resource_locks_state_expires_at', 'state', 'expires_at'),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     resource_key: Mapped[str] = mapped_column(String(500), index=True)
     owner_agent_id: Mapped[str] = mapped_column(String(36), ForeignKey('agents.id'))
+    mode: Mapped[str] = mapped_column(String(20), nullable=False, default='exclusive', server_default='exclusive')
     state: Mapped[str] = mapped_column(String(50), default='active')
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -111,3 +154,17 @@ class Artifact(Base):
     uri: Mapped[str] = mapped_column(String(500))
     metadata_json: Mapped[dict[str, Any]] = mapped_column('metadata', JSON, default=dict)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class RuntimeLease(Base):
+    """A named lease electing one replica to run a background runtime (or one shard of it)."""
+
+    __tablename__ = 'runtime_leases'
+
+    name: Mapped[str] = mapped_column(String(120), primary_key=True)
+    holder_id: Mapped[str] = mapped_column(String(200))
+    # Rises every time the lease changes hands; writes made under the lease carry it.
+    fencing_token: Mapped[int] = mapped_column(Integer, default=1)
+    acquired_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    renewed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
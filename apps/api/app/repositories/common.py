@@ -5,3 +5,10 @@ from datetime import datetime, timezone
 
 def utc_now() -> datetime:
     return datetime.now(timezone.utc)
+
+
+def as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone-aware columns.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
+# Task priorities run from 1 (lowest) to MAX_PRIORITY; aging lifts a task no higher.
+MAX_PRIORITY = 5
+
 
 class ErrorEnvelope(BaseModel):
     error: dict[str, Any]
@@ -29,6 +32,16 @@ class AgentHeartbeatRequest(BaseModel):
     current_task: str | None = None
 
 
+class AgentBatchHeartbeatItem(AgentHeartbeatRequest):
+    agent_id: str
+
+
+class AgentBatchHeartbeatRequest(BaseModel):
+    heartbeats: list[AgentBatchHeartbeatItem] = Field(min_length=1, max_length=1000)
+    renew_leases: bool = False
+    lock_ttl: int = 1800
+
+
 class AgentResponse(BaseModel):
     id: str
     repo_id: str | None
@@ -37,13 +50,20 @@ class AgentResponse(BaseModel):
     status: str
     capabilities: dict[str, Any]
     last_heartbeat_at: datetime | None
+    current_session_id: str | None = None
+
+
+class AgentBatchHeartbeatResponse(BaseModel):
+    agents: list[AgentResponse]
+    renewed_locks: int
+    renewed_claims: int
 
 
 class TaskCreateRequest(BaseModel):
     goal: str
     description: str
     scope: dict[str, Any] = Field(default_factory=dict)
-    priority: int = 3
+    priority: int = Field(default=3, ge=1, le=MAX_PRIORITY)
     deps: list[str] = Field(default_factory=list)
     acceptance_criteria: str | None = None
     repo_id: str | None = None
@@ -53,6 +73,7 @@ class TaskClaimRequest(BaseModel):
     agent_id: str
     resource_key: str
     lease_ttl: int = 1800
+    mode: Literal['shared', 'exclusive'] = 'exclusive'
 
 
 class TaskUpdateRequest(BaseModel):
@@ -61,6 +82,15 @@ class TaskUpdateRequest(BaseModel):
     progress: int | None = None
     summary: str | None = None
     blocked_reason: str | None = None
+    expected_version: int | None = None
+
+
+class TaskBatchUpdateItem(TaskUpdateRequest):
+    task_id: str
+
+
+class TaskBatchUpdateRequest(BaseModel):
+    updates: list[TaskBatchUpdateItem] = Field(min_length=1, max_length=500)
 
 
 class TaskResponse(BaseModel):
@@ -76,6 +106,7 @@ class TaskResponse(BaseModel):
     blocked_reason: str | None
     progress: int
     summary: str | None
+    version: int
     created_at: datetime
     updated_at: datetime
 
@@ -84,6 +115,15 @@ class LockAcquireRequest(BaseModel):
     resource_key: str
     agent_id: str
     ttl: int = 1800
+    wait_seconds: float = Field(default=0, ge=0, le=300)
+    mode: Literal['shared', 'exclusive'] = 'exclusive'
+
+
+class LockBatchAcquireRequest(BaseModel):
+    resource_keys: list[str] = Field(min_length=1, max_length=256)
+    agent_id: str
+    ttl: int = 1800
+    mode: Literal['shared', 'exclusive'] = 'exclusive'
 
 
 class LockRenewRequest(BaseModel):
@@ -99,10 +139,13 @@ class LockResponse(BaseModel):
     id: str
     resource_key: str
     owner_agent_id: str
+    mode: str
     state: str
     created_at: datetime
     expires_at: datetime
     released_at: datetime | None
+    waited_ms: int | None = None
+    queue_position: int | None = None
 
 
 class EventLogRequest(BaseModel):
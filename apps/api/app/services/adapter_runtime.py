@@ -1,22 +1,50 @@
 from __future__ import annotations
 
 import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait as futures_wait
 from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
 
-from app.db import SessionLocal
-from app.models.entities import Agent
+from app.config.settings import get_settings
+from app.db import SessionLocal, engine
+from app.models.entities import Agent, Task
 from app.services.adapters import AdapterService
+from app.services.leadership import LeaderElection
+from app.services.process_pool import process_pool
+from app.services.runtime_worker import RuntimeWorker
+
+
+def task_workers() -> int:
+    """Threads executing tasks; 0 in settings means the process limit, kept below the database pool.
+
+    Each thread opens its own session, so API requests and the other runtimes keep a connection.
+    """
+    configured = get_settings().adapter_task_workers
+    if configured > 0:
+        return configured
+    workers = process_pool.max_processes
+    if isinstance(engine.pool, QueuePool):
+        workers = min(workers, max(1, engine.pool.size() - 1))
+    return workers
 
 
 class AdapterRuntime:
     def __init__(self) -> None:
         self._task: asyncio.Task | None = None
         self._guard = asyncio.Lock()
+        self._worker = RuntimeWorker('repomesh-adapter')
+        self._election = LeaderElection('adapter')
         self._cycles = 0
         self._executed_tasks = 0
+        self._task_executor: ThreadPoolExecutor | None = None
+        # Tasks submitted in an earlier cycle and still running, by task id.
+        self._in_flight: dict[str, Future[dict[str, Any]]] = {}
+        self._in_flight_lock = threading.Lock()
         self._last_cycle_at: datetime | None = None
         self._last_error: str | None = None
 
@@ -24,6 +52,7 @@ class AdapterRuntime:
         async with self._guard:
             if self._task and not self._task.done():
                 return self.status()
+            await self._election.start()
             self._task = asyncio.create_task(self._run_loop(), name='repomesh-adapter-runtime')
             return self.status()
 
@@ -37,6 +66,7 @@ class AdapterRuntime:
                 await task
             except asyncio.CancelledError:
                 pass
+            await self._election.stop()
         return self.status()
 
     def status(self) -> dict[str, Any]:
@@ -45,42 +75,114 @@ class AdapterRuntime:
             'running': running,
             'cycles': self._cycles,
             'executed_tasks': self._executed_tasks,
+            'in_flight_tasks': len(self._in_flight),
+            'process_pool': process_pool.status(),
             'last_cycle_at': self._last_cycle_at.isoformat() if self._last_cycle_at else None,
             'last_error': self._last_error,
+            'leadership': self._election.status(),
         }
 
-    def run_once_sync(self, *, max_tasks_per_agent: int = 2) -> dict[str, Any]:
+    def run_once_sync(self, *, max_tasks_per_agent: int = 2, wait: bool = False) -> dict[str, Any]:
+        """Collect finished task runs and submit newly assigned tasks without waiting for them.
+
+        Each task runs on its own thread and session; the process pool caps how many commands
+        run at once overall and per agent. A task still running from an earlier cycle is not
+        submitted again, so one long build delays nobody else's work. With `wait`, the cycle
+        also waits for what it submitted, as a manual tick does.
+        """
+        runs, errors = self._collect_finished()
         with SessionLocal() as db:
-            agents = list(
-                db.execute(
-                    select(Agent).where(
-                        Agent.status == 'active',
-                        Agent.type != 'orchestrator',
-                    )
-                ).scalars().all()
-            )
-            results: list[dict[str, Any]] = []
-            for agent in agents:
-                run = AdapterService(db).execute(
-                    agent_id=agent.id,
-                    dry_run=False,
-                    max_tasks=max_tasks_per_agent,
-                )
-                if run['executed']:
-                    results.append(run)
+            work = self._pending_work(db, max_tasks_per_agent=max_tasks_per_agent)
+
+        submitted: list[Future[dict[str, Any]]] = []
+        with self._in_flight_lock:
+            for agent_id, task_id in work:
+                if task_id in self._in_flight:
+                    continue
+                future = self._executor().submit(self._execute_one, agent_id, task_id)
+                self._in_flight[task_id] = future
+                submitted.append(future)
+        if wait and submitted:
+            futures_wait(submitted)
+            more_runs, more_errors = self._collect_finished()
+            runs += more_runs
+            errors += more_errors
+
+        merged_runs: dict[str, dict[str, Any]] = {}
+        for run in runs:
+            merged = merged_runs.setdefault(run['agent_id'], {**run, 'requested_task_id': None, 'executed': [], 'skipped': []})
+            merged['executed'] += run['executed']
+            merged['skipped'] += run['skipped']
+        results = [run for run in merged_runs.values() if run['executed']]
 
         self._cycles += 1
         self._last_cycle_at = datetime.now(timezone.utc)
-        self._last_error = None
+        self._last_error = errors[-1] if errors else None
         self._executed_tasks += sum(len(item['executed']) for item in results)
-        return {'runs': results}
+        with self._in_flight_lock:
+            in_flight = sorted(self._in_flight)
+        return {'runs': results, 'in_flight': in_flight}
 
-    async def _run_loop(self) -> None:
-        from app.config.settings import get_settings
+    def _collect_finished(self) -> tuple[list[dict[str, Any]], list[str]]:
+        """Results of the submitted tasks that finished, and the errors of those that failed."""
+        with self._in_flight_lock:
+            done = {task_id: future for task_id, future in self._in_flight.items() if future.done()}
+            for task_id in done:
+                del self._in_flight[task_id]
+        runs: list[dict[str, Any]] = []
+        errors: list[str] = []
+        for future in done.values():
+            exc = future.exception()
+            if exc is not None:
+                errors.append(str(exc))
+            else:
+                runs.append(future.result())
+        return runs, errors
 
+    @staticmethod
+    def _pending_work(db: Session, *, max_tasks_per_agent: int) -> list[tuple[str, str]]:
+        """(agent_id, task_id) for each active agent's next assigned tasks, interleaved across agents."""
+        ranked = (
+            select(
+                Task.assignee_agent_id.label('agent_id'),
+                Task.id.label('task_id'),
+                func.row_number()
+                .over(partition_by=Task.assignee_agent_id, order_by=(Task.priority.desc(), Task.created_at.asc()))
+                .label('rank'),
+            )
+            .join(Agent, Agent.id == Task.assignee_agent_id)
+            .where(
+                Agent.status == 'active',
+                Agent.type != 'orchestrator',
+                Task.status.in_(['claimed', 'in_progress']),
+            )
+            .subquery()
+        )
+        rows = db.execute(
+            select(ranked.c.agent_id, ranked.c.task_id)
+            .where(ranked.c.rank <= max_tasks_per_agent)
+            .order_by(ranked.c.rank, ranked.c.agent_id)
+        ).all()
+        return [(agent_id, task_id) for agent_id, task_id in rows]
+
+    @staticmethod
+    def _execute_one(agent_id: str, task_id: str) -> dict[str, Any]:
+        with SessionLocal() as db:
+            return AdapterService(db).execute(agent_id=agent_id, task_id=task_id, dry_run=False, max_tasks=1)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._task_executor is None:
+            self._task_executor = ThreadPoolExecutor(max_workers=task_workers(), thread_name_prefix='repomesh-adapter-task')
+        return self._task_executor
+
+    async def _run_loop(self) -> None:
         while True:
             try:
-                self.run_once_sync(max_tasks_per_agent=get_settings().adapter_max_tasks_per_agent_cycle)
+                # Only the elected replica executes tasks; the others stand by.
+                if self._election.is_leader:
+                    await self._worker.run(
+                        self.run_once_sync, max_tasks_per_agent=get_settings().adapter_max_tasks_per_agent_cycle
+                    )
             except Exception as exc:  # pragma: no cover - defensive guardrail
                 self._last_error = str(exc)
             await asyncio.sleep(max(get_settings().adapter_poll_seconds, 1))
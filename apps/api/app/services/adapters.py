@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import subprocess
-import time
 from pathlib import Path
 from typing import Any
 
@@ -9,9 +8,11 @@ from sqlalchemy import and_, select
 from sqlalchemy.orm import Session
 
 from app.config.settings import get_settings
-from app.models.entities import ResourceLock, Task, TaskClaim
+from app.models.entities import Task, TaskClaim
 from app.repositories.common import utc_now
 from app.services.events import EventService
+from app.services.locks import LockService
+from app.services.process_pool import process_pool
 from app.services.tasks import TaskService
 
 
@@ -128,7 +129,7 @@ class AdapterService:
         self.tasks.update(task_id=task.id, status='in_progress', progress=10, summary=None, blocked_reason=None)
 
         try:
-            initial = self._run_command(command=command, cwd=cwd, timeout_seconds=timeout_seconds)
+            initial = self._run_command(command=command, cwd=cwd, timeout_seconds=timeout_seconds, agent_id=agent_id)
             if initial['exit_code'] == 0:
                 return self._mark_execution_success(
                     task=task,
@@ -140,7 +141,7 @@ class AdapterService:
 
             prepass = self._run_prepass(task=task, agent_id=agent_id, cwd=cwd)
             if prepass['applied']:
-                retry = self._run_command(command=command, cwd=cwd, timeout_seconds=timeout_seconds)
+                retry = self._run_command(command=command, cwd=cwd, timeout_seconds=timeout_seconds, agent_id=agent_id)
                 if retry['exit_code'] == 0:
                     success = self._mark_execution_success(
                         task=task,
@@ -211,23 +212,11 @@ class AdapterService:
             )
             return {'task_id': task.id, 'status': 'timeout', 'timeout_seconds': timeout_seconds}
 
-    def _run_command(self, *, command: str, cwd: str, timeout_seconds: int) -> dict[str, Any]:
-        start = time.monotonic()
-        completed = subprocess.run(
-            command,
-            shell=True,
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            timeout=timeout_seconds,
-        )
-        duration_ms = int((time.monotonic() - start) * 1000)
-        return {
-            'exit_code': completed.returncode,
-            'stdout': (completed.stdout or '').strip(),
-            'stderr': (completed.stderr or '').strip(),
-            'duration_ms': duration_ms,
-        }
+    def _run_command(self, *, command: str, cwd: str, timeout_seconds: int, agent_id: str) -> dict[str, Any]:
+        # End the read transaction first: the session returns its connection to the pool
+        # for the length of the command instead of holding it through the whole build.
+        self.db.commit()
+        return process_pool.run(command, cwd=cwd, timeout_seconds=timeout_seconds, agent_id=agent_id)
 
     def _run_prepass(self, *, task: Task, agent_id: str, cwd: str) -> dict[str, Any]:
         commands = self._prepass_commands(task.scope or {})
@@ -249,7 +238,9 @@ class AdapterService:
         results: list[dict[str, Any]] = []
         for item in commands:
             try:
-                result = self._run_command(command=item, cwd=cwd, timeout_seconds=self.settings.adapter_default_timeout_seconds)
+                result = self._run_command(
+                    command=item, cwd=cwd, timeout_seconds=self.settings.adapter_default_timeout_seconds, agent_id=agent_id
+                )
                 results.append({'command': item, **result})
             except subprocess.TimeoutExpired:
                 results.append({'command': item, 'exit_code': -1, 'stdout': '', 'stderr': 'prepass timeout', 'duration_ms': 0})
@@ -371,18 +362,7 @@ class AdapterService:
         for claim in claims:
             claim.state = 'released'
             claim.released_at = now
-            lock = self.db.execute(
-                select(ResourceLock).where(
-                    and_(
-                        ResourceLock.resource_key == claim.resource_key,
-                        ResourceLock.owner_agent_id == agent_id,
-                        ResourceLock.state == 'active',
-                    )
-                )
-            ).scalars().first()
-            if lock:
-                lock.state = 'released'
-                lock.released_at = now
+        LockService(self.db).release_claimed(claims, now=now)
         if claims:
             self.db.commit()
 
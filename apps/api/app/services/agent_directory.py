@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import engine_state, existing_engine_state
+from app.models.entities import Agent
+from app.services.change_feed import change_feed
+from app.services.errors import AppError, ERROR_VALIDATION
+
+
+class AgentDirectory:
+    """Process-local cache of agent ids and (name, repo_id) lookups for recipient resolution.
+
+    Agents are never deleted, so known ids are kept until the cache is full. Name lookups
+    resolve to the newest agent with that name; they are dropped when an agent registers
+    here and re-read after `name_ttl_seconds` to pick up agents registered elsewhere.
+    """
+
+    def __init__(self, *, name_ttl_seconds: float = 60.0, max_entries: int = 10_000) -> None:
+        self.name_ttl_seconds = name_ttl_seconds
+        self.max_entries = max_entries
+        self._mutex = threading.Lock()
+        self._ids: set[str] = set()
+        self._names: dict[tuple[str, str | None], tuple[str, float]] = {}
+
+    def resolve(self, db: Session, *, reference: str, repo_id: str | None) -> str | None:
+        key = (reference, repo_id)
+        with self._mutex:
+            if reference in self._ids:
+                return reference
+            cached = self._names.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.name_ttl_seconds:
+                return cached[0]
+
+        by_id = db.get(Agent, reference)
+        if by_id:
+            self._remember_id(by_id.id)
+            return by_id.id
+
+        stmt = select(Agent.id).where(Agent.name == reference)
+        if repo_id is not None:
+            stmt = stmt.where(Agent.repo_id == repo_id)
+        agent_id = db.execute(stmt.order_by(Agent.created_at.desc())).scalars().first()
+        if agent_id is None:
+            return None
+        with self._mutex:
+            if len(self._names) >= self.max_entries:
+                self._names.clear()
+            self._names[key] = (agent_id, time.monotonic())
+        self._remember_id(agent_id)
+        return agent_id
+
+    def invalidate(self, *, name: str, repo_id: str | None = None) -> None:
+        with self._mutex:
+            self._names.pop((name, repo_id), None)
+            self._names.pop((name, None), None)
+
+    def _remember_id(self, agent_id: str) -> None:
+        with self._mutex:
+            if len(self._ids) >= self.max_entries:
+                self._ids.clear()
+            self._ids.add(agent_id)
+
+
+def agent_directory_for(db: Session) -> AgentDirectory:
+    return engine_state(db, 'agent_directory', AgentDirectory)
+
+
+def resolve_agent_ref(db: Session, *, reference: str, repo_id: str | None) -> str:
+    """Resolve a recipient given as an agent id or name to the agent id."""
+    agent_id = agent_directory_for(db).resolve(db, reference=reference, repo_id=repo_id)
+    if agent_id is None:
+        raise AppError(
+            code=ERROR_VALIDATION,
+            message='Unknown recipient reference',
+            status_code=400,
+            details={'reference': reference},
+        )
+    return agent_id
+
+
+def _invalidate_on_register(bind: Any, records: list[dict[str, Any]]) -> None:
+    directory: AgentDirectory | None = existing_engine_state(bind, 'agent_directory')
+    if directory is None:
+        return
+    for record in records:
+        if record.get('entity') == 'agent' and record.get('op') == 'insert':
+            data = record.get('data') or {}
+            directory.invalidate(name=data.get('name'), repo_id=data.get('repo_id'))
+
+
+change_feed.add_listener(_invalidate_on_register)
@@ -1,20 +1,28 @@
 from __future__ import annotations
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.config.settings import get_settings
 from app.models.entities import Agent, AgentSession
-from app.repositories.common import utc_now
+from app.repositories.common import as_utc, utc_now
+from app.services.change_feed import change_feed
 from app.services.errors import AppError, ERROR_NOT_FOUND
+from app.services.expiry import ExpiryService, expiry_deadlines_for
+from app.services.locks import LockService
+from app.services.session_table import session_state_of, session_table_for
+from app.services.tasks import TaskService
 
 
 class AgentService:
     def __init__(self, db: Session):
         self.db = db
+        change_feed.watch(db)
         self.settings = get_settings()
+        self.sessions = session_table_for(db)
 
     def register(
         self,
@@ -26,22 +34,17 @@ class AgentService:
         reuse_existing: bool = True,
         takeover_if_stale: bool = True,
     ) -> Agent:
-        self.mark_stale_sessions()
+        ExpiryService(self.db).run_due()
         now = utc_now()
+        expiry_deadlines_for(self.db).note('sessions', now + timedelta(seconds=self.settings.session_ttl_seconds))
         existing = self.db.execute(
             select(Agent).where(Agent.name == name, Agent.repo_id == repo_id).order_by(Agent.created_at.desc())
         ).scalars().first()
 
         if existing and reuse_existing:
-            active_session = self.db.execute(
-                select(AgentSession)
-                .where(
-                    AgentSession.agent_id == existing.id,
-                    AgentSession.status == 'active',
-                    AgentSession.expires_at >= now,
-                )
-                .order_by(AgentSession.last_heartbeat_at.desc())
-            ).scalars().first()
+            active_session = self._current_session(existing)
+            if active_session and (active_session.status != 'active' or as_utc(active_session.expires_at) < now):
+                active_session = None
 
             if active_session:
                 existing.type = agent_type
@@ -51,6 +54,7 @@ class AgentService:
                 active_session.last_heartbeat_at = now
                 active_session.expires_at = now + timedelta(seconds=self.settings.session_ttl_seconds)
                 self.db.commit()
+                self.sessions.observe(session_state_of(active_session))
                 self.db.refresh(existing)
                 return existing
 
@@ -59,16 +63,9 @@ class AgentService:
                 existing.capabilities = capabilities
                 existing.status = 'active'
                 existing.last_heartbeat_at = now
-                self.db.add(
-                    AgentSession(
-                        agent_id=existing.id,
-                        status='active',
-                        current_task_id=None,
-                        last_heartbeat_at=now,
-                        expires_at=now + timedelta(seconds=self.settings.session_ttl_seconds),
-                    )
-                )
+                session = self._open_session(existing, status='active', now=now)
                 self.db.commit()
+                self.sessions.observe(session_state_of(session))
                 self.db.refresh(existing)
                 return existing
 
@@ -83,81 +80,123 @@ class AgentService:
         self.db.add(agent)
         self.db.flush()
 
-        self.db.add(
-            AgentSession(
-                agent_id=agent.id,
-                status='active',
-                current_task_id=None,
-                last_heartbeat_at=now,
-                expires_at=now + timedelta(seconds=self.settings.session_ttl_seconds),
-            )
-        )
+        session = self._open_session(agent, status='active', now=now)
         self.db.commit()
+        self.sessions.observe(session_state_of(session))
         self.db.refresh(agent)
         return agent
 
     def heartbeat(self, *, agent_id: str, status: str, current_task: str | None) -> Agent:
+        """Record a heartbeat; beats that keep the agent's status are coalesced in memory."""
         agent = self.db.get(Agent, agent_id)
         if not agent:
             raise AppError(code=ERROR_NOT_FOUND, message='Agent not found', status_code=404)
+        self._record_heartbeats([(agent, status, current_task)])
+        return agent
 
-        now = utc_now()
-        agent.status = status
-        agent.last_heartbeat_at = now
-
-        session = self.db.execute(
-            select(AgentSession).where(AgentSession.agent_id == agent_id).order_by(AgentSession.last_heartbeat_at.desc())
-        ).scalars().first()
-
-        if session is None:
-            session = AgentSession(
-                agent_id=agent.id,
-                status=status,
-                current_task_id=current_task,
-                last_heartbeat_at=now,
-                expires_at=now + timedelta(seconds=self.settings.session_ttl_seconds),
+    def heartbeat_many(self, *, beats: list[dict], renew_leases: bool = False, lock_ttl: int = 1800) -> dict:
+        """Apply heartbeats for many agents in one transaction, optionally renewing their locks and claims."""
+        latest = {beat['agent_id']: beat for beat in beats}
+        agents = {
+            agent.id: agent for agent in self.db.execute(select(Agent).where(Agent.id.in_(latest))).scalars()
+        }
+        missing = [agent_id for agent_id in latest if agent_id not in agents]
+        if missing:
+            raise AppError(
+                code=ERROR_NOT_FOUND,
+                message='Agent not found',
+                status_code=404,
+                details={'agent_ids': missing},
             )
-            self.db.add(session)
-        else:
+
+        renewed = {'locks': 0, 'claims': 0}
+        if renew_leases:
+            now = utc_now()
+            renewed['locks'] = LockService(self.db).renew_held(agent_ids=list(agents), ttl=lock_ttl, now=now)
+            renewed['claims'] = TaskService(self.db).renew_claims(agent_ids=list(agents), now=now)
+
+        items = [(agents[agent_id], beat['status'], beat.get('current_task')) for agent_id, beat in latest.items()]
+        self._record_heartbeats(items, force_commit=any(renewed.values()))
+        return {
+            'agents': [agents[agent_id] for agent_id in latest],
+            'renewed_locks': renewed['locks'],
+            'renewed_claims': renewed['claims'],
+        }
+
+    def _record_heartbeats(self, items: list[tuple[Agent, str, str | None]], *, force_commit: bool = False) -> None:
+        now = utc_now()
+        expires_at = now + timedelta(seconds=self.settings.session_ttl_seconds)
+        expiry_deadlines_for(self.db).note('sessions', expires_at)
+
+        coalesced: list[Agent] = []
+        written: list[AgentSession] = []
+        for agent, status, current_task in items:
+            state = self.sessions.get(agent.id)
+            if state is not None and agent.status == status and state.status == status:
+                self.sessions.beat(agent.id, current_task_id=current_task, at=now, expires_at=expires_at)
+                coalesced.append(agent)
+                continue
+
+            # Status changes and unseen sessions are written through so their events go out now.
+            agent.status = status
+            agent.last_heartbeat_at = now
+            session = self._current_session(agent) or self._open_session(agent, status=status, now=now)
             session.status = status
             session.current_task_id = current_task
             session.last_heartbeat_at = now
-            session.expires_at = now + timedelta(seconds=self.settings.session_ttl_seconds)
+            session.expires_at = expires_at
+            written.append(session)
 
-        self.db.commit()
-        self.db.refresh(agent)
-        return agent
+        if written or force_commit:
+            self.db.commit()
+            for session in written:
+                self.sessions.observe(session_state_of(session))
+        if self.sessions.flush_if_due(self.db) or written or force_commit:
+            self.db.execute(
+                select(Agent)
+                .where(Agent.id.in_([agent.id for agent, _, _ in items]))
+                .execution_options(populate_existing=True)
+            ).scalars().all()
+        for agent in coalesced:
+            set_committed_value(agent, 'last_heartbeat_at', now)
+
+    def _current_session(self, agent: Agent) -> AgentSession | None:
+        if agent.current_session_id:
+            session = self.db.get(AgentSession, agent.current_session_id)
+            if session is not None:
+                return session
+        # Agents registered before the pointer existed fall back to the latest row once.
+        session = self.db.execute(
+            select(AgentSession).where(AgentSession.agent_id == agent.id).order_by(AgentSession.last_heartbeat_at.desc())
+        ).scalars().first()
+        if session is not None:
+            agent.current_session_id = session.id
+        return session
+
+    def _open_session(self, agent: Agent, *, status: str, now: datetime) -> AgentSession:
+        session = AgentSession(
+            agent_id=agent.id,
+            status=status,
+            current_task_id=None,
+            started_at=now,
+            last_heartbeat_at=now,
+            expires_at=now + timedelta(seconds=self.settings.session_ttl_seconds),
+        )
+        self.db.add(session)
+        self.db.flush()
+        agent.current_session_id = session.id
+        return session
+
+    def flush_heartbeats(self) -> int:
+        return self.sessions.flush(self.db)
 
     def list(self, repo_id: str | None) -> list[Agent]:
-        self.mark_stale_sessions()
+        self.sessions.flush_if_due(self.db)
+        ExpiryService(self.db).run_due()
         stmt = select(Agent).order_by(Agent.created_at.desc())
         if repo_id:
             stmt = stmt.where(Agent.repo_id == repo_id)
         return list(self.db.execute(stmt).scalars().all())
 
     def mark_stale_sessions(self) -> int:
-        now = utc_now()
-        sessions = self.db.execute(select(AgentSession).where(AgentSession.expires_at < now, AgentSession.status == 'active')).scalars().all()
-        count = 0
-        touched_agents: set[str] = set()
-        for session in sessions:
-            session.status = 'stale'
-            touched_agents.add(session.agent_id)
-            count += 1
-
-        for agent_id in touched_agents:
-            has_active = self.db.execute(
-                select(AgentSession).where(
-                    AgentSession.agent_id == agent_id,
-                    AgentSession.status == 'active',
-                    AgentSession.expires_at >= now,
-                )
-            ).scalars().first()
-            if has_active is None:
-                agent = self.db.get(Agent, agent_id)
-                if agent:
-                    agent.status = 'inactive'
-
-        if count:
-            self.db.commit()
-        return count
+        return ExpiryService(self.db).expire_sessions(utc_now())
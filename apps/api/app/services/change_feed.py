@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import uuid
+from collections import deque
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.db import ends_transaction
+from app.models.entities import Agent, ResourceLock, Task, TaskClaim
+from app.repositories.common import utc_now
+from app.services.event_stream import event_stream_broker
+
+logger = logging.getLogger(__name__)
+
+CHANGE_CHANNEL = 'changes'
+
+# entity name and the compact set of columns carried in each change record
+_TRACKED: dict[type, tuple[str, tuple[str, ...]]] = {
+    Task: ('task', ('id', 'repo_id', 'status', 'progress', 'assignee_agent_id', 'priority', 'version')),
+    TaskClaim: ('claim', ('id', 'task_id', 'agent_id', 'resource_key', 'mode', 'state', 'expires_at')),
+    ResourceLock: ('lock', ('id', 'resource_key', 'owner_agent_id', 'mode', 'state', 'expires_at')),
+    Agent: ('agent', ('id', 'repo_id', 'name', 'type', 'status', 'capabilities')),
+}
+
+# Heartbeats touch only these columns; they are not interesting state transitions.
+_AGENT_LIVENESS_FIELDS = frozenset({'last_heartbeat_at', 'current_session_id', 'updated_at'})
+
+_PENDING_KEY = 'repomesh.change_feed.pending'
+_WATCHED_KEY = 'repomesh.change_feed.watched'
+
+ChangeListener = Callable[[Engine, list[dict[str, Any]]], None]
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class ChangeFeed:
+    """Captures ORM writes at flush time and fans them out once the transaction commits."""
+
+    def __init__(self, *, history: int = 4096) -> None:
+        self._listeners: list[ChangeListener] = []
+        self._seq = itertools.count(1)
+        self._seq_lock = threading.Lock()
+        self._last_seq = 0
+        self._recent: deque[dict[str, Any]] = deque(maxlen=history)
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def replay(self, since_seq: int) -> list[dict[str, Any]] | None:
+        """Records committed after `since_seq`, or None if they already fell out of history.
+
+        A `since_seq` ahead of this process was issued before a restart reset the sequence,
+        so it is outside the history too.
+        """
+        with self._seq_lock:
+            if since_seq > self._last_seq:
+                return None
+            if since_seq == self._last_seq:
+                return []
+            if not self._recent or self._recent[0]['seq'] > since_seq + 1:
+                return None
+            return [record for record in self._recent if record['seq'] > since_seq]
+
+    def add_listener(self, listener: ChangeListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def watch(self, db: Session) -> None:
+        if db.info.get(_WATCHED_KEY):
+            return
+        db.info[_WATCHED_KEY] = True
+        event.listen(db, 'after_flush', self._after_flush)
+        event.listen(db, 'after_commit', self._after_commit)
+        event.listen(db, 'after_rollback', self._after_rollback)
+
+    def capture(self, session: Session, obj: Any, *, op: str, changed: list[str] | None = None) -> None:
+        """Record a write made with a Core/ORM-enabled statement that bypassed the unit of work.
+
+        Such updates leave no attribute history, so `changed` names the updated fields.
+        """
+        tracked = _TRACKED.get(type(obj))
+        if tracked is None:
+            return
+        record = self._record(obj, op=op, entity=tracked[0], fields=tracked[1], changed=changed)
+        if record is not None:
+            session.info.setdefault(_PENDING_KEY, []).append(record)
+
+    def pending_mark(self, session: Session) -> int:
+        """A marker for the records captured so far in the session's transaction."""
+        return len(session.info.get(_PENDING_KEY, ()))
+
+    def discard_since(self, session: Session, mark: int) -> None:
+        """Drop records captured after `mark`, when the savepoint that wrote them rolls back."""
+        del session.info.get(_PENDING_KEY, [])[mark:]
+
+    def _after_flush(self, session: Session, _flush_context: Any) -> None:
+        pending: list[dict[str, Any]] = session.info.setdefault(_PENDING_KEY, [])
+        for op, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+            for obj in objects:
+                tracked = _TRACKED.get(type(obj))
+                if tracked is None:
+                    continue
+                record = self._record(obj, op=op, entity=tracked[0], fields=tracked[1])
+                if record is not None:
+                    pending.append(record)
+
+    def _after_commit(self, session: Session) -> None:
+        if not ends_transaction(session):
+            return
+        records = session.info.pop(_PENDING_KEY, None)
+        if not records:
+            return
+        with self._seq_lock:
+            for record in records:
+                record['seq'] = next(self._seq)
+            self._last_seq = records[-1]['seq']
+            self._recent.extend(records)
+        bind = session.get_bind()
+        for listener in self._listeners:
+            try:
+                listener(bind, records)
+            except Exception:  # pragma: no cover - listeners must never fail a commit
+                logger.exception('change feed listener failed')
+
+    @staticmethod
+    def _after_rollback(session: Session) -> None:
+        if ends_transaction(session):
+            session.info.pop(_PENDING_KEY, None)
+
+    @staticmethod
+    def _record(
+        obj: Any, *, op: str, entity: str, fields: tuple[str, ...], changed: list[str] | None = None
+    ) -> dict[str, Any] | None:
+        state = inspect(obj)
+        if changed is None:
+            changed = [attr.key for attr in state.attrs if attr.history.has_changes()] if op == 'update' else []
+        if op == 'update':
+            if not changed:
+                return None
+            if entity == 'agent' and _AGENT_LIVENESS_FIELDS.issuperset(changed):
+                return None
+
+        data = {field: _jsonable(state.dict.get(field)) for field in fields}
+        if entity == 'task':
+            scope = state.dict.get('scope') or {}
+            data['component'] = scope.get('component') if isinstance(scope, dict) else None
+
+        return {
+            'id': str(uuid.uuid4()),
+            'channel': CHANGE_CHANNEL,
+            'recipient_id': None,
+            'type': ChangeFeed._record_type(entity=entity, op=op, changed=changed, data=data),
+            'entity': entity,
+            'entity_id': data.get('id'),
+            'op': op,
+            'changed': changed,
+            'data': data,
+            'created_at': utc_now().isoformat(),
+        }
+
+    @staticmethod
+    def _record_type(*, entity: str, op: str, changed: list[str], data: dict[str, Any]) -> str:
+        if op == 'delete':
+            return f'{entity}.deleted'
+        if entity == 'task':
+            return 'task.created' if op == 'insert' else 'task.updated'
+        if entity == 'agent':
+            if op == 'insert':
+                return 'agent.registered'
+            if 'status' in changed and data.get('status') == 'active':
+                return 'agent.activated'
+            return 'agent.updated'
+        # claims and locks
+        if op == 'insert':
+            return 'claim.created' if entity == 'claim' else 'lock.acquired'
+        if 'state' in changed:
+            return f"{entity}.{data.get('state')}"
+        return f'{entity}.renewed'
+
+
+def _publish_to_broker(_bind: Engine, records: list[dict[str, Any]]) -> None:
+    for record in records:
+        event_stream_broker.publish_nowait(record)
+
+
+change_feed = ChangeFeed()
+change_feed.add_listener(_publish_to_broker)
+# Row changes are high-volume; only streams that subscribe to them by name receive them.
+event_stream_broker.require_explicit(CHANGE_CHANNEL)
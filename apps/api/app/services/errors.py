@@ -15,3 +15,4 @@ ERROR_NOT_FOUND = 'NOT_FOUND'
 ERROR_CONFLICT = 'CONFLICT'
 ERROR_UNAUTHORIZED = 'UNAUTHORIZED'
 ERROR_VALIDATION = 'VALIDATION_ERROR'
+ERROR_TOO_MANY_REQUESTS = 'TOO_MANY_REQUESTS'
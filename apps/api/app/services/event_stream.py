@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import asyncio
+import threading
 import uuid
+from collections.abc import Iterable
 from dataclasses import dataclass
 from typing import Any
 
@@ -10,15 +12,25 @@ from typing import Any
 class StreamSubscriber:
     id: str
     queue: asyncio.Queue[dict[str, Any]]
+    loop: asyncio.AbstractEventLoop
     recipient_id: str | None
     channel: str | None
     include_broadcast: bool
+    channels: frozenset[str] | None = None
 
 
 class EventStreamBroker:
     def __init__(self) -> None:
         self._subscribers: dict[str, StreamSubscriber] = {}
-        self._lock = asyncio.Lock()
+        # A thread lock rather than an asyncio lock: change records are
+        # published from request worker threads after their commit.
+        self._lock = threading.Lock()
+        # Channels delivered only to subscribers that name them, never to catch-all ones.
+        self._explicit: set[str] = set()
+
+    def require_explicit(self, channel: str) -> None:
+        """Keep `channel` out of subscriptions without a channel filter."""
+        self._explicit.add(channel)
 
     async def subscribe(
         self,
@@ -26,49 +38,77 @@ class EventStreamBroker:
         recipient_id: str | None,
         channel: str | None,
         include_broadcast: bool,
+        channels: Iterable[str] | None = None,
     ) -> StreamSubscriber:
         subscriber = StreamSubscriber(
             id=str(uuid.uuid4()),
             queue=asyncio.Queue(maxsize=200),
+            loop=asyncio.get_running_loop(),
             recipient_id=recipient_id,
             channel=channel,
             include_broadcast=include_broadcast,
+            channels=frozenset(channels) if channels is not None else None,
         )
-        async with self._lock:
+        with self._lock:
             self._subscribers[subscriber.id] = subscriber
         return subscriber
 
     async def unsubscribe(self, subscriber_id: str) -> None:
-        async with self._lock:
+        with self._lock:
             self._subscribers.pop(subscriber_id, None)
 
     async def publish(self, event_item: dict[str, Any]) -> None:
-        async with self._lock:
+        self.publish_nowait(event_item)
+
+    def publish_nowait(self, event_item: dict[str, Any]) -> None:
+        """Publish from any thread; delivery is scheduled on each subscriber's loop."""
+        with self._lock:
             subscribers = list(self._subscribers.values())
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+
         for subscriber in subscribers:
             if not self._matches(subscriber, event_item):
                 continue
+            if subscriber.loop is current_loop:
+                self._offer(subscriber, event_item)
+                continue
+            try:
+                subscriber.loop.call_soon_threadsafe(self._offer, subscriber, event_item)
+            except RuntimeError:
+                # Subscriber's loop already closed; it will be unsubscribed on teardown.
+                continue
+
+    @staticmethod
+    def _offer(subscriber: StreamSubscriber, event_item: dict[str, Any]) -> None:
+        try:
+            subscriber.queue.put_nowait(event_item)
+        except asyncio.QueueFull:
+            # Drop oldest event to keep stream live under burst traffic.
+            try:
+                subscriber.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
             try:
                 subscriber.queue.put_nowait(event_item)
             except asyncio.QueueFull:
-                # Drop oldest event to keep stream live under burst traffic.
-                try:
-                    subscriber.queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    pass
-                try:
-                    subscriber.queue.put_nowait(event_item)
-                except asyncio.QueueFull:
-                    continue
+                return
 
-    @staticmethod
-    def _matches(subscriber: StreamSubscriber, event_item: dict[str, Any]) -> bool:
+    def _matches(self, subscriber: StreamSubscriber, event_item: dict[str, Any]) -> bool:
         event_channel = event_item.get('channel')
         event_recipient = event_item.get('recipient_id')
 
+        if event_channel in self._explicit and subscriber.channel != event_channel and subscriber.channels is None:
+            return False
+
         if subscriber.channel and subscriber.channel != event_channel:
             return False
 
+        if subscriber.channels is not None and event_channel not in subscriber.channels:
+            return False
+
         if subscriber.recipient_id:
             if subscriber.include_broadcast:
                 return event_recipient in {subscriber.recipient_id, None}
@@ -1,11 +1,48 @@
 from __future__ import annotations
 
+import uuid
 from datetime import datetime
+from typing import Any
 
-from sqlalchemy import String, cast, or_, select
+from sqlalchemy import String, cast, event as sa_event, or_, select
 from sqlalchemy.orm import Session
 
+from app.db import ends_transaction
 from app.models.entities import Event
+from app.repositories.common import utc_now
+from app.services.event_stream import event_stream_broker
+
+_OUTBOX_KEY = 'repomesh.events.outbox'
+_OUTBOX_WATCHED_KEY = 'repomesh.events.outbox_watched'
+
+
+def event_record(event: Event) -> dict[str, Any]:
+    """The stream form of an event, as `EventResponse` serializes it."""
+    return {
+        'id': event.id,
+        'repo_id': event.repo_id,
+        'agent_id': event.agent_id,
+        'task_id': event.task_id,
+        'recipient_id': event.recipient_id,
+        'parent_message_id': event.parent_message_id,
+        'channel': event.channel,
+        'type': event.type,
+        'severity': event.severity,
+        'payload': event.payload,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def _publish_outbox(session: Session) -> None:
+    if not ends_transaction(session):
+        return
+    for record in session.info.pop(_OUTBOX_KEY, None) or []:
+        event_stream_broker.publish_nowait(record)
+
+
+def _discard_outbox(session: Session) -> None:
+    if ends_transaction(session):
+        session.info.pop(_OUTBOX_KEY, None)
 
 
 class EventService:
@@ -41,6 +78,42 @@ class EventService:
         self.db.refresh(event)
         return event
 
+    def stage(
+        self,
+        *,
+        event_type: str,
+        payload: dict,
+        severity: str,
+        task_id: str | None,
+        agent_id: str | None,
+        repo_id: str | None,
+        recipient_id: str | None = None,
+        channel: str | None = None,
+    ) -> Event:
+        """Add an event to the open transaction; it reaches stream subscribers once that commits.
+
+        The caller commits. A rollback drops the event without publishing it.
+        """
+        event = Event(
+            id=str(uuid.uuid4()),
+            type=event_type,
+            payload=payload,
+            severity=severity,
+            task_id=task_id,
+            agent_id=agent_id,
+            repo_id=repo_id,
+            recipient_id=recipient_id,
+            channel=channel or 'default',
+            created_at=utc_now(),
+        )
+        self.db.add(event)
+        if not self.db.info.get(_OUTBOX_WATCHED_KEY):
+            self.db.info[_OUTBOX_WATCHED_KEY] = True
+            sa_event.listen(self.db, 'after_commit', _publish_outbox)
+            sa_event.listen(self.db, 'after_rollback', _discard_outbox)
+        self.db.info.setdefault(_OUTBOX_KEY, []).append(event_record(event))
+        return event
+
     def list(
         self,
         *,
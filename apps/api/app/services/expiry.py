@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.config.settings import get_settings
+from app.db import engine_state, existing_engine_state
+from app.models.entities import Agent, AgentSession, ResourceLock, Task, TaskClaim
+from app.repositories.common import as_utc, utc_now
+from app.services.change_feed import change_feed
+from app.services.lock_stats import lock_stats_for
+from app.services.locks import LockService
+from app.services.session_table import session_table_for
+
+KINDS = ('locks', 'claims', 'sessions')
+
+_NEVER = datetime.max.replace(tzinfo=timezone.utc)
+# Times a claim batch is re-read after a concurrent task update before the sweep yields.
+_MAX_STALE_RETRIES = 2
+
+
+class ExpiryDeadlines:
+    """Earliest pending deadline per lease kind, so an idle check costs no query.
+
+    Writers lower a deadline with `note`; a sweep replaces it with the indexed
+    `min(expires_at)` it reads afterwards. Deadlines are re-read from the database at
+    least every `recheck_seconds` to pick up leases written by other processes.
+    """
+
+    def __init__(self, *, recheck_seconds: float = 30.0) -> None:
+        self.recheck_seconds = recheck_seconds
+        self._mutex = threading.Lock()
+        # None means unknown: the next check has to look.
+        self._next: dict[str, datetime | None] = dict.fromkeys(KINDS)
+        # Lowest deadline noted while a sweep of that kind was running.
+        self._noted: dict[str, datetime] = dict.fromkeys(KINDS, _NEVER)
+        self._checked_at: dict[str, float] = dict.fromkeys(KINDS, 0.0)
+
+    def note(self, kind: str, expires_at: datetime) -> None:
+        expires_at = as_utc(expires_at)
+        with self._mutex:
+            current = self._next[kind]
+            if current is not None and expires_at < current:
+                self._next[kind] = expires_at
+            if expires_at < self._noted[kind]:
+                self._noted[kind] = expires_at
+
+    def due(self, now: datetime) -> list[str]:
+        stale_before = time.monotonic() - self.recheck_seconds
+        with self._mutex:
+            return [
+                kind
+                for kind in KINDS
+                if self._next[kind] is None or self._next[kind] <= now or self._checked_at[kind] < stale_before
+            ]
+
+    def next_deadline(self) -> datetime | None:
+        with self._mutex:
+            known = [value for value in self._next.values() if value is not None and value is not _NEVER]
+        return min(known) if known else None
+
+    def begin(self, kind: str) -> None:
+        with self._mutex:
+            self._noted[kind] = _NEVER
+
+    def settle(self, kind: str, next_at: datetime | None) -> None:
+        with self._mutex:
+            self._next[kind] = min(as_utc(next_at) if next_at else _NEVER, self._noted[kind])
+            self._checked_at[kind] = time.monotonic()
+
+
+def expiry_deadlines_for(db: Session) -> ExpiryDeadlines:
+    return engine_state(db, 'expiry_deadlines', ExpiryDeadlines)
+
+
+class ExpiryService:
+    """Expires lapsed locks, task claims and agent sessions at their deadlines, in batches."""
+
+    def __init__(self, db: Session, *, batch_size: int | None = None):
+        self.db = db
+        change_feed.watch(db)
+        self.batch_size = batch_size or get_settings().expiry_batch_size
+        self.deadlines = expiry_deadlines_for(db)
+
+    def run_due(
+        self, *, now: datetime | None = None, force: bool = False, kinds: tuple[str, ...] = KINDS
+    ) -> dict[str, int]:
+        """Sweep only the kinds whose earliest deadline has passed; free when nothing is due."""
+        now = now or utc_now()
+        result = dict.fromkeys(KINDS, 0)
+        for kind in kinds if force else [kind for kind in self.deadlines.due(now) if kind in kinds]:
+            self.deadlines.begin(kind)
+            if kind == 'locks':
+                result[kind] = self.expire_locks(now)
+            elif kind == 'claims':
+                result[kind] = self.expire_claims(now)
+            else:
+                result[kind] = self.expire_sessions(now)
+            self.deadlines.settle(kind, self._next_deadline(kind))
+        return result
+
+    def expire_locks(self, now: datetime) -> int:
+        total = 0
+        stats = lock_stats_for(self.db)
+        while True:
+            locks = self._due(ResourceLock, ResourceLock.state, now)
+            for lock in locks:
+                lock.state = 'expired'
+                stats.record_hold(
+                    lock.resource_key,
+                    held_seconds=(as_utc(lock.expires_at) - as_utc(lock.created_at)).total_seconds(),
+                    expired=True,
+                )
+            total += self._commit_batch(locks)
+            if len(locks) < self.batch_size:
+                return total
+
+    def expire_claims(self, now: datetime, *, task_id: str | None = None) -> int:
+        total = 0
+        conflicts = 0
+        while True:
+            claims = self._due(TaskClaim, TaskClaim.state, now, TaskClaim.task_id == task_id if task_id else None)
+            task_ids = {claim.task_id for claim in claims}
+            tasks = self.db.execute(select(Task).where(Task.id.in_(task_ids))).scalars().all() if task_ids else []
+            for claim in claims:
+                claim.state = 'expired'
+                claim.released_at = now
+            if claims:
+                LockService(self.db).release_claimed(claims, now=now)
+            for task in tasks:
+                if task.status in {'claimed', 'in_progress'}:
+                    task.status = 'stalled'
+            try:
+                total += self._commit_batch(claims)
+            except StaleDataError:
+                # A task was updated under the sweep (e.g. a PATCH); the batch is read
+                # again with the fresh row, and left to the next sweep if it keeps racing.
+                self.db.rollback()
+                conflicts += 1
+                if conflicts > _MAX_STALE_RETRIES:
+                    return total
+                continue
+            if len(claims) < self.batch_size:
+                return total
+
+    def expire_sessions(self, now: datetime) -> int:
+        """Mark lapsed sessions stale, then agents left without a live session inactive.
+
+        Two set-based UPDATEs per batch of `batch_size` sessions.
+        """
+        # Coalesced heartbeats land first so the sweep sees the in-memory liveness.
+        table = session_table_for(self.db)
+        table.flush(self.db)
+        live = select(AgentSession.id).where(
+            AgentSession.agent_id == Agent.id,
+            AgentSession.status == 'active',
+            AgentSession.expires_at >= now,
+        )
+        total = 0
+        while True:
+            batch = (
+                select(AgentSession.id)
+                .where(AgentSession.status == 'active', AgentSession.expires_at < now)
+                .order_by(AgentSession.expires_at)
+                .limit(self.batch_size)
+            )
+            stale = (
+                update(AgentSession)
+                .where(AgentSession.id.in_(batch.scalar_subquery()))
+                .values(status='stale')
+                .returning(AgentSession.agent_id)
+                .execution_options(synchronize_session=False)
+            )
+            touched = list(self.db.execute(stale).scalars())
+            if not touched:
+                return total
+            orphaned = (
+                update(Agent)
+                .where(Agent.id.in_(set(touched)), Agent.status != 'inactive', ~live.exists())
+                .values(status='inactive')
+                .returning(Agent)
+            )
+            # Bulk updates bypass the unit of work, so the status changes are fed to the change feed by hand.
+            for agent in self.db.execute(orphaned).scalars():
+                change_feed.capture(self.db, agent, op='update', changed=['status'])
+            self.db.commit()
+            table.forget(touched)
+            total += len(touched)
+            if len(touched) < self.batch_size:
+                return total
+
+    def _due(self, model: Any, state_column: Any, now: datetime, *criteria: Any) -> list[Any]:
+        stmt = (
+            select(model)
+            .where(state_column == 'active', model.expires_at < now, *[item for item in criteria if item is not None])
+            .order_by(model.expires_at)
+            .limit(self.batch_size)
+        )
+        return list(self.db.execute(stmt).scalars().all())
+
+    def _commit_batch(self, rows: list[Any]) -> int:
+        if rows:
+            self.db.commit()
+        return len(rows)
+
+    def _next_deadline(self, kind: str) -> datetime | None:
+        model, state_column = {
+            'locks': (ResourceLock, ResourceLock.state),
+            'claims': (TaskClaim, TaskClaim.state),
+            'sessions': (AgentSession, AgentSession.status),
+        }[kind]
+        return self.db.execute(select(func.min(model.expires_at)).where(state_column == 'active')).scalar()
+
+
+def _note_from_changes(bind: Any, records: list[dict[str, Any]]) -> None:
+    deadlines: ExpiryDeadlines | None = existing_engine_state(bind, 'expiry_deadlines')
+    if deadlines is None:
+        return
+    for record in records:
+        data = record.get('data') or {}
+        if record.get('entity') not in {'lock', 'claim'} or data.get('state') != 'active' or not data.get('expires_at'):
+            continue
+        deadlines.note('locks' if record['entity'] == 'lock' else 'claims', datetime.fromisoformat(data['expires_at']))
+
+
+change_feed.add_listener(_note_from_changes)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.db import SessionLocal
+from app.services.expiry import KINDS, ExpiryService
+from app.services.runtime_worker import RuntimeWorker
+from app.services.session_retention import SessionRetentionService
+from app.services.session_table import session_table_for
+
+
+class ExpiryRuntime:
+    """Background sweeper that wakes at the next lease deadline instead of polling on every request."""
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._guard = asyncio.Lock()
+        self._worker = RuntimeWorker('repomesh-expiry')
+        self._cycles = 0
+        self._expired = dict.fromkeys(KINDS, 0)
+        self._next_deadline: datetime | None = None
+        self._last_cycle_at: datetime | None = None
+        self._last_error: str | None = None
+        self._compacted_sessions = 0
+        self._compacted_at: float | None = None
+
+    async def start(self) -> dict[str, Any]:
+        async with self._guard:
+            if self._task and not self._task.done():
+                return self.status()
+            self._task = asyncio.create_task(self._run_loop(), name='repomesh-expiry-runtime')
+            return self.status()
+
+    async def stop(self) -> dict[str, Any]:
+        async with self._guard:
+            task = self._task
+            self._task = None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        return self.status()
+
+    def status(self) -> dict[str, Any]:
+        running = self._task is not None and not self._task.done()
+        return {
+            'running': running,
+            'cycles': self._cycles,
+            'expired': dict(self._expired),
+            'next_deadline': self._next_deadline.isoformat() if self._next_deadline else None,
+            'last_cycle_at': self._last_cycle_at.isoformat() if self._last_cycle_at else None,
+            'last_error': self._last_error,
+            'compacted_sessions': self._compacted_sessions,
+        }
+
+    def run_once_sync(self) -> dict[str, int]:
+        with SessionLocal() as db:
+            session_table_for(db).flush_if_due(db)
+            service = ExpiryService(db)
+            result = service.run_due()
+            self._next_deadline = service.deadlines.next_deadline()
+            self._compact_if_due(db)
+        self._cycles += 1
+        for kind, count in result.items():
+            self._expired[kind] += count
+        self._last_cycle_at = datetime.now(timezone.utc)
+        self._last_error = None
+        return result
+
+    def _compact_if_due(self, db: Session) -> None:
+        interval = get_settings().session_compaction_interval_seconds
+        if self._compacted_at is not None and time.monotonic() - self._compacted_at < interval:
+            return
+        self._compacted_at = time.monotonic()
+        compacted = SessionRetentionService(db).compact()
+        self._compacted_sessions += compacted['compacted_sessions']
+
+    def _sleep_seconds(self) -> float:
+        max_sleep = max(get_settings().expiry_max_sleep_seconds, 0.05)
+        if self._next_deadline is None:
+            return max_sleep
+        until = (self._next_deadline - datetime.now(timezone.utc)).total_seconds()
+        return min(max(until, 0.05), max_sleep)
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                await self._worker.run(self.run_once_sync)
+            except Exception as exc:  # pragma: no cover - defensive guardrail
+                self._last_error = str(exc)
+            await asyncio.sleep(self._sleep_seconds())
+
+
+expiry_runtime = ExpiryRuntime()
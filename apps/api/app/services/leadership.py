@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.db import SessionLocal
+from app.models.entities import Repo, RuntimeLease
+from app.repositories.common import utc_now
+from app.services.errors import AppError, ERROR_CONFLICT
+from app.services.runtime_worker import RuntimeWorker
+
+# Identifies this process among the API replicas sharing one database.
+REPLICA_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def shard_of(repo_id: str | None, shards: int) -> int:
+    """The orchestrator shard that owns a repo; tasks without a repo belong to shard 0."""
+    if shards <= 1 or repo_id is None:
+        return 0
+    return zlib.crc32(repo_id.encode()) % shards
+
+
+def lease_name(runtime: str, shard: int = 0, shards: int = 1) -> str:
+    return runtime if shards <= 1 else f'{runtime}:shard-{shard}-of-{shards}'
+
+
+class LeaseService:
+    """Named leases in `runtime_leases`.
+
+    A lease is held until `expires_at`; the holder renews it and anyone may take it once it
+    lapses. Every change of holder bumps `fencing_token`, so writes made under a lease can
+    check in their own transaction that it was not lost in the meantime.
+    """
+
+    def __init__(self, db: Session, *, holder_id: str = REPLICA_ID):
+        self.db = db
+        self.holder_id = holder_id
+
+    def acquire(self, name: str, *, ttl_seconds: float) -> int | None:
+        """Renew or take the lease; returns the fencing token, or None while another holder has it."""
+        now = utc_now()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        renewed = self.db.execute(
+            update(RuntimeLease)
+            .where(RuntimeLease.name == name, RuntimeLease.holder_id == self.holder_id, RuntimeLease.expires_at >= now)
+            .values(renewed_at=now, expires_at=expires_at)
+            .returning(RuntimeLease.fencing_token)
+        ).scalar()
+        if renewed is None:
+            # A lapsed lease changes hands with a new token, even back to its previous holder.
+            renewed = self.db.execute(
+                update(RuntimeLease)
+                .where(RuntimeLease.name == name, RuntimeLease.expires_at < now)
+                .values(
+                    holder_id=self.holder_id,
+                    fencing_token=RuntimeLease.fencing_token + 1,
+                    acquired_at=now,
+                    renewed_at=now,
+                    expires_at=expires_at,
+                )
+                .returning(RuntimeLease.fencing_token)
+            ).scalar()
+        if renewed is not None:
+            self.db.commit()
+            return renewed
+        if self.db.get(RuntimeLease, name) is not None:
+            self.db.rollback()
+            return None
+        self.db.add(
+            RuntimeLease(
+                name=name,
+                holder_id=self.holder_id,
+                fencing_token=1,
+                acquired_at=now,
+                renewed_at=now,
+                expires_at=expires_at,
+            )
+        )
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # Another replica created it first.
+            self.db.rollback()
+            return None
+        return 1
+
+    def release(self, name: str) -> None:
+        """Let the lease lapse now so a standby takes over on its next attempt; the token is kept."""
+        self.db.execute(
+            update(RuntimeLease)
+            .where(RuntimeLease.name == name, RuntimeLease.holder_id == self.holder_id)
+            .values(expires_at=utc_now())
+        )
+        self.db.commit()
+
+    def fence(self, name: str, token: int) -> None:
+        """Fail the open transaction unless this holder still has the lease at `token`; the caller commits."""
+        held = self.db.execute(
+            update(RuntimeLease)
+            .where(
+                RuntimeLease.name == name,
+                RuntimeLease.holder_id == self.holder_id,
+                RuntimeLease.fencing_token == token,
+                RuntimeLease.expires_at >= utc_now(),
+            )
+            .values(renewed_at=utc_now())
+        ).rowcount
+        if not held:
+            self.db.rollback()
+            raise AppError(
+                code=ERROR_CONFLICT,
+                message='Runtime lease lost',
+                status_code=409,
+                details={'lease': name, 'fencing_token': token},
+            )
+
+    def live_holders(self, prefix: str) -> set[str]:
+        return set(
+            self.db.execute(
+                select(RuntimeLease.holder_id).where(RuntimeLease.name.startswith(prefix), RuntimeLease.expires_at >= utc_now())
+            ).scalars()
+        )
+
+    def forget_lapsed(self, prefix: str, *, older_than_seconds: float) -> None:
+        cutoff = utc_now() - timedelta(seconds=older_than_seconds)
+        self.db.execute(delete(RuntimeLease).where(RuntimeLease.name.startswith(prefix), RuntimeLease.expires_at < cutoff))
+        self.db.commit()
+
+
+@dataclass(frozen=True)
+class LeaderScope:
+    """The shards one replica leads in a cycle, and the fencing tokens its writes carry."""
+
+    runtime: str
+    shards: int
+    tokens: dict[int, int] = field(default_factory=dict)
+
+    def owns(self, repo_id: str | None) -> bool:
+        return shard_of(repo_id, self.shards) in self.tokens
+
+    def repo_ids(self, db: Session) -> set[str | None] | None:
+        """Repos in the owned shards (None standing for tasks without a repo); None when unsharded."""
+        if self.shards <= 1:
+            return None
+        owned: set[str | None] = {repo_id for repo_id in db.execute(select(Repo.id)).scalars() if self.owns(repo_id)}
+        if self.owns(None):
+            owned.add(None)
+        return owned
+
+    def fence(self, db: Session) -> None:
+        leases = LeaseService(db)
+        for shard, token in sorted(self.tokens.items()):
+            leases.fence(lease_name(self.runtime, shard, self.shards), token)
+
+
+class LeaderElection:
+    """Contends for a runtime's lease from a background task when `LEADER_ELECTION` is on.
+
+    Held leases are renewed every third of `LEADER_LEASE_SECONDS` and standbys retry at the
+    same pace, so a crashed leader is replaced within about 1.3 lease periods and a stopped
+    one on the next attempt. With shards, each replica takes at most its fair share of the
+    shard leases (replicas are counted from presence leases) and gives up any excess.
+    """
+
+    def __init__(self, runtime: str, *, shards: int = 1) -> None:
+        self.runtime = runtime
+        self.shards = max(shards, 1)
+        self.tokens: dict[int, int] = {}
+        self._valid_until = 0.0
+        self._task: asyncio.Task | None = None
+        self._worker = RuntimeWorker(f'repomesh-lease-{runtime}')
+        self._last_error: str | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().leader_election
+
+    @property
+    def is_leader(self) -> bool:
+        if not self.enabled:
+            return True
+        return bool(self.tokens) and time.monotonic() < self._valid_until
+
+    def scope(self) -> LeaderScope | None:
+        """None when election is off: the runtime owns everything and nothing is fenced."""
+        if not self.enabled:
+            return None
+        return LeaderScope(runtime=self.runtime, shards=self.shards, tokens=dict(self.tokens))
+
+    async def start(self) -> None:
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(), name=f'repomesh-lease-{self.runtime}')
+        # Contend once before the runtime's first cycle.
+        await self._worker.run(self.contend_sync)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.tokens:
+            await self._worker.run(self.release_sync)
+
+    def status(self) -> dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'replica_id': REPLICA_ID,
+            'leader': self.is_leader,
+            'shards': self.shards,
+            'held_shards': sorted(self.tokens),
+            'fencing_tokens': {str(shard): token for shard, token in sorted(self.tokens.items())},
+            'last_error': self._last_error,
+        }
+
+    def contend_sync(self) -> None:
+        ttl = get_settings().leader_lease_seconds
+        started = time.monotonic()
+        with SessionLocal() as db:
+            leases = LeaseService(db)
+            quota = self.shards
+            if self.shards > 1:
+                presence = f'{self.runtime}:replica:'
+                leases.acquire(f'{presence}{REPLICA_ID}', ttl_seconds=ttl)
+                leases.forget_lapsed(presence, older_than_seconds=ttl * 10)
+                quota = math.ceil(self.shards / max(len(leases.live_holders(presence)), 1))
+            tokens: dict[int, int] = {}
+            # Held shards first, so a replica keeps what it has before reaching for more.
+            for shard in sorted(range(self.shards), key=lambda shard: shard not in self.tokens):
+                name = lease_name(self.runtime, shard, self.shards)
+                if len(tokens) >= quota:
+                    if shard in self.tokens:
+                        leases.release(name)
+                    continue
+                token = leases.acquire(name, ttl_seconds=ttl)
+                if token is not None:
+                    tokens[shard] = token
+        self.tokens = tokens
+        self._valid_until = started + ttl
+
+    def release_sync(self) -> None:
+        with SessionLocal() as db:
+            leases = LeaseService(db)
+            for shard in self.tokens:
+                leases.release(lease_name(self.runtime, shard, self.shards))
+            if self.shards > 1:
+                leases.release(f'{self.runtime}:replica:{REPLICA_ID}')
+        self.tokens = {}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(max(get_settings().leader_lease_seconds / 3, 0.1))
+            try:
+                await self._worker.run(self.contend_sync)
+                self._last_error = None
+            except Exception as exc:  # pragma: no cover - defensive guardrail
+                self.tokens = {}
+                self._last_error = str(exc)
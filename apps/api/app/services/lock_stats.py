@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.db import engine_state
+from app.repositories.common import utc_now
+
+# Upper bounds (ms) of the latency buckets; the last bucket is open-ended.
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1_000, 5_000, 30_000, 60_000, 300_000, 1_800_000)
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile (the max for the open bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return float(BUCKETS_MS[index]) if index < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'max_ms': round(self.max_ms, 3),
+            'buckets': [
+                {'le_ms': BUCKETS_MS[index] if index < len(BUCKETS_MS) else None, 'count': bucket_count}
+                for index, bucket_count in enumerate(self.counts)
+                if bucket_count
+            ],
+        }
+
+
+class KeyStats:
+    __slots__ = ('acquires', 'conflicts', 'timeouts', 'claim_conflicts', 'expired', 'wait', 'hold', 'last_conflict_at')
+
+    def __init__(self) -> None:
+        self.acquires = 0
+        self.conflicts = 0
+        self.timeouts = 0
+        self.claim_conflicts = 0
+        self.expired = 0
+        self.wait = Histogram()
+        self.hold = Histogram()
+        self.last_conflict_at: datetime | None = None
+
+    @property
+    def contention(self) -> int:
+        return self.conflicts + self.timeouts + self.claim_conflicts + self.wait.count
+
+    def as_dict(self, resource_key: str) -> dict[str, Any]:
+        attempts = self.acquires + self.conflicts + self.timeouts
+        return {
+            'resource_key': resource_key,
+            'acquires': self.acquires,
+            'conflicts': self.conflicts,
+            'timeouts': self.timeouts,
+            'claim_conflicts': self.claim_conflicts,
+            'expired': self.expired,
+            'conflict_rate': round((self.conflicts + self.timeouts) / attempts, 4) if attempts else 0.0,
+            'wait': self.wait.as_dict(),
+            'hold': self.hold.as_dict(),
+            'last_conflict_at': self.last_conflict_at.isoformat() if self.last_conflict_at else None,
+        }
+
+
+class LockStats:
+    """Per-key contention counters for locks and claims, kept in process memory.
+
+    At most `max_keys` keys are tracked; when the limit is hit, the least contended
+    tenth is dropped.
+    """
+
+    def __init__(self, *, max_keys: int = 10_000) -> None:
+        self.max_keys = max_keys
+        self.started_at = utc_now()
+        self._mutex = threading.Lock()
+        self._keys: dict[str, KeyStats] = {}
+
+    def record_acquire(self, resource_key: str, *, waited_seconds: float = 0.0) -> None:
+        with self._mutex:
+            stats = self._stats(resource_key)
+            stats.acquires += 1
+            if waited_seconds > 0:
+                stats.wait.add(waited_seconds * 1000)
+
+    def record_conflict(self, resource_key: str, *, waited_seconds: float = 0.0, timed_out: bool = False) -> None:
+        with self._mutex:
+            stats = self._stats(resource_key)
+            if timed_out:
+                stats.timeouts += 1
+                stats.wait.add(waited_seconds * 1000)
+            else:
+                stats.conflicts += 1
+            stats.last_conflict_at = utc_now()
+
+    def record_claim_conflict(self, resource_key: str) -> None:
+        with self._mutex:
+            stats = self._stats(resource_key)
+            stats.claim_conflicts += 1
+            stats.last_conflict_at = utc_now()
+
+    def record_hold(self, resource_key: str, *, held_seconds: float, expired: bool = False) -> None:
+        with self._mutex:
+            stats = self._stats(resource_key)
+            stats.hold.add(max(held_seconds, 0.0) * 1000)
+            if expired:
+                stats.expired += 1
+
+    def report(self, *, top: int = 50) -> dict[str, Any]:
+        with self._mutex:
+            ranked = sorted(
+                self._keys.items(),
+                key=lambda item: (item[1].contention, item[1].wait.total_ms, item[1].acquires),
+                reverse=True,
+            )[:top]
+            keys = [stats.as_dict(resource_key) for resource_key, stats in ranked]
+            totals = {
+                'keys': len(self._keys),
+                'acquires': sum(stats.acquires for stats in self._keys.values()),
+                'conflicts': sum(stats.conflicts for stats in self._keys.values()),
+                'timeouts': sum(stats.timeouts for stats in self._keys.values()),
+                'claim_conflicts': sum(stats.claim_conflicts for stats in self._keys.values()),
+            }
+        return {'since': self.started_at.isoformat(), 'totals': totals, 'keys': keys}
+
+    def _stats(self, resource_key: str) -> KeyStats:
+        stats = self._keys.get(resource_key)
+        if stats is None:
+            if len(self._keys) >= self.max_keys:
+                self._prune()
+            stats = self._keys[resource_key] = KeyStats()
+        return stats
+
+    def _prune(self) -> None:
+        ranked = sorted(self._keys, key=lambda key: (self._keys[key].contention, self._keys[key].acquires))
+        for key in ranked[: max(len(ranked) // 10, 1)]:
+            del self._keys[key]
+
+
+def lock_stats_for(db: Session) -> LockStats:
+    return engine_state(db, 'lock_stats', LockStats)
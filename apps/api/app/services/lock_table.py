@@ -0,0 +1,606 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.db import ends_transaction, engine_state, existing_engine_state
+from app.models.entities import ResourceLock
+from app.repositories.common import as_utc, utc_now
+from app.services.change_feed import change_feed
+from app.services.resource_keys import ResourceTrie, split_resource_key
+
+LOCK_MODES = ('shared', 'exclusive')
+
+_UNDO_KEY = 'repomesh.lock_table.undo'
+_TRACKED_KEY = 'repomesh.lock_table.tracked'
+
+
+@dataclass
+class LockEntry:
+    id: str
+    resource_key: str
+    owner_agent_id: str
+    created_at: datetime
+    expires_at: datetime
+    mode: str = 'exclusive'
+    path: tuple[str, ...] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.path = split_resource_key(self.resource_key)
+
+    def as_holder(self) -> dict[str, Any]:
+        return {
+            'lock_id': self.id,
+            'resource_key': self.resource_key,
+            'owner_agent_id': self.owner_agent_id,
+            'mode': self.mode,
+            'expires_at': self.expires_at.isoformat(),
+        }
+
+    @property
+    def exclusive(self) -> bool:
+        return self.mode == 'exclusive'
+
+
+@dataclass
+class LockGrant:
+    entry: LockEntry
+    created: bool
+    # holders whose lease lapsed and were evicted to make room for this grant
+    evicted: list[LockEntry] = field(default_factory=list)
+    waited_seconds: float = 0.0
+    # waiters ahead of this caller when it joined the key's queue
+    queue_position: int = 0
+
+
+class LockConflict(Exception):
+    def __init__(self, resource_key: str, holders: list[LockEntry], *, queued: int = 0):
+        super().__init__(resource_key)
+        self.resource_key = resource_key
+        self.holders = holders
+        self.queued = queued
+
+
+class LockWaitTimeout(LockConflict):
+    def __init__(self, resource_key: str, holders: list[LockEntry], *, queued: int, waited_seconds: float, queue_position: int):
+        super().__init__(resource_key, holders, queued=queued)
+        self.waited_seconds = waited_seconds
+        self.queue_position = queue_position
+
+
+class LockWaitersExhausted(LockConflict):
+    """Raised instead of parking another thread once `max_blocking_waiters` threads wait."""
+
+
+_WAITER_SEQ = itertools.count()
+
+
+@dataclass(eq=False)
+class _Waiter:
+    """One queued acquire, parked on its own thread or, with `loop`, on an event loop."""
+
+    resource_key: str
+    agent_id: str
+    mode: str
+    ttl: int
+    started: float
+    deadline: float
+    loop: asyncio.AbstractEventLoop | None = None
+    position: int = 0
+    seq: int = field(default_factory=lambda: next(_WAITER_SEQ))
+    path: tuple[str, ...] = field(init=False, repr=False)
+    _event: threading.Event | asyncio.Event = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.path = split_resource_key(self.resource_key)
+        self._event = threading.Event() if self.loop is None else asyncio.Event()
+
+    @property
+    def exclusive(self) -> bool:
+        return self.mode == 'exclusive'
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self._event.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self) -> None:
+        self._event.clear()
+
+    def park(self, timeout: float) -> None:
+        self._event.wait(timeout)
+
+    async def park_async(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class LockBatchConflict(Exception):
+    def __init__(self, conflicts: list[LockConflict]):
+        super().__init__([item.resource_key for item in conflicts])
+        self.conflicts = conflicts
+
+
+def canonical_order(resource_keys: list[str]) -> list[str]:
+    """Distinct keys sorted by path, so every caller takes overlapping sets in the same order."""
+    by_path: dict[tuple[str, ...], str] = {}
+    for key in resource_keys:
+        by_path.setdefault(split_resource_key(key), key)
+    return [by_path[path] for path in sorted(by_path)]
+
+
+class LockTable:
+    """Authoritative in-process view of active resource locks.
+
+    Acquire, renew and release are decided here under one mutex; `resource_locks` is
+    written through by `LockService` in the caller's transaction. Keys are indexed in a
+    path trie, so a lock on `file:src/` conflicts with one on `file:src/a.py` and the
+    reverse. Shared locks are compatible with each other; an exclusive lock is
+    compatible with nothing held by another agent. Expiry is tracked in a min-heap so
+    lapsed leases are evicted lazily without scanning the table.
+
+    Callers willing to wait park in a FIFO queue per key. Only the head of a queue
+    may take the key, and nobody may jump a non-empty queue or an earlier incompatible
+    waiter on an overlapping key; the head is woken when an overlapping lock is
+    released or when the blocking lease is due to expire. Event-loop callers park on
+    the loop (`wait_acquire_async`); at most `max_blocking_waiters` threads may park
+    in `wait_acquire`, so waiters cannot take every worker thread away from the
+    releases they wait for.
+    """
+
+    def __init__(self, *, max_blocking_waiters: int | None = None) -> None:
+        self._mutex = threading.RLock()
+        self._trie: ResourceTrie[LockEntry] = ResourceTrie()
+        self._by_id: dict[str, LockEntry] = {}
+        self._expiry: list[tuple[datetime, str]] = []
+        self._queues: dict[tuple[str, ...], deque[_Waiter]] = {}
+        self._loaded = False
+        if max_blocking_waiters is None:
+            max_blocking_waiters = get_settings().lock_max_blocking_waiters
+        self.max_blocking_waiters = max_blocking_waiters
+        self._blocking_waiters = 0
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Recover active, unexpired locks from `resource_locks` the first time this process needs them."""
+        if self._loaded:
+            return
+        with self._mutex:
+            if self._loaded:
+                return
+            now = utc_now()
+            rows = db.execute(
+                select(ResourceLock).where(ResourceLock.state == 'active', ResourceLock.expires_at >= now)
+            ).scalars().all()
+            for row in rows:
+                self._put(
+                    LockEntry(
+                        id=row.id,
+                        resource_key=row.resource_key,
+                        owner_agent_id=row.owner_agent_id,
+                        created_at=as_utc(row.created_at),
+                        expires_at=as_utc(row.expires_at),
+                        mode=row.mode,
+                    )
+                )
+            self._loaded = True
+
+    def __len__(self) -> int:
+        with self._mutex:
+            return len(self._by_id)
+
+    def get(self, lock_id: str) -> LockEntry | None:
+        with self._mutex:
+            self._evict_expired(utc_now())
+            return self._by_id.get(lock_id)
+
+    def holder(self, resource_key: str) -> LockEntry | None:
+        """The lock held on exactly this key, if any."""
+        with self._mutex:
+            self._evict_expired(utc_now())
+            return next(iter(self._trie.exact(split_resource_key(resource_key)).values()), None)
+
+    def held(self, resource_key: str, agent_id: str) -> LockEntry | None:
+        """The agent's own lock on exactly this key, if any."""
+        with self._mutex:
+            self._evict_expired(utc_now())
+            return self._trie.exact(split_resource_key(resource_key)).get(agent_id)
+
+    def conflicts(self, resource_key: str, agent_id: str, mode: str = 'exclusive') -> list[LockEntry]:
+        """Incompatible locks of other agents on this key, its ancestors or its descendants."""
+        with self._mutex:
+            self._evict_expired(utc_now())
+            return self._trie.conflicts(split_resource_key(resource_key), agent_id, exclusive=mode == 'exclusive')
+
+    def waiting(self, resource_key: str) -> int:
+        with self._mutex:
+            return len(self._queues.get(split_resource_key(resource_key), ()))
+
+    def try_acquire(
+        self, *, resource_key: str, agent_id: str, expires_at: datetime, now: datetime, mode: str = 'exclusive'
+    ) -> LockGrant:
+        return self._try_acquire(resource_key=resource_key, agent_id=agent_id, expires_at=expires_at, now=now, mode=mode)
+
+    def wait_acquire(
+        self, *, resource_key: str, agent_id: str, ttl: int, wait_seconds: float, mode: str = 'exclusive'
+    ) -> LockGrant:
+        """Like `try_acquire`, but queue behind earlier waiters for up to `wait_seconds`, parking this thread."""
+        joined = self._join(resource_key=resource_key, agent_id=agent_id, ttl=ttl, wait_seconds=wait_seconds, mode=mode)
+        if isinstance(joined, LockGrant):
+            return joined
+        try:
+            while True:
+                outcome = self._attempt(joined)
+                if isinstance(outcome, LockGrant):
+                    return outcome
+                joined.park(outcome)
+        finally:
+            with self._mutex:
+                self._leave(joined)
+
+    async def wait_acquire_async(
+        self, *, resource_key: str, agent_id: str, ttl: int, wait_seconds: float, mode: str = 'exclusive'
+    ) -> LockGrant:
+        """`wait_acquire` for event-loop callers: the wait parks on the running loop, not a thread."""
+        joined = self._join(
+            resource_key=resource_key,
+            agent_id=agent_id,
+            ttl=ttl,
+            wait_seconds=wait_seconds,
+            mode=mode,
+            loop=asyncio.get_running_loop(),
+        )
+        if isinstance(joined, LockGrant):
+            return joined
+        try:
+            while True:
+                outcome = self._attempt(joined)
+                if isinstance(outcome, LockGrant):
+                    return outcome
+                await joined.park_async(outcome)
+        finally:
+            with self._mutex:
+                self._leave(joined)
+
+    def _join(
+        self,
+        *,
+        resource_key: str,
+        agent_id: str,
+        ttl: int,
+        wait_seconds: float,
+        mode: str,
+        loop: asyncio.AbstractEventLoop | None = None,
+    ) -> LockGrant | _Waiter:
+        """Grant right away, or enqueue a waiter when the caller is willing to wait."""
+        started = time.monotonic()
+        with self._mutex:
+            now = utc_now()
+            try:
+                return self._try_acquire(
+                    resource_key=resource_key,
+                    agent_id=agent_id,
+                    expires_at=now + timedelta(seconds=ttl),
+                    now=now,
+                    mode=mode,
+                )
+            except LockConflict as exc:
+                if wait_seconds <= 0:
+                    raise
+                if loop is None and self._blocking_waiters >= self.max_blocking_waiters:
+                    raise LockWaitersExhausted(resource_key, exc.holders, queued=exc.queued) from exc
+            waiter = _Waiter(
+                resource_key=resource_key,
+                agent_id=agent_id,
+                mode=mode,
+                ttl=ttl,
+                started=started,
+                deadline=started + wait_seconds,
+                loop=loop,
+            )
+            queue = self._queues.setdefault(waiter.path, deque())
+            queue.append(waiter)
+            waiter.position = len(queue) - 1
+            if loop is None:
+                self._blocking_waiters += 1
+            return waiter
+
+    def _attempt(self, waiter: _Waiter) -> LockGrant | float:
+        """Try once for a queued waiter; the grant, or how long to park before trying again."""
+        with self._mutex:
+            blocking: list[LockEntry] = []
+            if self._queues[waiter.path][0] is waiter:
+                now = utc_now()
+                try:
+                    grant = self._try_acquire(
+                        resource_key=waiter.resource_key,
+                        agent_id=waiter.agent_id,
+                        expires_at=now + timedelta(seconds=waiter.ttl),
+                        now=now,
+                        mode=waiter.mode,
+                        waiter=waiter,
+                    )
+                except LockConflict as exc:
+                    blocking = exc.holders
+                else:
+                    grant.waited_seconds = time.monotonic() - waiter.started
+                    grant.queue_position = waiter.position
+                    return grant
+            remaining = waiter.deadline - time.monotonic()
+            if remaining <= 0:
+                raise LockWaitTimeout(
+                    waiter.resource_key,
+                    blocking or self._trie.conflicts(waiter.path, waiter.agent_id, exclusive=waiter.exclusive),
+                    queued=len(self._queues[waiter.path]) - 1,
+                    waited_seconds=time.monotonic() - waiter.started,
+                    queue_position=waiter.position,
+                )
+            waiter.clear()
+        if blocking:
+            # Leases lapse without a release; wake up when the first one is due.
+            due = (min(item.expires_at for item in blocking) - utc_now()).total_seconds()
+            remaining = min(remaining, max(due, 0.0) + 0.005)
+        return remaining
+
+    def _try_acquire(
+        self,
+        *,
+        resource_key: str,
+        agent_id: str,
+        expires_at: datetime,
+        now: datetime,
+        mode: str = 'exclusive',
+        waiter: _Waiter | None = None,
+    ) -> LockGrant:
+        path = split_resource_key(resource_key)
+        with self._mutex:
+            evicted = self._evict_expired(now)
+            blocking = self._trie.conflicts(path, agent_id, exclusive=mode == 'exclusive')
+            if blocking:
+                raise LockConflict(resource_key, blocking, queued=len(self._queues.get(path, ())))
+            current = self._trie.exact(path).get(agent_id)
+            if current is not None:
+                if current.mode != mode:
+                    # Upgrade or downgrade in place; compatibility was checked above.
+                    self._trie.remove(path, agent_id)
+                    current.mode = mode
+                    self._trie.insert(path, agent_id, current, exclusive=current.exclusive)
+                    self._wake_overlapping(path)
+                self._set_expiry(current, expires_at)
+                return LockGrant(entry=current, created=False, evicted=evicted)
+            ahead = self._queued_ahead(path, agent_id, mode, waiter)
+            if ahead:
+                raise LockConflict(resource_key, [], queued=ahead)
+
+            entry = LockEntry(
+                id=str(uuid.uuid4()),
+                resource_key=resource_key,
+                owner_agent_id=agent_id,
+                created_at=now,
+                expires_at=expires_at,
+                mode=mode,
+            )
+            self._put(entry)
+            return LockGrant(entry=entry, created=True, evicted=evicted)
+
+    def try_acquire_many(
+        self, *, resource_keys: list[str], agent_id: str, expires_at: datetime, now: datetime, mode: str = 'exclusive'
+    ) -> list[LockGrant]:
+        """Grant every key or none; on failure every conflicting key is reported."""
+        keys = canonical_order(resource_keys)
+        with self._mutex:
+            evicted = self._evict_expired(now)
+            conflicts = [
+                conflict for key in keys if (conflict := self._batch_conflict(key, agent_id, mode)) is not None
+            ]
+            if conflicts:
+                raise LockBatchConflict(conflicts)
+            grants = [
+                self.try_acquire(resource_key=key, agent_id=agent_id, expires_at=expires_at, now=now, mode=mode)
+                for key in keys
+            ]
+            if grants:
+                grants[0].evicted = evicted
+            return grants
+
+    def _batch_conflict(self, resource_key: str, agent_id: str, mode: str) -> LockConflict | None:
+        path = split_resource_key(resource_key)
+        blocking = self._trie.conflicts(path, agent_id, exclusive=mode == 'exclusive')
+        queued = self._queued_ahead(path, agent_id, mode, None)
+        if blocking or (queued and agent_id not in self._trie.exact(path)):
+            return LockConflict(resource_key, blocking, queued=queued)
+        return None
+
+    def renew(self, lock_id: str, expires_at: datetime) -> datetime | None:
+        """Move a lock's deadline; returns the previous one for undo."""
+        with self._mutex:
+            entry = self._by_id.get(lock_id)
+            if entry is None:
+                return None
+            previous = entry.expires_at
+            self._set_expiry(entry, expires_at)
+            return previous
+
+    def forget(self, lock_id: str) -> LockEntry | None:
+        with self._mutex:
+            entry = self._by_id.pop(lock_id, None)
+            if entry is not None and self._trie.exact(entry.path).get(entry.owner_agent_id) is entry:
+                self._trie.remove(entry.path, entry.owner_agent_id)
+                self._wake_overlapping(entry.path)
+            return entry
+
+    def restore(self, entry: LockEntry) -> None:
+        with self._mutex:
+            if self._can_place(entry):
+                self._put(entry)
+
+    def apply_change(self, record: dict[str, Any]) -> None:
+        """Fold a committed `lock.*` change record from another code path into the table."""
+        data = record.get('data') or {}
+        lock_id = data.get('id')
+        if not lock_id:
+            return
+        if record.get('op') == 'delete' or data.get('state') != 'active':
+            self.forget(lock_id)
+            return
+        expires_at = as_utc(datetime.fromisoformat(data['expires_at']))
+        with self._mutex:
+            if lock_id in self._by_id:
+                self._set_expiry(self._by_id[lock_id], expires_at)
+                return
+            entry = LockEntry(
+                id=lock_id,
+                resource_key=data['resource_key'],
+                owner_agent_id=data['owner_agent_id'],
+                created_at=utc_now(),
+                expires_at=expires_at,
+                mode=data.get('mode') or 'exclusive',
+            )
+            if self._can_place(entry):
+                self._put(entry)
+
+    def _can_place(self, entry: LockEntry) -> bool:
+        return (
+            entry.owner_agent_id not in self._trie.exact(entry.path)
+            and not self._trie.conflicts(entry.path, entry.owner_agent_id, exclusive=entry.exclusive, limit=1)
+        )
+
+    def _queued_ahead(self, path: tuple[str, ...], agent_id: str, mode: str, waiter: _Waiter | None) -> int:
+        """Waiters a caller may not overtake: everyone ahead of it on its own key, and earlier
+        incompatible waiters on overlapping keys that the caller does not already block."""
+        seq = waiter.seq if waiter is not None else math.inf
+        ahead = 0
+        for queued_path, queue in self._queues.items():
+            if queued_path == path:
+                ahead += sum(1 for item in queue if item.seq < seq)
+            elif _overlaps(path, queued_path):
+                ahead += sum(
+                    1
+                    for item in queue
+                    if item.seq < seq
+                    and item.agent_id != agent_id
+                    and (mode == 'exclusive' or item.exclusive)
+                    and not self._blocked_by(item, agent_id)
+                )
+        return ahead
+
+    def _blocked_by(self, waiter: _Waiter, agent_id: str) -> bool:
+        # Overtaking a waiter that this agent's own locks already hold up costs it nothing.
+        holders = self._trie.conflicts(waiter.path, waiter.agent_id, exclusive=waiter.exclusive)
+        return any(holder.owner_agent_id == agent_id for holder in holders)
+
+    def _wake_overlapping(self, path: tuple[str, ...]) -> None:
+        for queued_path, queue in self._queues.items():
+            if queue and _overlaps(path, queued_path):
+                queue[0].wake()
+
+    def _leave(self, waiter: _Waiter) -> None:
+        if waiter.loop is None:
+            self._blocking_waiters -= 1
+        queue = self._queues.get(waiter.path)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[waiter.path]
+        # The waiter may have held up the heads of its own and overlapping queues.
+        self._wake_overlapping(waiter.path)
+
+    def _put(self, entry: LockEntry) -> None:
+        self._trie.insert(entry.path, entry.owner_agent_id, entry, exclusive=entry.exclusive)
+        self._by_id[entry.id] = entry
+        heapq.heappush(self._expiry, (entry.expires_at, entry.id))
+
+    def _set_expiry(self, entry: LockEntry, expires_at: datetime) -> None:
+        if entry.expires_at == expires_at:
+            return
+        entry.expires_at = expires_at
+        # The old heap item becomes stale and is skipped when popped.
+        heapq.heappush(self._expiry, (expires_at, entry.id))
+
+    def _evict_expired(self, now: datetime) -> list[LockEntry]:
+        evicted: list[LockEntry] = []
+        while self._expiry and self._expiry[0][0] < now:
+            deadline, lock_id = heapq.heappop(self._expiry)
+            entry = self._by_id.get(lock_id)
+            if entry is None or entry.expires_at != deadline:
+                continue
+            self.forget(lock_id)
+            evicted.append(entry)
+        return evicted
+
+
+def _overlaps(path: tuple[str, ...], other: tuple[str, ...]) -> bool:
+    shorter = min(len(path), len(other))
+    return path[:shorter] == other[:shorter]
+
+
+def lock_table_for(db: Session) -> LockTable:
+    table = engine_state(db, 'lock_table', LockTable)
+    table.ensure_loaded(db)
+    return table
+
+
+def stage_undo(db: Session, undo: Callable[[], None]) -> None:
+    """Register an in-memory compensation that runs if the session's transaction rolls back."""
+    if not db.info.get(_TRACKED_KEY):
+        db.info[_TRACKED_KEY] = True
+        event.listen(db, 'after_commit', _discard_undo)
+        event.listen(db, 'after_rollback', _run_undo)
+    db.info.setdefault(_UNDO_KEY, []).append(undo)
+
+
+def undo_mark(db: Session) -> int:
+    """A marker for the compensations staged so far in the session's transaction."""
+    return len(db.info.get(_UNDO_KEY, ()))
+
+
+def undo_since(db: Session, mark: int) -> None:
+    """Run the compensations staged after `mark`, when the savepoint that needed them rolls back."""
+    staged = db.info.get(_UNDO_KEY, [])
+    for undo in reversed(staged[mark:]):
+        undo()
+    del staged[mark:]
+
+
+def _discard_undo(session: Session) -> None:
+    if ends_transaction(session):
+        session.info.pop(_UNDO_KEY, None)
+
+
+def _run_undo(session: Session) -> None:
+    if not ends_transaction(session):
+        return
+    for undo in reversed(session.info.pop(_UNDO_KEY, [])):
+        undo()
+
+
+def _sync_from_changes(bind: Any, records: list[dict[str, Any]]) -> None:
+    table: LockTable | None = existing_engine_state(bind, 'lock_table')
+    if table is None:
+        return
+    for record in records:
+        if record.get('entity') == 'lock':
+            table.apply_change(record)
+
+
+change_feed.add_listener(_sync_from_changes)
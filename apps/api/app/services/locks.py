@@ -1,63 +1,280 @@
 from __future__ import annotations
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 
-from sqlalchemy import select
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models.entities import ResourceLock
-from app.repositories.common import utc_now
-from app.services.errors import AppError, ERROR_CONFLICT, ERROR_NOT_FOUND
+from app.db import begin_savepoint
+from app.models.entities import ResourceLock, TaskClaim
+from app.repositories.common import as_utc, utc_now
+from app.services.change_feed import change_feed
+from app.services.errors import AppError, ERROR_CONFLICT, ERROR_NOT_FOUND, ERROR_TOO_MANY_REQUESTS, ERROR_VALIDATION
+from app.services.lock_table import (
+    LOCK_MODES,
+    LockBatchConflict,
+    LockConflict,
+    LockEntry,
+    LockGrant,
+    LockWaitersExhausted,
+    LockWaitTimeout,
+    lock_table_for,
+    stage_undo,
+)
+from app.services.lock_stats import lock_stats_for
+from app.services.resource_keys import keys_overlap, split_resource_key
+
+
+_UPSERT_INSERTS = {'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
 
 
 class LockService:
     def __init__(self, db: Session):
         self.db = db
+        change_feed.watch(db)
+        self.table = lock_table_for(db)
+        self.stats = lock_stats_for(db)
+        # The most recent grant, so callers can report how long it waited.
+        self.last_grant: LockGrant | None = None
 
-    def _expire_stale(self, resource_key: str | None = None) -> None:
-        now = utc_now()
-        stmt = select(ResourceLock).where(ResourceLock.state == 'active', ResourceLock.expires_at < now)
-        if resource_key:
-            stmt = stmt.where(ResourceLock.resource_key == resource_key)
-        stale = self.db.execute(stmt).scalars().all()
-        for lock in stale:
-            lock.state = 'expired'
+    def acquire(
+        self,
+        *,
+        resource_key: str,
+        agent_id: str,
+        ttl: int,
+        wait_seconds: float = 0,
+        mode: str = 'exclusive',
+        commit: bool = True,
+    ) -> ResourceLock:
+        # The conflict decision is made in memory; the database only sees the
+        # resulting write (one INSERT, or one UPDATE when re-acquiring). With
+        # commit=False the write joins the caller's transaction and a conflict
+        # leaves it untouched; the grant is undone if that transaction rolls back.
+        self._validate_mode(mode)
+        try:
+            if wait_seconds > 0:
+                grant = self.table.wait_acquire(
+                    resource_key=resource_key, agent_id=agent_id, ttl=ttl, wait_seconds=wait_seconds, mode=mode
+                )
+            else:
+                now = utc_now()
+                grant = self.table.try_acquire(
+                    resource_key=resource_key,
+                    agent_id=agent_id,
+                    expires_at=now + timedelta(seconds=ttl),
+                    now=now,
+                    mode=mode,
+                )
+        except LockConflict as exc:
+            raise self._refused(exc) from exc
+        return self.write_grant(grant, commit=commit)
 
-    def acquire(self, *, resource_key: str, agent_id: str, ttl: int) -> ResourceLock:
-        self._expire_stale(resource_key)
-        now = utc_now()
-        active = self.db.execute(
-            select(ResourceLock).where(
-                ResourceLock.resource_key == resource_key,
-                ResourceLock.state == 'active',
-                ResourceLock.expires_at >= now,
+    async def reserve(
+        self, *, resource_key: str, agent_id: str, ttl: int, wait_seconds: float = 0, mode: str = 'exclusive'
+    ) -> LockGrant:
+        """Take the key in memory from an event-loop caller, parking on the loop while it waits.
+
+        Nothing is written; hand the grant to `write_grant` off the loop.
+        """
+        self._validate_mode(mode)
+        try:
+            return await self.table.wait_acquire_async(
+                resource_key=resource_key, agent_id=agent_id, ttl=ttl, wait_seconds=wait_seconds, mode=mode
             )
-        ).scalars().all()
+        except LockConflict as exc:
+            raise self._refused(exc) from exc
 
-        for lock in active:
-            if lock.owner_agent_id != agent_id:
-                raise AppError(code=ERROR_CONFLICT, message='Resource already locked', status_code=409)
+    def write_grant(self, grant: LockGrant, *, commit: bool = True) -> ResourceLock:
+        self.stats.record_acquire(grant.entry.resource_key, waited_seconds=grant.waited_seconds)
+        self.last_grant = grant
+        try:
+            lock = self._write_grant(grant)
+        except AppError:
+            if commit:
+                self.db.rollback()
+            raise
+        if commit:
+            self.db.commit()
+        return lock
 
-        if active:
-            lock = active[0]
-            lock.expires_at = now + timedelta(seconds=ttl)
+    def acquire_many(
+        self, *, resource_keys: list[str], agent_id: str, ttl: int, mode: str = 'exclusive', commit: bool = True
+    ) -> list[ResourceLock]:
+        """Take every key in canonical order in one transaction, or none of them."""
+        self._validate_mode(mode)
+        now = utc_now()
+        try:
+            grants = self.table.try_acquire_many(
+                resource_keys=resource_keys,
+                agent_id=agent_id,
+                expires_at=now + timedelta(seconds=ttl),
+                now=now,
+                mode=mode,
+            )
+        except LockBatchConflict as exc:
+            for item in exc.conflicts:
+                self.stats.record_conflict(item.resource_key)
+            raise AppError(
+                code=ERROR_CONFLICT,
+                message='Resources already locked',
+                status_code=409,
+                details={
+                    'conflicts': [
+                        {'resource_key': item.resource_key, 'holders': [holder.as_holder() for holder in item.holders]}
+                        for item in exc.conflicts
+                    ]
+                },
+            ) from exc
+
+        for grant in grants:
+            self.stats.record_acquire(grant.entry.resource_key)
+        try:
+            locks = [self._write_grant(grant) for grant in grants]
+        except AppError:
+            if commit:
+                self.db.rollback()
+            raise
+        if commit:
             self.db.commit()
-            self.db.refresh(lock)
+        return locks
+
+    def _write_grant(self, grant: LockGrant) -> ResourceLock:
+        entry = grant.entry
+        if grant.evicted:
+            self._mark_expired(grant.evicted)
+        if not grant.created:
+            lock = self.db.get(ResourceLock, entry.id)
+            lock.expires_at = entry.expires_at
+            if lock.mode != entry.mode:
+                self._change_mode(lock, entry)
             return lock
 
-        lock = ResourceLock(
-            resource_key=resource_key,
-            owner_agent_id=agent_id,
-            state='active',
-            created_at=now,
-            expires_at=now + timedelta(seconds=ttl),
+        stage_undo(self.db, lambda: self.table.forget(entry.id))
+        lock = self._insert_active(entry)
+        if lock is None:
+            # The unique index saw an active row this process did not know about: a
+            # lapsed lease nobody marked yet, or a lock taken through another worker.
+            self._expire_lapsed(entry.resource_key)
+            lock = self._insert_active(entry)
+        if lock is None:
+            self.table.forget(entry.id)
+            self.stats.record_conflict(entry.resource_key)
+            raise self._conflict(LockConflict(entry.resource_key, self._adopt_holder(entry.resource_key)))
+        return lock
+
+    def _change_mode(self, lock: ResourceLock, entry: LockEntry) -> None:
+        """Write an upgrade or downgrade the table granted, guarded like a new exclusive row."""
+        previous = lock.mode
+        for attempt in range(2):
+            try:
+                with begin_savepoint(self.db):
+                    lock.mode = entry.mode
+                    self.db.flush()
+                return
+            except IntegrityError:
+                # Another active exclusive row holds the key: a lapsed lease nobody
+                # marked yet, or a lock taken through another worker.
+                if attempt == 0:
+                    self._expire_lapsed(entry.resource_key)
+        self.table.forget(entry.id)
+        entry.mode = previous
+        self.table.restore(entry)
+        self.stats.record_conflict(entry.resource_key)
+        raise self._conflict(LockConflict(entry.resource_key, self._adopt_holder(entry.resource_key)))
+
+    def _insert_active(self, entry: LockEntry) -> ResourceLock | None:
+        """One INSERT .. ON CONFLICT DO NOTHING against the active-key index; None when the key is taken."""
+        values = {
+            'id': entry.id,
+            'resource_key': entry.resource_key,
+            'owner_agent_id': entry.owner_agent_id,
+            'mode': entry.mode,
+            'state': 'active',
+            'created_at': entry.created_at,
+            'expires_at': entry.expires_at,
+        }
+        dialect = self.db.get_bind().dialect.name
+        insert = _UPSERT_INSERTS.get(dialect)
+        if insert is None or not entry.exclusive:
+            # Shared locks are not covered by the unique index, so an exclusive row taken
+            # through another worker is looked up first. Two workers racing between this
+            # read and their inserts are only told apart by their lock tables.
+            if not entry.exclusive and self._exclusive_row_elsewhere(entry):
+                return None
+            lock = ResourceLock(**values)
+            self.db.add(lock)
+            self.db.flush()
+            return lock
+        stmt = (
+            insert(ResourceLock)
+            .values(**values)
+            .on_conflict_do_nothing(
+                index_elements=['resource_key'],
+                index_where=(ResourceLock.state == 'active') & (ResourceLock.mode == 'exclusive'),
+            )
+            .returning(ResourceLock)
         )
-        self.db.add(lock)
-        self.db.commit()
-        self.db.refresh(lock)
+        lock = self.db.execute(stmt).scalars().first()
+        if lock is not None:
+            # A Core insert bypasses the unit of work, so the flush hook never sees it.
+            change_feed.capture(self.db, lock, op='insert')
         return lock
 
+    def _exclusive_row_elsewhere(self, entry: LockEntry) -> bool:
+        return (
+            self.db.execute(
+                select(ResourceLock.id).where(
+                    ResourceLock.resource_key == entry.resource_key,
+                    ResourceLock.state == 'active',
+                    ResourceLock.mode == 'exclusive',
+                    ResourceLock.owner_agent_id != entry.owner_agent_id,
+                )
+            ).first()
+            is not None
+        )
+
+    def _expire_lapsed(self, resource_key: str) -> None:
+        self.db.execute(
+            update(ResourceLock)
+            .where(
+                ResourceLock.resource_key == resource_key,
+                ResourceLock.state == 'active',
+                ResourceLock.mode == 'exclusive',
+                ResourceLock.expires_at < utc_now(),
+            )
+            .values(state='expired')
+        )
+
+    def _adopt_holder(self, resource_key: str) -> list[LockEntry]:
+        row = self.db.execute(
+            select(ResourceLock).where(
+                ResourceLock.resource_key == resource_key,
+                ResourceLock.state == 'active',
+                ResourceLock.mode == 'exclusive',
+            )
+        ).scalars().first()
+        if row is None:
+            return []
+        holder = LockEntry(
+            id=row.id,
+            resource_key=row.resource_key,
+            owner_agent_id=row.owner_agent_id,
+            created_at=as_utc(row.created_at),
+            expires_at=as_utc(row.expires_at),
+            mode=row.mode,
+        )
+        self.table.restore(holder)
+        return [holder]
+
     def renew(self, *, lock_id: str, agent_id: str, ttl: int) -> ResourceLock:
+        entry = self.table.get(lock_id)
+        if entry is not None and entry.owner_agent_id != agent_id:
+            raise AppError(code=ERROR_CONFLICT, message='Lock owner mismatch', status_code=409)
+
         lock = self.db.get(ResourceLock, lock_id)
         if not lock:
             raise AppError(code=ERROR_NOT_FOUND, message='Lock not found', status_code=404)
@@ -66,29 +283,179 @@ class LockService:
         if lock.state != 'active':
             raise AppError(code=ERROR_CONFLICT, message='Lock is not active', status_code=409)
 
-        lock.expires_at = utc_now() + timedelta(seconds=ttl)
+        expires_at = utc_now() + timedelta(seconds=ttl)
+        if entry is None:
+            # The lease lapsed but nobody took the key yet: the owner may revive it.
+            if self.table.conflicts(lock.resource_key, agent_id, lock.mode):
+                raise AppError(code=ERROR_CONFLICT, message='Lock is not active', status_code=409)
+            revived = LockEntry(
+                id=lock.id,
+                resource_key=lock.resource_key,
+                owner_agent_id=agent_id,
+                created_at=utc_now(),
+                expires_at=expires_at,
+                mode=lock.mode,
+            )
+            self.table.restore(revived)
+            stage_undo(self.db, lambda: self.table.forget(lock_id))
+        else:
+            previous = self.table.renew(lock_id, expires_at)
+            stage_undo(self.db, lambda: self.table.renew(lock_id, previous))
+        lock.expires_at = expires_at
         self.db.commit()
-        self.db.refresh(lock)
         return lock
 
+    def renew_held(self, *, agent_ids: list[str], ttl: int, now: datetime) -> int:
+        """Extend every live lock the agents hold to at least `now + ttl`; the caller commits.
+
+        Rows are the source of truth, so locks taken through another worker are renewed
+        too; this process's table follows along for the entries it has.
+        """
+        floor = now + timedelta(seconds=ttl)
+        locks = self.db.execute(
+            select(ResourceLock).where(
+                ResourceLock.owner_agent_id.in_(agent_ids),
+                ResourceLock.state == 'active',
+                ResourceLock.expires_at >= now,
+            )
+        ).scalars().all()
+        for lock in locks:
+            # A lock taken with a longer TTL keeps its later deadline.
+            expires_at = max(as_utc(lock.expires_at), floor)
+            entry = self.table.get(lock.id)
+            if entry is not None and entry.owner_agent_id == lock.owner_agent_id and entry.expires_at < expires_at:
+                previous = self.table.renew(lock.id, expires_at)
+                stage_undo(self.db, lambda lock_id=lock.id, previous=previous: self.table.renew(lock_id, previous))
+            lock.expires_at = expires_at
+        return len(locks)
+
+    def release_claimed(self, claims: list[TaskClaim], *, now: datetime) -> int:
+        """Release the locks held for claims that ended; the caller commits.
+
+        That is the footprint dispatch stored on the claim, or the claim's own key. Only the
+        claiming agent's active rows are touched; the table follows through the change feed.
+        """
+        released = 0
+        for claim in claims:
+            keys = claim.footprint or [claim.resource_key]
+            locks = self.db.execute(
+                select(ResourceLock).where(
+                    ResourceLock.resource_key.in_(keys),
+                    ResourceLock.owner_agent_id == claim.agent_id,
+                    ResourceLock.state == 'active',
+                )
+            ).scalars().all()
+            for lock in locks:
+                lock.state = 'released'
+                lock.released_at = now
+            released += len(locks)
+        return released
+
     def release(self, *, lock_id: str, agent_id: str) -> ResourceLock:
+        entry = self.table.get(lock_id)
+        if entry is not None and entry.owner_agent_id != agent_id:
+            raise AppError(code=ERROR_CONFLICT, message='Lock owner mismatch', status_code=409)
+
         lock = self.db.get(ResourceLock, lock_id)
         if not lock:
             raise AppError(code=ERROR_NOT_FOUND, message='Lock not found', status_code=404)
         if lock.owner_agent_id != agent_id:
             raise AppError(code=ERROR_CONFLICT, message='Lock owner mismatch', status_code=409)
 
+        released = self.table.forget(lock_id)
+        if released is not None:
+            stage_undo(self.db, lambda: self.table.restore(released))
         lock.state = 'released'
         lock.released_at = utc_now()
         self.db.commit()
-        self.db.refresh(lock)
+        self.stats.record_hold(
+            lock.resource_key, held_seconds=(as_utc(lock.released_at) - as_utc(lock.created_at)).total_seconds()
+        )
         return lock
 
+    def held_by(self, *, resource_key: str, agent_id: str, mode: str = 'exclusive') -> bool:
+        """True when the agent already holds the key at least as strongly as `mode`."""
+        entry = self.table.held(resource_key, agent_id)
+        return entry is not None and (entry.exclusive or mode == 'shared')
+
+    def overlapping_row(self, resource_keys: list[str], *, agent_id: str, now: datetime) -> ResourceLock | None:
+        """A live row of another agent overlapping any of the keys, read from the database.
+
+        Catches grants made through another process's table, which only the exact-key
+        unique index would otherwise stop. Rows are narrowed by scheme, then compared by path.
+        """
+        schemes = {split_resource_key(key)[0] for key in resource_keys}
+        rows = self.db.execute(
+            select(ResourceLock).where(
+                ResourceLock.state == 'active',
+                ResourceLock.expires_at >= now,
+                ResourceLock.owner_agent_id != agent_id,
+                or_(*(ResourceLock.resource_key.like(f'{scheme}:%') for scheme in schemes)),
+            )
+        ).scalars()
+        return next((row for row in rows if any(keys_overlap(row.resource_key, key) for key in resource_keys)), None)
+
     def active_for(self, *, agent_id: str | None = None, resource_key: str | None = None) -> list[ResourceLock]:
-        self._expire_stale(resource_key)
-        stmt = select(ResourceLock).where(ResourceLock.state == 'active').order_by(ResourceLock.created_at.desc())
+        # Lapsed rows are left to the expiry sweep; readers just skip them.
+        stmt = (
+            select(ResourceLock)
+            .where(ResourceLock.state == 'active', ResourceLock.expires_at >= utc_now())
+            .order_by(ResourceLock.created_at.desc())
+        )
         if agent_id:
             stmt = stmt.where(ResourceLock.owner_agent_id == agent_id)
         if resource_key:
             stmt = stmt.where(ResourceLock.resource_key == resource_key)
         return list(self.db.execute(stmt).scalars().all())
+
+    def _mark_expired(self, entries: list[LockEntry]) -> None:
+        for item in entries:
+            self.stats.record_hold(
+                item.resource_key, held_seconds=(item.expires_at - item.created_at).total_seconds(), expired=True
+            )
+        self.db.execute(
+            update(ResourceLock)
+            .where(ResourceLock.id.in_([item.id for item in entries]), ResourceLock.state == 'active')
+            .values(state='expired')
+        )
+
+    @staticmethod
+    def _validate_mode(mode: str) -> None:
+        if mode not in LOCK_MODES:
+            raise AppError(
+                code=ERROR_VALIDATION,
+                message='Invalid lock mode',
+                status_code=400,
+                details={'mode': mode, 'allowed': list(LOCK_MODES)},
+            )
+
+    def _refused(self, exc: LockConflict) -> AppError:
+        if isinstance(exc, LockWaitersExhausted):
+            return AppError(
+                code=ERROR_TOO_MANY_REQUESTS,
+                message='Too many callers waiting for locks',
+                status_code=429,
+                details={'resource_key': exc.resource_key, 'max_blocking_waiters': self.table.max_blocking_waiters},
+            )
+        self.stats.record_conflict(
+            exc.resource_key,
+            waited_seconds=getattr(exc, 'waited_seconds', 0.0),
+            timed_out=isinstance(exc, LockWaitTimeout),
+        )
+        return self._conflict(exc)
+
+    @staticmethod
+    def _conflict(exc: LockConflict) -> AppError:
+        details = {
+            'resource_key': exc.resource_key,
+            'holders': [item.as_holder() for item in exc.holders],
+            'queued': exc.queued,
+        }
+        if isinstance(exc, LockWaitTimeout):
+            details.update(
+                timed_out=True,
+                waited_ms=round(exc.waited_seconds * 1000),
+                queue_position=exc.queue_position,
+            )
+            return AppError(code=ERROR_CONFLICT, message='Timed out waiting for lock', status_code=409, details=details)
+        return AppError(code=ERROR_CONFLICT, message='Resource already locked', status_code=409, details=details)
@@ -1,17 +1,22 @@
 from __future__ import annotations
 
-from datetime import timedelta
+from collections import deque
+from datetime import datetime, timedelta
 
-from sqlalchemy import desc, select
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.config.settings import get_settings
-from app.models.entities import Agent, Task
-from app.repositories.common import utc_now
+from app.models.entities import Agent
+from app.repositories.common import as_utc, utc_now
 from app.services.agents import AgentService
 from app.services.errors import AppError, ERROR_CONFLICT
 from app.services.events import EventService
-from app.services.routing import RoutingPolicyService
+from app.services.expiry import ExpiryService
+from app.services.leadership import LeaderScope
+from app.services.routing import RoutingPolicyService, capability_index_for
+from app.services.scheduler import ConflictGraph, WorkerPool, candidate_tasks, fair_queue_for, task_footprint
+from app.services.session_table import session_table_for
 from app.services.tasks import TaskService
 
 
@@ -20,6 +25,8 @@ class OrchestratorEngine:
         self.agent_name = agent_name
         self.lease_ttl = lease_ttl
         self.routing = RoutingPolicyService()
+        # Set by the first full cycle; incremental cycles reuse it without re-registering.
+        self.agent_id: str | None = None
 
     def ensure_orchestrator_agent(self, db: Session) -> Agent:
         return AgentService(db).register(
@@ -35,12 +42,16 @@ class OrchestratorEngine:
             takeover_if_stale=True,
         )
 
-    def run_once(self, db: Session, *, max_assignments: int = 10) -> dict:
+    def run_once(self, db: Session, *, max_assignments: int = 10, scope: LeaderScope | None = None) -> dict:
         agent = self.ensure_orchestrator_agent(db)
+        self.agent_id = agent.id
         AgentService(db).heartbeat(agent_id=agent.id, status='active', current_task=None)
-        stale_sessions = AgentService(db).mark_stale_sessions()
-        stale_claims = TaskService(db).expire_stale_claims()
-        assignments = self._assign_pending_tasks(db, orchestrator_agent_id=agent.id, max_assignments=max_assignments)
+        expired = ExpiryService(db).run_due()
+        stale_sessions = expired['sessions']
+        stale_claims = expired['claims']
+        assignments = self._assign_pending_tasks(
+            db, orchestrator_agent_id=agent.id, max_assignments=max_assignments, scope=scope
+        )
         return {
             'orchestrator_agent_id': agent.id,
             'stale_sessions': stale_sessions,
@@ -48,57 +59,127 @@ class OrchestratorEngine:
             'assignments': assignments,
         }
 
-    def _assign_pending_tasks(self, db: Session, *, orchestrator_agent_id: str, max_assignments: int) -> list[dict]:
+    def run_incremental(
+        self,
+        db: Session,
+        *,
+        task_ids: set[str],
+        worker_ids: set[str],
+        max_assignments: int = 10,
+        scope: LeaderScope | None = None,
+    ) -> dict:
+        """Assign only what the triggers imply: the given tasks to any worker, then any task to the given workers."""
+        if self.agent_id is None:
+            return self.run_once(db, max_assignments=max_assignments, scope=scope)
+        assignments: list[dict] = []
+        if task_ids:
+            assignments += self._assign_pending_tasks(
+                db, orchestrator_agent_id=self.agent_id, max_assignments=max_assignments, task_ids=task_ids, scope=scope
+            )
+        if worker_ids and len(assignments) < max_assignments:
+            assignments += self._assign_pending_tasks(
+                db,
+                orchestrator_agent_id=self.agent_id,
+                max_assignments=max_assignments - len(assignments),
+                worker_ids=worker_ids,
+                scope=scope,
+            )
+        return {'orchestrator_agent_id': self.agent_id, 'assignments': assignments}
+
+    def _assign_pending_tasks(
+        self,
+        db: Session,
+        *,
+        orchestrator_agent_id: str,
+        max_assignments: int,
+        task_ids: set[str] | None = None,
+        worker_ids: set[str] | None = None,
+        scope: LeaderScope | None = None,
+    ) -> list[dict]:
+        """With a leader `scope`, only tasks of its shards are assigned and the batch commits only under its leases."""
         workers = self._active_workers(db, exclude_agent_id=orchestrator_agent_id)
+        if worker_ids is not None:
+            workers = [worker for worker in workers if worker.id in worker_ids]
         if not workers:
             return []
-
-        tasks = list(
-            db.execute(
-                select(Task)
-                .where(Task.status.in_(['pending', 'stalled']))
-                .order_by(desc(Task.priority), Task.created_at.asc())
-                .limit(max_assignments)
-            ).scalars().all()
-        )
+        pool = WorkerPool(db, workers)
+        if not pool.has_room():
+            return []
+        routes = capability_index_for(db)
+        routes.observe(workers)
+
+        repo_ids = scope.repo_ids(db) if scope is not None else None
+        # Shard leaders on other replicas dispatch to the same workers from their own pool
+        # and lock table, so each assignment is checked against the rows as well.
+        sharded = repo_ids is not None
+        tasks = candidate_tasks(db, per_level=max_assignments, task_ids=task_ids, repo_ids=repo_ids)
         if not tasks:
             return []
 
         task_service = TaskService(db)
         event_service = EventService(db)
         assignments: list[dict] = []
-        worker_idx = 0
+        queue = fair_queue_for(db)
+        now = utc_now()
+        claimants = task_service.live_claimants([task.id for task in tasks], now=now)
+        footprints = {task.id: task_footprint(task) for task in tasks}
+        conflicts = ConflictGraph(footprints)
+        # Tasks overlapping one already dispatched this cycle wait for a later one.
+        deferred: set[str] = set()
+        buckets = queue.buckets(tasks, now=now, aging_seconds=get_settings().orchestrator_priority_aging_seconds)
+
+        # The whole cycle is one transaction: every lock, claim, status change and
+        # assignment event commits together, and the events reach subscribers after.
+        while buckets and len(assignments) < max_assignments and pool.has_room():
+            level = queue.pick(buckets)
+            task = buckets[level].popleft()
+            if not buckets[level]:
+                del buckets[level]
+            if task.id in deferred:
+                continue
 
-        for task in tasks:
             decision = self.routing.decide(task)
-            matching = [candidate for candidate in workers if self.routing.supports(candidate, decision)]
-            if matching:
-                worker = matching[worker_idx % len(matching)]
-            else:
-                worker = workers[worker_idx % len(workers)]
-            worker_idx += 1
-            resource_key = self._derive_resource_key(task)
+            matching = pool.eligible(routes.eligible(decision))
+            load = pool.least_loaded(matching or pool.loads)
+            if load is None:
+                continue
+            worker = load.agent
+            if claimants.get(task.id, worker.id) != worker.id:
+                continue
+            resource_keys = footprints[task.id]
             try:
-                claim = task_service.claim(
-                    task_id=task.id,
+                claim = task_service.assign(
+                    task=task,
                     agent_id=worker.id,
-                    resource_key=resource_key,
+                    resource_keys=resource_keys,
                     lease_ttl=self.lease_ttl,
+                    now=now,
+                    capacity=load.capacity,
+                    check_rows=sharded,
                 )
             except AppError as exc:
-                if exc.code == ERROR_CONFLICT:
-                    continue
-                raise
-
-            task_service.update(task_id=task.id, status='in_progress', progress=0, summary=None, blocked_reason=None)
-            event_service.log(
+                if exc.code != ERROR_CONFLICT:
+                    raise
+                in_flight = (exc.details or {}).get('in_flight')
+                if in_flight is not None:
+                    # Another shard's leader filled the worker since the pool was read;
+                    # the task goes back to the front of its level for another worker.
+                    load.in_flight = max(load.in_flight, in_flight)
+                    buckets.setdefault(level, deque()).appendleft(task)
+                continue
+            load.in_flight += 1
+            queue.charge(level)
+            deferred |= conflicts.neighbours(task.id)
+
+            event_service.stage(
                 event_type='orchestrator.assignment',
                 payload={
                     'task_id': task.id,
                     'assigned_to': worker.id,
                     'assigned_to_name': worker.name,
-                    'resource_key': resource_key,
-                    'assigned_at': utc_now().isoformat(),
+                    'resource_key': resource_keys[0],
+                    'resource_keys': resource_keys,
+                    'assigned_at': now.isoformat(),
                     'route': {
                         'tier': decision.tier,
                         'adapter_profile': decision.adapter_profile,
@@ -110,7 +191,6 @@ class OrchestratorEngine:
                 agent_id=orchestrator_agent_id,
                 repo_id=task.repo_id,
                 recipient_id=worker.id,
-                parent_message_id=None,
                 channel='orchestration',
             )
             assignments.append(
@@ -119,7 +199,8 @@ class OrchestratorEngine:
                     'claim_id': claim.id,
                     'agent_id': worker.id,
                     'agent_name': worker.name,
-                    'resource_key': resource_key,
+                    'resource_key': resource_keys[0],
+                    'resource_keys': resource_keys,
                     'route': {
                         'tier': decision.tier,
                         'adapter_profile': decision.adapter_profile,
@@ -127,42 +208,28 @@ class OrchestratorEngine:
                 }
             )
 
+        if scope is not None and assignments:
+            scope.fence(db)
+        task_service.commit_assignments()
         return assignments
 
-    @staticmethod
-    def _derive_resource_key(task: Task) -> str:
-        scope = task.scope or {}
-        explicit = scope.get('resource_key')
-        if isinstance(explicit, str) and explicit.strip():
-            return explicit
-
-        files = scope.get('files')
-        if isinstance(files, list) and files:
-            first = files[0]
-            if isinstance(first, str) and first.strip():
-                return f'file:{first}'
-
-        component = scope.get('component')
-        if isinstance(component, str) and component.strip():
-            return f'component:{component}'
-
-        return f'task:{task.id}'
-
     @staticmethod
     def _active_workers(db: Session, *, exclude_agent_id: str) -> list[Agent]:
         settings = get_settings()
         now = utc_now()
         fresh_cutoff = now - timedelta(seconds=settings.session_ttl_seconds * 2)
-        return list(
-            db.execute(
-                select(Agent)
-                .where(
-                    Agent.status == 'active',
-                    Agent.id != exclude_agent_id,
-                    Agent.type != 'orchestrator',
-                    Agent.last_heartbeat_at.is_not(None),
-                    Agent.last_heartbeat_at >= fresh_cutoff,
-                )
-                .order_by(Agent.last_heartbeat_at.desc())
-            ).scalars().all()
-        )
+        table = session_table_for(db)
+        candidates = db.execute(
+            select(Agent).where(
+                Agent.status == 'active',
+                Agent.id != exclude_agent_id,
+                Agent.type != 'orchestrator',
+            )
+        ).scalars().all()
+        # Coalesced heartbeats are newer than the stored column until the next flush.
+        seen: dict[str, datetime] = {}
+        for agent in candidates:
+            last = table.last_seen(agent.id) or agent.last_heartbeat_at
+            if last is not None and as_utc(last) >= fresh_cutoff:
+                seen[agent.id] = as_utc(last)
+        return sorted((agent for agent in candidates if agent.id in seen), key=lambda agent: seen[agent.id], reverse=True)
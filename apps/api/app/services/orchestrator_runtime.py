@@ -1,29 +1,72 @@
 from __future__ import annotations
 
 import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Any
 
 from app.config.settings import get_settings
 from app.db import SessionLocal
+from app.services.change_feed import CHANGE_CHANNEL
 from app.services.event_stream import event_stream_broker
+from app.services.leadership import LeaderElection
 from app.services.orchestrator import OrchestratorEngine
+from app.services.runtime_worker import RuntimeWorker
+
+# Change records that can make new work assignable; anything else on the
+# change channel is ignored so the loop does not spin on its own writes.
+WAKE_CHANGE_TYPES = frozenset({'task.created', 'agent.registered', 'agent.activated', 'claim.released', 'claim.expired'})
+
+
+@dataclass
+class WakeBatch:
+    """Triggers coalesced within one debounce window."""
+
+    trigger: str = 'poll'
+    full: bool = False
+    task_ids: set[str] = field(default_factory=set)
+    worker_ids: set[str] = field(default_factory=set)
+    triggers: int = 0
+
+    def add(self, kind: str, target: str | None, trigger: str) -> None:
+        if not self.triggers:
+            self.trigger = trigger
+        self.triggers += 1
+        if kind == 'task' and target:
+            self.task_ids.add(target)
+        elif kind == 'worker' and target:
+            self.worker_ids.add(target)
+        else:
+            self.full = True
 
 
 class OrchestratorRuntime:
     def __init__(self) -> None:
         self._loop_task: asyncio.Task | None = None
         self._guard = asyncio.Lock()
+        self._worker = RuntimeWorker('repomesh-orchestrator')
         self._engine = OrchestratorEngine()
+        self._election = LeaderElection('orchestrator', shards=get_settings().orchestrator_shards)
+        self._standby_cycles = 0
         self._last_cycle_at: datetime | None = None
         self._last_error: str | None = None
         self._cycles = 0
         self._assignments = 0
+        self._last_trigger: str | None = None
+        self._full_cycles = 0
+        self._incremental_cycles = 0
+        self._coalesced_triggers = 0
+        self._ignored_events = 0
+        self._last_full_at = 0.0
+        self._cycle_times: deque[float] = deque(maxlen=512)
 
     async def start(self) -> dict[str, Any]:
         async with self._guard:
             if self._loop_task and not self._loop_task.done():
                 return self.status()
+            await self._election.start()
             self._loop_task = asyncio.create_task(self._run_loop(), name='repomesh-orchestrator-runtime')
             return self.status()
 
@@ -38,6 +81,7 @@ class OrchestratorRuntime:
                 await task
             except asyncio.CancelledError:
                 pass
+            await self._election.stop()
         return self.status()
 
     def status(self) -> dict[str, Any]:
@@ -47,38 +91,134 @@ class OrchestratorRuntime:
             'cycles': self._cycles,
             'assignments': self._assignments,
             'last_cycle_at': self._last_cycle_at.isoformat() if self._last_cycle_at else None,
+            'last_trigger': self._last_trigger,
             'last_error': self._last_error,
+            'full_cycles': self._full_cycles,
+            'incremental_cycles': self._incremental_cycles,
+            'coalesced_triggers': self._coalesced_triggers,
+            'ignored_events': self._ignored_events,
+            'cycles_per_minute': self.cycles_per_minute(),
+            'standby_cycles': self._standby_cycles,
+            'leadership': self._election.status(),
         }
 
+    def cycles_per_minute(self) -> int:
+        cutoff = time.monotonic() - 60
+        return sum(1 for at in self._cycle_times if at >= cutoff)
+
+    @staticmethod
+    def classify(item: dict[str, Any], *, self_agent_id: str | None = None) -> tuple[str, str | None] | None:
+        """What a stream item asks of the next cycle: ('task', id), ('worker', id), ('full', None) or nothing."""
+        data = item.get('data') or {}
+        if item.get('channel') != CHANGE_CHANNEL:
+            # The orchestrator's own messages never create work for it.
+            if str(item.get('type') or '').startswith('orchestrator.'):
+                return None
+            if self_agent_id and item.get('agent_id') == self_agent_id:
+                return None
+            return ('full', None)
+        kind = item.get('type')
+        if kind == 'task.created':
+            return ('task', item.get('entity_id'))
+        if kind in {'agent.registered', 'agent.activated'}:
+            if self_agent_id and item.get('entity_id') == self_agent_id:
+                return None
+            return ('worker', item.get('entity_id'))
+        if kind in {'claim.released', 'claim.expired'}:
+            return ('worker', data.get('agent_id'))
+        # A task moved back into the assignable pool (e.g. unblocked).
+        if kind == 'task.updated' and 'status' in (item.get('changed') or []) and data.get('status') in {'pending', 'stalled'}:
+            return ('task', item.get('entity_id'))
+        return None
+
+    @classmethod
+    def should_wake(cls, item: dict[str, Any], *, self_agent_id: str | None = None) -> bool:
+        return cls.classify(item, self_agent_id=self_agent_id) is not None
+
     def run_once_sync(self, *, max_assignments: int = 10) -> dict[str, Any]:
         with SessionLocal() as db:
-            result = self._engine.run_once(db, max_assignments=max_assignments)
+            result = self._engine.run_once(db, max_assignments=max_assignments, scope=self._election.scope())
+        self._last_full_at = time.monotonic()
+        self._full_cycles += 1
+        self._record_cycle(result)
+        return result
+
+    def run_batch_sync(self, batch: WakeBatch, *, max_assignments: int = 10) -> dict[str, Any]:
+        if batch.full or self._engine.agent_id is None:
+            return self.run_once_sync(max_assignments=max_assignments)
+        with SessionLocal() as db:
+            result = self._engine.run_incremental(
+                db,
+                task_ids=batch.task_ids,
+                worker_ids=batch.worker_ids,
+                max_assignments=max_assignments,
+                scope=self._election.scope(),
+            )
+        self._incremental_cycles += 1
+        self._record_cycle(result)
+        return result
+
+    def _record_cycle(self, result: dict[str, Any]) -> None:
         self._cycles += 1
+        self._cycle_times.append(time.monotonic())
         self._assignments += len(result['assignments'])
         self._last_cycle_at = datetime.now(timezone.utc)
         self._last_error = None
-        return result
 
     async def _run_loop(self) -> None:
         settings = get_settings()
         poll_seconds = max(settings.orchestrator_poll_seconds, 1)
         subscriber = await event_stream_broker.subscribe(
             recipient_id=None,
-            channel='orchestration',
+            channel=None,
+            channels={'orchestration', CHANGE_CHANNEL},
             include_broadcast=True,
         )
         try:
             while True:
+                batch = await self.collect_triggers(
+                    subscriber.queue, poll_seconds=poll_seconds, debounce_seconds=settings.orchestrator_debounce_seconds
+                )
+                self._last_trigger = batch.trigger
+                if not self._election.is_leader:
+                    # Another replica leads; stay subscribed so failover starts warm.
+                    self._standby_cycles += 1
+                    continue
                 try:
-                    await asyncio.wait_for(subscriber.queue.get(), timeout=poll_seconds)
-                except asyncio.TimeoutError:
-                    pass
-                try:
-                    self.run_once_sync(max_assignments=settings.orchestrator_dispatch_limit)
+                    await self._worker.run(self.run_batch_sync, batch, max_assignments=settings.orchestrator_dispatch_limit)
                 except Exception as exc:  # pragma: no cover - guardrail
                     self._last_error = str(exc)
         finally:
             await event_stream_broker.unsubscribe(subscriber.id)
 
+    async def collect_triggers(
+        self, queue: asyncio.Queue[dict[str, Any]], *, poll_seconds: float, debounce_seconds: float
+    ) -> WakeBatch:
+        """Wait for the first trigger, then coalesce everything that arrives within the debounce window."""
+        loop = asyncio.get_running_loop()
+        batch = WakeBatch()
+        # Under steady load the poll deadline never passes, so full cycles are also forced by age.
+        full_due = self._last_full_at + poll_seconds
+        deadline = loop.time() + max(min(poll_seconds, full_due - time.monotonic()), 0)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                if not batch.triggers or time.monotonic() >= full_due:
+                    batch.full = True
+                return batch
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                continue
+            wake = self.classify(item, self_agent_id=self._engine.agent_id)
+            if wake is None:
+                self._ignored_events += 1
+                continue
+            if batch.triggers:
+                self._coalesced_triggers += 1
+            else:
+                deadline = min(deadline, loop.time() + debounce_seconds)
+            batch.add(*wake, trigger=str(item.get('type') or 'event'))
+
 
 orchestrator_runtime = OrchestratorRuntime()
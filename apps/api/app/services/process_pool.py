@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from typing import Any
+
+from app.config.settings import get_settings
+
+
+def default_limits() -> tuple[int, int]:
+    """(global, per-agent) process limits; 0 in settings means sized to the CPU count."""
+    settings = get_settings()
+    cpus = os.cpu_count() or 1
+    total = settings.adapter_max_processes or cpus
+    per_agent = settings.adapter_max_processes_per_agent or max(1, cpus // 2)
+    return total, min(per_agent, total)
+
+
+class ProcessPool:
+    """Bounded shell-command execution on a private asyncio loop.
+
+    Commands run through `asyncio.create_subprocess_shell`, at most `max_processes` at once
+    and at most `per_agent` for any one agent, so a slow build holds only its own slots.
+    Callers on any thread use `run`, which blocks only the calling thread.
+    """
+
+    def __init__(self, *, max_processes: int | None = None, per_agent: int | None = None) -> None:
+        defaults = default_limits()
+        self.max_processes = max_processes or defaults[0]
+        self.per_agent = min(per_agent or defaults[1], self.max_processes)
+        self._mutex = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._agent_slots: dict[str, asyncio.Semaphore] = {}
+        self._running: dict[str, int] = defaultdict(int)
+
+    def run(self, command: str, *, cwd: str, timeout_seconds: float, agent_id: str) -> dict[str, Any]:
+        """Run `command` in the pool; raises `subprocess.TimeoutExpired` like `subprocess.run` does."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(command, cwd=cwd, timeout_seconds=timeout_seconds, agent_id=agent_id), self._ensure_loop()
+        )
+        return future.result()
+
+    def status(self) -> dict[str, Any]:
+        with self._mutex:
+            running = {agent_id: count for agent_id, count in self._running.items() if count}
+        return {
+            'max_processes': self.max_processes,
+            'per_agent': self.per_agent,
+            'running': sum(running.values()),
+            'running_by_agent': running,
+        }
+
+    async def _run(self, command: str, *, cwd: str, timeout_seconds: float, agent_id: str) -> dict[str, Any]:
+        agent_slots = self._agent_slots.setdefault(agent_id, asyncio.Semaphore(self.per_agent))
+        async with agent_slots, self._slots:
+            with self._mutex:
+                self._running[agent_id] += 1
+            try:
+                return await self._spawn(command, cwd=cwd, timeout_seconds=timeout_seconds)
+            finally:
+                with self._mutex:
+                    self._running[agent_id] -= 1
+
+    @staticmethod
+    async def _spawn(command: str, *, cwd: str, timeout_seconds: float) -> dict[str, Any]:
+        start = time.monotonic()
+        # Its own process group, so a timeout kills what the shell started, not just the shell.
+        process = await asyncio.create_subprocess_shell(
+            command, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+            raise subprocess.TimeoutExpired(command, timeout_seconds) from None
+        return {
+            'exit_code': process.returncode,
+            'stdout': stdout.decode(errors='replace').strip(),
+            'stderr': stderr.decode(errors='replace').strip(),
+            'duration_ms': int((time.monotonic() - start) * 1000),
+        }
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._mutex:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def serve() -> None:
+                    asyncio.set_event_loop(loop)
+                    self._slots = asyncio.Semaphore(self.max_processes)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=serve, name='repomesh-process-pool', daemon=True).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+
+process_pool = ProcessPool()
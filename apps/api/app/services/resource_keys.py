@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterator
+from typing import Generic, TypeVar
+
+T = TypeVar('T')
+
+_WILDCARDS = {'*', '**'}
+
+
+def split_resource_key(resource_key: str) -> tuple[str, ...]:
+    """Split a resource key into (scheme, *path segments).
+
+    `file:src/`, `file:src` and `file:src/*` all name the `src` directory, so they
+    are ancestors of `file:src/a.py`. `task://abc` and `task:abc` are the same key.
+    """
+    key = resource_key.strip().replace('\\', '/')
+    if '://' in key:
+        scheme, rest = key.split('://', 1)
+    elif ':' in key:
+        scheme, rest = key.split(':', 1)
+    else:
+        scheme, rest = '', key
+    segments = [segment for segment in rest.split('/') if segment and segment != '.']
+    while segments and segments[-1] in _WILDCARDS:
+        segments.pop()
+    return (scheme, *segments)
+
+
+def keys_overlap(left: str, right: str) -> bool:
+    """True when one key is the other, or an ancestor/descendant of it."""
+    a, b = split_resource_key(left), split_resource_key(right)
+    shorter = min(len(a), len(b))
+    return a[:shorter] == b[:shorter]
+
+
+class _Node(Generic[T]):
+    __slots__ = ('children', 'holders', 'exclusive', 'subtree', 'subtree_exclusive')
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node[T]] = {}
+        # owner id -> item held exactly at this node
+        self.holders: dict[str, T] = {}
+        # owners whose item at this node is exclusive
+        self.exclusive: set[str] = set()
+        # owner id -> number of items (and exclusive items) held strictly below this node
+        self.subtree: Counter[str] = Counter()
+        self.subtree_exclusive: Counter[str] = Counter()
+
+
+class ResourceTrie(Generic[T]):
+    """Path index over resource keys for hierarchical conflict checks in O(depth).
+
+    Items are shared or exclusive. Two items of different owners conflict when their
+    keys overlap and at least one of them is exclusive.
+    """
+
+    def __init__(self) -> None:
+        self._root: _Node[T] = _Node()
+
+    def insert(self, path: tuple[str, ...], owner: str, item: T, *, exclusive: bool = True) -> None:
+        node = self._root
+        for segment in path:
+            node.subtree[owner] += 1
+            if exclusive:
+                node.subtree_exclusive[owner] += 1
+            node = node.children.setdefault(segment, _Node())
+        node.holders[owner] = item
+        if exclusive:
+            node.exclusive.add(owner)
+
+    def remove(self, path: tuple[str, ...], owner: str) -> T | None:
+        trail: list[tuple[_Node[T], str]] = []
+        node = self._root
+        for segment in path:
+            child = node.children.get(segment)
+            if child is None:
+                return None
+            trail.append((node, segment))
+            node = child
+        item = node.holders.pop(owner, None)
+        if item is None:
+            return None
+        exclusive = owner in node.exclusive
+        node.exclusive.discard(owner)
+        for parent, segment in reversed(trail):
+            _decrement(parent.subtree, owner)
+            if exclusive:
+                _decrement(parent.subtree_exclusive, owner)
+            child = parent.children[segment]
+            if not child.holders and not child.children:
+                del parent.children[segment]
+        return item
+
+    def exact(self, path: tuple[str, ...]) -> dict[str, T]:
+        node = self._find(path)
+        return dict(node.holders) if node is not None else {}
+
+    def conflicts(self, path: tuple[str, ...], owner: str, *, exclusive: bool = True, limit: int = 20) -> list[T]:
+        """Items of other owners at this key, on an ancestor, or on a descendant that are incompatible with it."""
+        found: list[T] = []
+        node = self._root
+        for segment in path:
+            found.extend(self._blocking(node, owner, exclusive))
+            node = node.children.get(segment)
+            if node is None:
+                return found[:limit]
+        found.extend(self._blocking(node, owner, exclusive))
+        if self._foreign_below(node, owner, exclusive):
+            for item in self._foreign_descendants(node, owner, exclusive):
+                found.append(item)
+                if len(found) >= limit:
+                    break
+        return found[:limit]
+
+    def _find(self, path: tuple[str, ...]) -> _Node[T] | None:
+        node = self._root
+        for segment in path:
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _blocking(node: _Node[T], owner: str, exclusive: bool) -> list[T]:
+        return [
+            item
+            for holder, item in node.holders.items()
+            if holder != owner and (exclusive or holder in node.exclusive)
+        ]
+
+    @staticmethod
+    def _foreign_below(node: _Node[T], owner: str, exclusive: bool) -> bool:
+        counts = node.subtree if exclusive else node.subtree_exclusive
+        return any(holder != owner for holder in counts)
+
+    @classmethod
+    def _foreign_descendants(cls, node: _Node[T], owner: str, exclusive: bool) -> Iterator[T]:
+        # Only descend into subtrees that hold something of another owner we could conflict with.
+        def relevant(child: _Node[T]) -> bool:
+            return bool(cls._blocking(child, owner, exclusive)) or cls._foreign_below(child, owner, exclusive)
+
+        stack = [child for child in node.children.values() if relevant(child)]
+        while stack:
+            current = stack.pop()
+            yield from cls._blocking(current, owner, exclusive)
+            stack.extend(child for child in current.children.values() if relevant(child))
+
+
+def _decrement(counter: Counter[str], owner: str) -> None:
+    counter[owner] -= 1
+    if counter[owner] <= 0:
+        del counter[owner]
@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+import threading
+from collections.abc import Iterable
 from dataclasses import dataclass
+from typing import Any
 
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import engine_state, existing_engine_state
 from app.models.entities import Agent, Task
+from app.services.change_feed import change_feed
 
 
 @dataclass
@@ -12,6 +20,17 @@ class RouteDecision:
     reason: str
 
 
+def declared_routes(capabilities: dict | None) -> tuple[frozenset[str] | None, frozenset[str] | None]:
+    """The model tiers and adapter profiles an agent declared; None where it accepts any."""
+    caps = capabilities or {}
+    tiers = caps.get('model_tiers')
+    profiles = caps.get('adapter_profiles')
+    return (
+        frozenset(tiers) if isinstance(tiers, list) and tiers else None,
+        frozenset(profiles) if isinstance(profiles, list) and profiles else None,
+    )
+
+
 class RoutingPolicyService:
     def decide(self, task: Task) -> RouteDecision:
         scope = task.scope or {}
@@ -37,16 +56,103 @@ class RoutingPolicyService:
         return RouteDecision(tier=tier, adapter_profile=profile, reason=reason)
 
     def supports(self, agent: Agent, decision: RouteDecision) -> bool:
-        caps = agent.capabilities or {}
-        tiers = caps.get('model_tiers')
-        profiles = caps.get('adapter_profiles')
+        tiers, profiles = declared_routes(agent.capabilities)
+        tier_ok = tiers is None or decision.tier in tiers
+        profile_ok = profiles is None or decision.adapter_profile in profiles
+        return tier_ok and profile_ok
 
-        tier_ok = True
-        if isinstance(tiers, list) and tiers:
-            tier_ok = decision.tier in tiers
 
-        profile_ok = True
-        if isinstance(profiles, list) and profiles:
-            profile_ok = decision.adapter_profile in profiles
+class CapabilityIndex:
+    """Maps (tier, adapter_profile) to the ids of agents whose capabilities allow that route.
 
-        return tier_ok and profile_ok
+    Agents are indexed by each declared tier and profile, with a wildcard set for agents
+    that declared none. The eligible set for a route is computed once and cached until an
+    agent registers or changes its capabilities, so routing a task is a set lookup.
+    """
+
+    def __init__(self) -> None:
+        self._mutex = threading.Lock()
+        self._routes: dict[str, tuple[frozenset[str] | None, frozenset[str] | None]] = {}
+        self._by_tier: dict[str, set[str]] = {}
+        self._by_profile: dict[str, set[str]] = {}
+        self._any_tier: set[str] = set()
+        self._any_profile: set[str] = set()
+        self._eligible: dict[tuple[str, str], frozenset[str]] = {}
+        self._loaded = False
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._loaded:
+            return
+        with self._mutex:
+            if self._loaded:
+                return
+            for agent_id, capabilities in db.execute(select(Agent.id, Agent.capabilities)).all():
+                self._put(agent_id, capabilities)
+            self._loaded = True
+
+    def eligible(self, decision: RouteDecision) -> frozenset[str]:
+        key = (decision.tier, decision.adapter_profile)
+        with self._mutex:
+            cached = self._eligible.get(key)
+            if cached is None:
+                tiers = self._by_tier.get(decision.tier, set()) | self._any_tier
+                profiles = self._by_profile.get(decision.adapter_profile, set()) | self._any_profile
+                cached = self._eligible[key] = frozenset(tiers & profiles)
+            return cached
+
+    def observe(self, agents: Iterable[Agent]) -> None:
+        """Re-index agents whose declared routes differ from the index.
+
+        Covers agents registered, or whose capabilities changed, through another worker process,
+        which this process's change feed never sees.
+        """
+        with self._mutex:
+            for agent in agents:
+                self._put(agent.id, agent.capabilities)
+
+    def update(self, agent_id: str, capabilities: dict | None) -> None:
+        with self._mutex:
+            self._put(agent_id, capabilities)
+
+    def _put(self, agent_id: str, capabilities: dict | None) -> None:
+        routes = declared_routes(capabilities)
+        if self._routes.get(agent_id) == routes:
+            return
+        self._drop(agent_id)
+        tiers, profiles = routes
+        self._routes[agent_id] = routes
+        for names, index, wildcard in ((tiers, self._by_tier, self._any_tier), (profiles, self._by_profile, self._any_profile)):
+            if names is None:
+                wildcard.add(agent_id)
+            else:
+                for name in names:
+                    index.setdefault(name, set()).add(agent_id)
+        self._eligible.clear()
+
+    def _drop(self, agent_id: str) -> None:
+        routes = self._routes.pop(agent_id, None)
+        if routes is None:
+            return
+        for names, index, wildcard in zip(routes, (self._by_tier, self._by_profile), (self._any_tier, self._any_profile)):
+            wildcard.discard(agent_id)
+            for name in names or ():
+                index.get(name, set()).discard(agent_id)
+
+
+def capability_index_for(db: Session) -> CapabilityIndex:
+    index = engine_state(db, 'capability_index', CapabilityIndex)
+    index.ensure_loaded(db)
+    return index
+
+
+def _sync_from_changes(bind: Any, records: list[dict[str, Any]]) -> None:
+    index: CapabilityIndex | None = existing_engine_state(bind, 'capability_index')
+    if index is None:
+        return
+    for record in records:
+        if record.get('entity') == 'agent' and (record.get('op') == 'insert' or 'capabilities' in record.get('changed', [])):
+            data = record.get('data') or {}
+            index.update(data['id'], data.get('capabilities'))
+
+
+change_feed.add_listener(_sync_from_changes)
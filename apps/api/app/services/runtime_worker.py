@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, TypeVar
+
+T = TypeVar('T')
+
+
+class RuntimeWorker:
+    """A dedicated thread for one background runtime's blocking database and subprocess work.
+
+    Cycles are handed off with `await worker.run(...)`, so the event loop keeps serving
+    requests while a cycle runs. One thread per runtime keeps its cycles serial. A
+    cancelled await does not interrupt a cycle that already started; the next one
+    queues behind it.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._executor: ThreadPoolExecutor | None = None
+        self._mutex = threading.Lock()
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ensure(), partial(fn, *args, **kwargs))
+
+    def _ensure(self) -> ThreadPoolExecutor:
+        with self._mutex:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+            return self._executor
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.db import engine_state
+from app.models.entities import Agent, Task, TaskClaim
+from app.repositories.common import as_utc, utc_now
+from app.schemas.common import MAX_PRIORITY
+from app.services.resource_keys import ResourceTrie, split_resource_key
+
+
+@dataclass
+class WorkerLoad:
+    agent: Agent
+    in_flight: int
+    # None means the worker declared no limit.
+    capacity: int | None
+    # Plain copies of the agent id and its heartbeat-recency position, read on every routing decision.
+    agent_id: str = ''
+    rank: int = 0
+
+    @property
+    def has_room(self) -> bool:
+        return self.capacity is None or self.in_flight < self.capacity
+
+    @property
+    def utilization(self) -> float:
+        return self.in_flight / self.capacity if self.capacity else float(self.in_flight)
+
+
+def declared_capacity(agent: Agent, default: int) -> int | None:
+    value = (agent.capabilities or {}).get('max_concurrency')
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return default if default > 0 else None
+
+
+class WorkerPool:
+    """Active workers with their in-flight claims and declared capacity."""
+
+    def __init__(self, db: Session, workers: list[Agent]):
+        default = get_settings().orchestrator_default_max_concurrency
+        counts: dict[str, int] = {}
+        if workers:
+            # Lapsed claims no longer hold a slot, even before the expiry sweep marks them.
+            counts = dict(
+                db.execute(
+                    select(TaskClaim.agent_id, func.count())
+                    .where(
+                        TaskClaim.state == 'active',
+                        TaskClaim.expires_at >= utc_now(),
+                        TaskClaim.agent_id.in_([worker.id for worker in workers]),
+                    )
+                    .group_by(TaskClaim.agent_id)
+                ).all()
+            )
+        # Workers arrive ordered by heartbeat recency; ties keep that order.
+        self.loads = [
+            WorkerLoad(
+                agent=worker,
+                in_flight=counts.get(worker.id, 0),
+                capacity=declared_capacity(worker, default),
+                agent_id=worker.id,
+                rank=rank,
+            )
+            for rank, worker in enumerate(workers)
+        ]
+        self.by_id = {load.agent_id: load for load in self.loads}
+
+    def eligible(self, agent_ids: frozenset[str]) -> list[WorkerLoad]:
+        """The pool's workers among `agent_ids`, walking whichever side is smaller."""
+        if len(agent_ids) < len(self.by_id):
+            return [self.by_id[agent_id] for agent_id in agent_ids if agent_id in self.by_id]
+        return [load for load in self.loads if load.agent_id in agent_ids]
+
+    def least_loaded(self, eligible: Iterable[WorkerLoad]) -> WorkerLoad | None:
+        open_slots = [load for load in eligible if load.has_room]
+        if not open_slots:
+            return None
+        return min(open_slots, key=lambda load: (load.utilization, load.in_flight, load.rank))
+
+    def has_room(self) -> bool:
+        return any(load.has_room for load in self.loads)
+
+
+class FairQueue:
+    """Weighted fair queuing across priority levels, with aging.
+
+    A level of priority p has weight 2**(p-1), so it gets twice the dispatches of the level
+    below it while both have work. Each level keeps a virtual pass that advances by 1/weight
+    per dispatch; the level with the lowest pass goes next. A task gains one level for every
+    `aging_seconds` it has waited, so low priorities are never starved.
+    """
+
+    def __init__(self) -> None:
+        self._mutex = threading.Lock()
+        self._pass: dict[int, float] = {}
+        self._clock = 0.0
+
+    @staticmethod
+    def weight(level: int) -> float:
+        return float(2 ** (max(level, 1) - 1))
+
+    @staticmethod
+    def level(task: Task, *, now: datetime, aging_seconds: float) -> int:
+        waited = (now - as_utc(task.created_at)).total_seconds()
+        aged = int(waited // aging_seconds) if aging_seconds > 0 else 0
+        # Rows written before priorities were validated may lie outside the levels.
+        base = min(max(task.priority, 1), MAX_PRIORITY)
+        return min(base + aged, MAX_PRIORITY)
+
+    def buckets(self, tasks: list[Task], *, now: datetime, aging_seconds: float) -> dict[int, deque[Task]]:
+        grouped: dict[int, list[Task]] = {}
+        for task in tasks:
+            grouped.setdefault(self.level(task, now=now, aging_seconds=aging_seconds), []).append(task)
+        return {level: deque(sorted(items, key=lambda task: as_utc(task.created_at))) for level, items in grouped.items()}
+
+    def pick(self, levels: Iterable[int]) -> int:
+        with self._mutex:
+            # A level that was idle rejoins at the current virtual time instead of banking credit.
+            return min(levels, key=lambda level: (max(self._pass.get(level, 0.0), self._clock), -level))
+
+    def charge(self, level: int) -> None:
+        with self._mutex:
+            start = max(self._pass.get(level, 0.0), self._clock)
+            self._clock = start
+            self._pass[level] = start + 1.0 / self.weight(level)
+
+
+def fair_queue_for(db: Session) -> FairQueue:
+    return engine_state(db, 'fair_queue', FairQueue)
+
+
+def candidate_tasks(
+    db: Session, *, per_level: int, task_ids: set[str] | None = None, repo_ids: set[str | None] | None = None
+) -> list[Task]:
+    """The oldest `per_level` assignable tasks of every priority, optionally among `task_ids` or `repo_ids` only.
+
+    None in `repo_ids` stands for tasks without a repo.
+    """
+    assignable = select(
+        Task.id,
+        func.row_number().over(partition_by=Task.priority, order_by=Task.created_at.asc()).label('rank'),
+    ).where(Task.status.in_(['pending', 'stalled']))
+    if task_ids is not None:
+        assignable = assignable.where(Task.id.in_(task_ids))
+    if repo_ids is not None:
+        in_repos = Task.repo_id.in_([repo_id for repo_id in repo_ids if repo_id is not None])
+        assignable = assignable.where(or_(in_repos, Task.repo_id.is_(None)) if None in repo_ids else in_repos)
+    ranked = assignable.subquery()
+    return list(
+        db.execute(select(Task).join(ranked, ranked.c.id == Task.id).where(ranked.c.rank <= per_level)).scalars().all()
+    )
+
+
+def task_footprint(task: Task) -> list[str]:
+    """Every resource key a task touches, its claim key first.
+
+    That is an explicit `scope.resource_key`, then `scope.resource_keys` and one `file:` key per
+    entry of `scope.files`. The `component:` key stands in only for a task that lists no files,
+    so tasks in one component with disjoint files still run side by side. A task that names
+    none of these gets `task:<id>`.
+    """
+    scope = task.scope or {}
+    keys: list[str] = []
+    explicit = scope.get('resource_key')
+    if isinstance(explicit, str):
+        keys.append(explicit)
+    extra = scope.get('resource_keys')
+    if isinstance(extra, list):
+        keys.extend(key for key in extra if isinstance(key, str))
+    files = scope.get('files')
+    file_keys = [f'file:{path}' for path in files if isinstance(path, str) and path.strip()] if isinstance(files, list) else []
+    keys.extend(file_keys)
+    component = scope.get('component')
+    if not file_keys and isinstance(component, str) and component.strip():
+        keys.append(f'component:{component}')
+    footprint = list(dict.fromkeys(key for key in keys if key.strip()))
+    return footprint or [f'task:{task.id}']
+
+
+class ConflictGraph:
+    """Candidate tasks joined wherever their footprints overlap (same key, ancestor or descendant).
+
+    Edges are found through a `ResourceTrie`, so building the graph costs one trie walk per
+    key rather than a comparison per pair of tasks.
+    """
+
+    def __init__(self, footprints: dict[str, list[str]]):
+        trie: ResourceTrie[str] = ResourceTrie()
+        self.edges: dict[str, set[str]] = {task_id: set() for task_id in footprints}
+        for task_id, keys in footprints.items():
+            paths = [split_resource_key(key) for key in keys]
+            for path in paths:
+                for other in trie.conflicts(path, task_id, limit=len(footprints)):
+                    self.edges[task_id].add(other)
+                    self.edges[other].add(task_id)
+            for path in paths:
+                trie.insert(path, task_id, task_id)
+
+    def neighbours(self, task_id: str) -> set[str]:
+        return self.edges.get(task_id, set())
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.models.entities import Agent, AgentSession, AgentUptime
+from app.repositories.common import as_utc, utc_now
+from app.services.errors import AppError, ERROR_NOT_FOUND
+
+
+def _session_seconds(session: AgentSession) -> float:
+    started = as_utc(session.started_at or session.last_heartbeat_at)
+    return max((as_utc(session.last_heartbeat_at) - started).total_seconds(), 0.0)
+
+
+class SessionRetentionService:
+    """Folds old finished sessions into per-agent uptime totals and deletes the rows."""
+
+    def __init__(self, db: Session, *, batch_size: int | None = None):
+        self.db = db
+        self.settings = get_settings()
+        self.batch_size = batch_size or self.settings.expiry_batch_size
+
+    def compact(self, *, older_than: datetime | None = None) -> dict[str, int]:
+        cutoff = older_than or utc_now() - timedelta(hours=self.settings.session_retention_hours)
+        current = select(Agent.current_session_id).where(Agent.current_session_id.is_not(None))
+        compacted = 0
+        agents: set[str] = set()
+        while True:
+            sessions = list(
+                self.db.execute(
+                    select(AgentSession)
+                    .where(
+                        AgentSession.status != 'active',
+                        AgentSession.expires_at < cutoff,
+                        AgentSession.id.not_in(current),
+                    )
+                    .order_by(AgentSession.expires_at)
+                    .limit(self.batch_size)
+                ).scalars()
+            )
+            if not sessions:
+                break
+            # Fold only the rows this transaction deleted, so a replica compacting the
+            # same batch concurrently cannot count a session twice.
+            deleted = set(
+                self.db.execute(
+                    delete(AgentSession.__table__)
+                    .where(AgentSession.id.in_([session.id for session in sessions]))
+                    .returning(AgentSession.id)
+                ).scalars()
+            )
+            folded = [session for session in sessions if session.id in deleted]
+            self._fold(folded)
+            agents.update(session.agent_id for session in folded)
+            for session in sessions:
+                self.db.expunge(session)
+            self.db.commit()
+            compacted += len(folded)
+            if len(sessions) < self.batch_size:
+                break
+        return {'compacted_sessions': compacted, 'agents': len(agents)}
+
+    def uptime(self, agent_id: str) -> dict[str, Any]:
+        if self.db.get(Agent, agent_id) is None:
+            raise AppError(code=ERROR_NOT_FOUND, message='Agent not found', status_code=404)
+        summary = self.db.get(AgentUptime, agent_id)
+        sessions = list(self.db.execute(select(AgentSession).where(AgentSession.agent_id == agent_id)).scalars())
+        first_started = [as_utc(session.started_at) for session in sessions if session.started_at]
+        if summary is not None and summary.first_started_at:
+            first_started.append(as_utc(summary.first_started_at))
+        return {
+            'agent_id': agent_id,
+            'sessions': len(sessions) + (summary.sessions if summary else 0),
+            'uptime_seconds': round(
+                sum(_session_seconds(session) for session in sessions) + (summary.uptime_seconds if summary else 0.0), 3
+            ),
+            'first_started_at': min(first_started).isoformat() if first_started else None,
+            'compacted_sessions': summary.sessions if summary else 0,
+        }
+
+    def _fold(self, sessions: list[AgentSession]) -> None:
+        agent_ids = {session.agent_id for session in sessions}
+        summaries = {
+            summary.agent_id: summary
+            for summary in self.db.execute(select(AgentUptime).where(AgentUptime.agent_id.in_(agent_ids))).scalars()
+        }
+        now = utc_now()
+        for session in sessions:
+            summary = summaries.get(session.agent_id)
+            if summary is None:
+                summary = summaries[session.agent_id] = AgentUptime(agent_id=session.agent_id, sessions=0, uptime_seconds=0.0)
+                self.db.add(summary)
+            started = as_utc(session.started_at or session.last_heartbeat_at)
+            summary.sessions += 1
+            summary.uptime_seconds += _session_seconds(session)
+            if summary.first_started_at is None or started < as_utc(summary.first_started_at):
+                summary.first_started_at = started
+            if summary.last_heartbeat_at is None or as_utc(session.last_heartbeat_at) > as_utc(summary.last_heartbeat_at):
+                summary.last_heartbeat_at = session.last_heartbeat_at
+            summary.compacted_at = now
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.db import engine_state
+from app.models.entities import Agent, AgentSession
+from app.repositories.common import as_utc
+
+
+@dataclass(slots=True)
+class SessionState:
+    agent_id: str
+    session_id: str
+    status: str
+    current_task_id: str | None
+    last_heartbeat_at: datetime
+    expires_at: datetime
+
+
+class SessionTable:
+    """In-memory liveness of agent sessions, written back to the database in batches.
+
+    A heartbeat that does not change an agent's status only updates this table; the
+    liveness columns of `agents` and `agent_sessions` catch up on the next `flush`,
+    at most every `flush_seconds`.
+    """
+
+    def __init__(self, *, flush_seconds: float = 5.0) -> None:
+        self.flush_seconds = flush_seconds
+        self._mutex = threading.Lock()
+        self._states: dict[str, SessionState] = {}
+        self._dirty: set[str] = set()
+        self._flushed_at = time.monotonic()
+
+    def get(self, agent_id: str) -> SessionState | None:
+        with self._mutex:
+            return self._states.get(agent_id)
+
+    def observe(self, state: SessionState) -> None:
+        """Record a session state that is already in the database."""
+        with self._mutex:
+            self._states[state.agent_id] = state
+            self._dirty.discard(state.agent_id)
+
+    def beat(self, agent_id: str, *, current_task_id: str | None, at: datetime, expires_at: datetime) -> SessionState:
+        with self._mutex:
+            state = self._states[agent_id]
+            state.current_task_id = current_task_id
+            state.last_heartbeat_at = at
+            state.expires_at = expires_at
+            self._dirty.add(agent_id)
+            return state
+
+    def forget(self, agent_ids: Iterable[str]) -> None:
+        with self._mutex:
+            for agent_id in agent_ids:
+                self._states.pop(agent_id, None)
+                self._dirty.discard(agent_id)
+
+    def last_seen(self, agent_id: str) -> datetime | None:
+        with self._mutex:
+            state = self._states.get(agent_id)
+            return state.last_heartbeat_at if state else None
+
+    def pending(self) -> int:
+        with self._mutex:
+            return len(self._dirty)
+
+    def flush_due(self) -> bool:
+        with self._mutex:
+            return bool(self._dirty) and time.monotonic() - self._flushed_at >= self.flush_seconds
+
+    def flush(self, db: Session) -> int:
+        """Write every pending heartbeat with one bulk UPDATE per table and commit."""
+        with self._mutex:
+            states = [replace(self._states[agent_id]) for agent_id in self._dirty if agent_id in self._states]
+            self._dirty.clear()
+            self._flushed_at = time.monotonic()
+        if not states:
+            return 0
+        try:
+            db.execute(
+                update(Agent),
+                [{'id': state.agent_id, 'last_heartbeat_at': state.last_heartbeat_at} for state in states],
+            )
+            db.execute(
+                update(AgentSession),
+                [
+                    {
+                        'id': state.session_id,
+                        'status': state.status,
+                        'current_task_id': state.current_task_id,
+                        'last_heartbeat_at': state.last_heartbeat_at,
+                        'expires_at': state.expires_at,
+                    }
+                    for state in states
+                ],
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._mutex:
+                self._dirty.update(state.agent_id for state in states if state.agent_id in self._states)
+            raise
+        return len(states)
+
+    def flush_if_due(self, db: Session) -> int:
+        return self.flush(db) if self.flush_due() else 0
+
+
+def session_state_of(session: AgentSession) -> SessionState:
+    return SessionState(
+        agent_id=session.agent_id,
+        session_id=session.id,
+        status=session.status,
+        current_task_id=session.current_task_id,
+        last_heartbeat_at=as_utc(session.last_heartbeat_at),
+        expires_at=as_utc(session.expires_at),
+    )
+
+
+def session_table_for(db: Session) -> SessionTable:
+    return engine_state(db, 'session_table', lambda: SessionTable(flush_seconds=get_settings().heartbeat_flush_seconds))
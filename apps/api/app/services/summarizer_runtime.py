@@ -6,6 +6,8 @@ from typing import Any
 
 from app.config.settings import get_settings
 from app.db import SessionLocal
+from app.services.leadership import LeaderElection
+from app.services.runtime_worker import RuntimeWorker
 from app.services.summarizer import SummarizerService
 
 
@@ -13,6 +15,8 @@ class SummarizerRuntime:
     def __init__(self) -> None:
         self._task: asyncio.Task | None = None
         self._guard = asyncio.Lock()
+        self._worker = RuntimeWorker('repomesh-summarizer')
+        self._election = LeaderElection('summarizer')
         self._cycles = 0
         self._compressed = 0
         self._last_cycle_at: datetime | None = None
@@ -22,6 +26,7 @@ class SummarizerRuntime:
         async with self._guard:
             if self._task and not self._task.done():
                 return self.status()
+            await self._election.start()
             self._task = asyncio.create_task(self._run_loop(), name='repomesh-summarizer-runtime')
             return self.status()
 
@@ -35,6 +40,7 @@ class SummarizerRuntime:
                 await task
             except asyncio.CancelledError:
                 pass
+            await self._election.stop()
         return self.status()
 
     def status(self) -> dict[str, Any]:
@@ -45,6 +51,7 @@ class SummarizerRuntime:
             'compressed': self._compressed,
             'last_cycle_at': self._last_cycle_at.isoformat() if self._last_cycle_at else None,
             'last_error': self._last_error,
+            'leadership': self._election.status(),
         }
 
     def run_once_sync(self, *, max_tasks: int = 10) -> dict[str, Any]:
@@ -60,7 +67,8 @@ class SummarizerRuntime:
         poll_seconds = max(get_settings().summarizer_poll_seconds, 5)
         while True:
             try:
-                self.run_once_sync(max_tasks=get_settings().summarizer_max_tasks_cycle)
+                if self._election.is_leader:
+                    await self._worker.run(self.run_once_sync, max_tasks=get_settings().summarizer_max_tasks_cycle)
             except Exception as exc:  # pragma: no cover - defensive guardrail
                 self._last_error = str(exc)
             await asyncio.sleep(poll_seconds)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.models.entities import Task
+from app.services.change_feed import change_feed
+from app.services.tasks import TaskService
+
+# Columns whose change can move a task in or out of a filtered watch set.
+_FILTER_FIELDS = {'status', 'assignee_agent_id', 'scope'}
+
+
+class TaskWatch:
+    """Turns change-feed records into snapshot + diff messages for one filtered task set.
+
+    Messages carry a `version` (the change-feed sequence number) that a client can hand
+    back as `since_version` to resume without a new snapshot.
+    """
+
+    def __init__(self, *, status: str | None, scope: str | None, assignee: str | None):
+        self.status = status
+        self.scope = scope
+        self.assignee = assignee
+        self.version = 0
+        # None while resuming: membership of the client's view is unknown.
+        self._members: set[str] | None = None
+
+    def snapshot(self, db: Session, *, serialize) -> dict[str, Any]:
+        # Read the version first: any change committed after this point is
+        # replayed as a diff, at worst repeating what the snapshot shows.
+        self.version = change_feed.last_seq
+        tasks: list[Task] = TaskService(db).list(status=self.status, scope=self.scope, assignee=self.assignee)
+        self._members = {task.id for task in tasks}
+        return {'type': 'snapshot', 'version': self.version, 'items': [serialize(task) for task in tasks]}
+
+    def resume(self, since_version: int) -> list[dict[str, Any]] | None:
+        """Diffs since `since_version`, or None when the history no longer reaches back that far."""
+        records = change_feed.replay(since_version)
+        if records is None:
+            return None
+        self.version = since_version
+        self._members = None
+        return [message for record in records if (message := self.diff(record)) is not None]
+
+    def diff(self, record: dict[str, Any]) -> dict[str, Any] | None:
+        if record.get('entity') != 'task' or record.get('seq', 0) <= self.version:
+            return None
+        self.version = record['seq']
+        data = record.get('data') or {}
+        task_id = record.get('entity_id')
+        matches = record.get('op') != 'delete' and self._matches(data)
+
+        if self._members is None:
+            was_member = not matches and bool(_FILTER_FIELDS.intersection(record.get('changed') or []))
+        else:
+            was_member = task_id in self._members
+
+        if matches:
+            if self._members is not None:
+                self._members.add(task_id)
+            op = 'upsert'
+        elif was_member:
+            if self._members is not None:
+                self._members.discard(task_id)
+            op = 'remove'
+        else:
+            return None
+
+        return {
+            'type': 'diff',
+            'version': record['seq'],
+            'op': op,
+            'task_id': task_id,
+            'change': record.get('type'),
+            'changed': record.get('changed') or [],
+            'task': data,
+        }
+
+    def _matches(self, data: dict[str, Any]) -> bool:
+        if self.status and data.get('status') != self.status:
+            return False
+        if self.assignee and data.get('assignee_agent_id') != self.assignee:
+            return False
+        if self.scope and data.get('component') != self.scope:
+            return False
+        return True
@@ -1,23 +1,55 @@
 from __future__ import annotations
 
-from datetime import timedelta
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
-from sqlalchemy import and_, select
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
-from app.models.entities import ResourceLock, Task, TaskClaim
+from app.db import begin_savepoint
+from app.models.entities import Agent, Task, TaskClaim
 from app.repositories.common import utc_now
+from app.schemas.common import MAX_PRIORITY
+from app.services.change_feed import change_feed
 from app.services.errors import AppError, ERROR_CONFLICT, ERROR_NOT_FOUND, ERROR_VALIDATION
+from app.services.expiry import ExpiryService
+from app.services.lock_stats import lock_stats_for
+from app.services.lock_table import undo_mark, undo_since
 from app.services.locks import LockService
 
 ALLOWED_STATUSES = {'pending', 'claimed', 'in_progress', 'blocked', 'completed', 'stalled'}
 
 
+@contextmanager
+def _savepoint(db: Session) -> Iterator[None]:
+    """A SAVEPOINT whose in-memory side effects (lock-table grants, change records) roll back with it."""
+    undo = undo_mark(db)
+    changes = change_feed.pending_mark(db)
+    try:
+        with begin_savepoint(db):
+            yield
+    except Exception:
+        undo_since(db, undo)
+        change_feed.discard_since(db, changes)
+        raise
+
+
 class TaskService:
     def __init__(self, db: Session):
         self.db = db
+        change_feed.watch(db)
 
     def create(self, *, goal: str, description: str, scope: dict, priority: int, acceptance_criteria: str | None, repo_id: str | None) -> Task:
+        if isinstance(priority, bool) or not isinstance(priority, int) or not 1 <= priority <= MAX_PRIORITY:
+            raise AppError(
+                code=ERROR_VALIDATION,
+                message=f'Priority must be between 1 and {MAX_PRIORITY}',
+                status_code=400,
+                details={'priority': priority},
+            )
         task = Task(
             goal=goal,
             description=description,
@@ -33,7 +65,7 @@ class TaskService:
         return task
 
     def list(self, *, status: str | None, scope: str | None, assignee: str | None) -> list[Task]:
-        self.expire_stale_claims()
+        ExpiryService(self.db).run_due()
         stmt = select(Task).order_by(Task.created_at.desc())
         if status:
             stmt = stmt.where(Task.status == status)
@@ -43,7 +75,9 @@ class TaskService:
             stmt = stmt.where(Task.scope['component'].as_string() == scope)
         return list(self.db.execute(stmt).scalars().all())
 
-    def claim(self, *, task_id: str, agent_id: str, resource_key: str, lease_ttl: int) -> TaskClaim:
+    def claim(
+        self, *, task_id: str, agent_id: str, resource_key: str, lease_ttl: int, mode: str = 'exclusive'
+    ) -> TaskClaim:
         now = utc_now()
         task = self.db.get(Task, task_id)
         if not task:
@@ -51,19 +85,11 @@ class TaskService:
         if task.status == 'completed':
             raise AppError(code=ERROR_CONFLICT, message='Task already completed', status_code=409)
 
-        lock = self.db.execute(
-            select(ResourceLock).where(
-                ResourceLock.resource_key == resource_key,
-                ResourceLock.owner_agent_id == agent_id,
-                ResourceLock.state == 'active',
-                ResourceLock.expires_at >= now,
-            )
-        ).scalars().first()
-
-        if not lock:
+        locks = LockService(self.db)
+        if not locks.held_by(resource_key=resource_key, agent_id=agent_id, mode=mode):
             # Auto-acquire the requested resource lock for this claim to reduce
-            # claim friction while preserving single-owner lock semantics.
-            lock = LockService(self.db).acquire(resource_key=resource_key, agent_id=agent_id, ttl=lease_ttl)
+            # claim friction; read-only claims take it shared.
+            locks.acquire(resource_key=resource_key, agent_id=agent_id, ttl=lease_ttl, mode=mode)
 
         self.expire_stale_claims(task_id)
         active_claim = self.db.execute(
@@ -74,12 +100,14 @@ class TaskService:
             )
         ).scalars().first()
         if active_claim and active_claim.agent_id != agent_id:
+            lock_stats_for(self.db).record_claim_conflict(resource_key)
             raise AppError(code=ERROR_CONFLICT, message='Task already claimed by another agent', status_code=409)
 
         claim = TaskClaim(
             task_id=task_id,
             agent_id=agent_id,
             resource_key=resource_key,
+            mode=mode,
             lease_ttl_seconds=lease_ttl,
             state='active',
             claimed_at=now,
@@ -88,18 +116,188 @@ class TaskService:
         task.status = 'claimed'
         task.assignee_agent_id = agent_id
         self.db.add(claim)
-        self.db.commit()
+        self._commit_versioned(task_id=task_id)
         self.db.refresh(claim)
         return claim
 
-    def update(self, *, task_id: str, status: str | None, progress: int | None, summary: str | None, blocked_reason: str | None) -> Task:
+    def assign(
+        self,
+        *,
+        task: Task,
+        agent_id: str,
+        resource_keys: list[str],
+        lease_ttl: int,
+        now: datetime,
+        capacity: int | None = None,
+        check_rows: bool = False,
+    ) -> TaskClaim:
+        """Lock the task's whole footprint, claim and start it in the open transaction; the caller commits.
+
+        The claim records the first key. The caller has already ruled out a live claim by another
+        agent. The assignment is flushed in its own savepoint, so a lock conflict or a concurrent
+        update of the task raises a conflict and leaves the rest of the transaction usable.
+
+        With `check_rows`, the worker's `capacity` and the footprint are also checked against the
+        database, for dispatchers whose pool and lock table do not see each other's grants.
+        """
+        try:
+            with _savepoint(self.db):
+                LockService(self.db).acquire_many(
+                    resource_keys=resource_keys, agent_id=agent_id, ttl=lease_ttl, commit=False
+                )
+                claim = TaskClaim(
+                    id=str(uuid.uuid4()),
+                    task_id=task.id,
+                    agent_id=agent_id,
+                    resource_key=resource_keys[0],
+                    footprint=list(resource_keys),
+                    mode='exclusive',
+                    lease_ttl_seconds=lease_ttl,
+                    state='active',
+                    claimed_at=now,
+                    expires_at=now + timedelta(seconds=lease_ttl),
+                )
+                task.status = 'in_progress'
+                task.progress = 0
+                task.assignee_agent_id = agent_id
+                self.db.add(claim)
+                if check_rows:
+                    self._check_rows(agent_id=agent_id, resource_keys=resource_keys, capacity=capacity, now=now)
+        except StaleDataError as exc:
+            raise self._version_conflict(task_id=task.id, details={}) from exc
+        return claim
+
+    def _check_rows(self, *, agent_id: str, resource_keys: list[str], capacity: int | None, now: datetime) -> None:
+        # Serialise on the worker's row, so a concurrent dispatcher counts this claim once we commit.
+        self.db.execute(select(Agent.id).where(Agent.id == agent_id).with_for_update())
+        self.db.flush()
+        if capacity is not None:
+            others = self.db.execute(
+                select(func.count()).select_from(TaskClaim).where(
+                    TaskClaim.agent_id == agent_id,
+                    TaskClaim.state == 'active',
+                    TaskClaim.expires_at >= now,
+                )
+            ).scalar_one() - 1
+            if others >= capacity:
+                raise AppError(
+                    code=ERROR_CONFLICT,
+                    message='Worker has no free slot',
+                    status_code=409,
+                    details={'agent_id': agent_id, 'in_flight': others},
+                )
+        row = LockService(self.db).overlapping_row(resource_keys, agent_id=agent_id, now=now)
+        if row is not None:
+            raise AppError(
+                code=ERROR_CONFLICT,
+                message='Resource already locked',
+                status_code=409,
+                details={'resource_key': row.resource_key, 'owner_agent_id': row.owner_agent_id},
+            )
+
+    def live_claimants(self, task_ids: list[str], *, now: datetime) -> dict[str, str]:
+        """The agent holding a live claim on each of `task_ids` that has one."""
+        if not task_ids:
+            return {}
+        return dict(
+            self.db.execute(
+                select(TaskClaim.task_id, TaskClaim.agent_id).where(
+                    TaskClaim.task_id.in_(task_ids),
+                    TaskClaim.state == 'active',
+                    TaskClaim.expires_at >= now,
+                )
+            ).all()
+        )
+
+    def commit_assignments(self) -> None:
+        self._commit_versioned(task_id=None)
+
+    def update(
+        self,
+        *,
+        task_id: str,
+        status: str | None,
+        progress: int | None,
+        summary: str | None,
+        blocked_reason: str | None,
+        expected_version: int | None = None,
+    ) -> Task:
+        task = self._apply_update(
+            task_id=task_id,
+            status=status,
+            progress=progress,
+            summary=summary,
+            blocked_reason=blocked_reason,
+            expected_version=expected_version,
+        )
+        self._commit_versioned(task_id=task_id)
+        self.db.refresh(task)
+        return task
+
+    def update_many(self, updates: list[dict]) -> list[Task]:
+        """Apply several task updates in a single transaction (all or nothing)."""
+        task_ids = [item['task_id'] for item in updates]
+        # Warm the identity map with one query so each update below is a pure
+        # in-memory mutation followed by its versioned UPDATE.
+        self.db.execute(select(Task).where(Task.id.in_(task_ids))).scalars().all()
+
+        tasks: list[Task] = []
+        for index, item in enumerate(updates):
+            try:
+                task = self._apply_update(
+                    task_id=item['task_id'],
+                    status=item.get('status'),
+                    progress=item.get('progress'),
+                    summary=item.get('summary'),
+                    blocked_reason=item.get('blocked_reason'),
+                    expected_version=item.get('expected_version'),
+                )
+                # Flush per item so repeated updates to one task in the same
+                # batch see the bumped version.
+                self.db.flush()
+            except StaleDataError as exc:
+                self.db.rollback()
+                raise self._version_conflict(task_id=item['task_id'], details={'index': index}) from exc
+            except AppError as exc:
+                self.db.rollback()
+                exc.details = {**(exc.details or {}), 'index': index, 'task_id': item['task_id']}
+                raise
+            tasks.append(task)
+
+        self._commit_versioned(task_id=None)
+        by_id = {
+            task.id: task
+            for task in self.db.execute(
+                select(Task).where(Task.id.in_(task_ids)).execution_options(populate_existing=True)
+            ).scalars().all()
+        }
+        return [by_id[task.id] for task in tasks]
+
+    def _apply_update(
+        self,
+        *,
+        task_id: str,
+        status: str | None,
+        progress: int | None,
+        summary: str | None,
+        blocked_reason: str | None,
+        expected_version: int | None,
+    ) -> Task:
         task = self.db.get(Task, task_id)
         if not task:
-            raise AppError(code=ERROR_NOT_FOUND, message='Task not found', status_code=404)
+            raise AppError(code=ERROR_NOT_FOUND, message='Task not found', status_code=404, details={'task_id': task_id})
+
+        if expected_version is not None and task.version != expected_version:
+            raise self._version_conflict(
+                task_id=task_id,
+                details={'expected_version': expected_version, 'current_version': task.version},
+            )
 
         if status:
             if status not in ALLOWED_STATUSES:
                 raise AppError(code=ERROR_VALIDATION, message='Invalid task status', status_code=400)
+            if status == 'completed' and task.status != 'completed':
+                self._end_claims(task_id)
             task.status = status
 
         if progress is not None:
@@ -113,10 +311,36 @@ class TaskService:
         if blocked_reason is not None:
             task.blocked_reason = blocked_reason
 
-        self.db.commit()
-        self.db.refresh(task)
         return task
 
+    def _end_claims(self, task_id: str) -> None:
+        """Release a finished task's active claims and the locks taken for them, whoever finished it."""
+        now = utc_now()
+        claims = list(
+            self.db.execute(select(TaskClaim).where(TaskClaim.task_id == task_id, TaskClaim.state == 'active')).scalars().all()
+        )
+        for claim in claims:
+            claim.state = 'released'
+            claim.released_at = now
+        LockService(self.db).release_claimed(claims, now=now)
+
+    def _commit_versioned(self, *, task_id: str | None) -> None:
+        try:
+            self.db.commit()
+        except StaleDataError as exc:
+            # Another writer bumped the row between our read and our UPDATE.
+            self.db.rollback()
+            raise self._version_conflict(task_id=task_id, details={}) from exc
+
+    @staticmethod
+    def _version_conflict(*, task_id: str | None, details: dict) -> AppError:
+        return AppError(
+            code=ERROR_CONFLICT,
+            message='Task was modified concurrently (version mismatch)',
+            status_code=409,
+            details={'task_id': task_id, **details},
+        )
+
     def get(self, task_id: str) -> Task:
         self.expire_stale_claims(task_id=task_id)
         task = self.db.get(Task, task_id)
@@ -124,18 +348,18 @@ class TaskService:
             raise AppError(code=ERROR_NOT_FOUND, message='Task not found', status_code=404)
         return task
 
+    def renew_claims(self, *, agent_ids: list[str], now: datetime) -> int:
+        """Extend the agents' live claims by their own lease TTL; the caller commits."""
+        claims = self.db.execute(
+            select(TaskClaim).where(
+                TaskClaim.agent_id.in_(agent_ids),
+                TaskClaim.state == 'active',
+                TaskClaim.expires_at >= now,
+            )
+        ).scalars().all()
+        for claim in claims:
+            claim.expires_at = now + timedelta(seconds=claim.lease_ttl_seconds)
+        return len(claims)
+
     def expire_stale_claims(self, task_id: str | None = None) -> int:
-        now = utc_now()
-        stmt = select(TaskClaim).where(and_(TaskClaim.state == 'active', TaskClaim.expires_at < now))
-        if task_id:
-            stmt = stmt.where(TaskClaim.task_id == task_id)
-        stale_claims = self.db.execute(stmt).scalars().all()
-        for claim in stale_claims:
-            claim.state = 'expired'
-            claim.released_at = now
-            task = self.db.get(Task, claim.task_id)
-            if task and task.status in {'claimed', 'in_progress'}:
-                task.status = 'stalled'
-        if stale_claims:
-            self.db.commit()
-        return len(stale_claims)
+        return ExpiryService(self.db).expire_claims(utc_now(), task_id=task_id)
@@ -0,0 +1,319 @@
+"""Scheduling simulator and dispatch benchmark for the orchestrator.
+
+Run from apps/api:
+
+    python -m benchmarks.dispatch_sim --agents 500 --tasks 50000
+    python -m benchmarks.dispatch_sim --json after.json --baseline before.json
+
+Drives the real OrchestratorEngine, TaskService and LockService against SQLite
+(a temporary file by default, `--in-memory`, or `--database-url`). A synthetic
+fleet declares model tiers and `max_concurrency`, misses heartbeats at random
+(`--heartbeat-jitter`), works each task for an exponentially distributed number
+of cycles and fails a share of them (`--failure-rate`), which puts them back in
+the queue. Tasks arrive in batches with file footprints skewed towards a hot set,
+so conflicts show up like they do on a real repo.
+
+Time is counted in cycles: each cycle delivers arrivals and heartbeats, finishes
+due work, then runs one orchestrator cycle. A cycle stands for `--cycle-seconds`
+of agent time. An agent that missed heartbeats has its last one back-dated by
+that much per missed cycle, so the orchestrator drops it once the gap passes its
+liveness window (twice `SESSION_TTL_SECONDS`). The report covers:
+
+  dispatch latency   wall time of each orchestrator cycle and per assignment
+  queue wait         cycles from arrival to assignment
+  utilization        busy worker slots over declared capacity, per cycle
+  live agents        share of the fleet inside its liveness window, per cycle
+  conflicts          queued tasks blocked by an overlapping running task, and
+                     lock conflicts the orchestrator ran into
+
+`--json` saves the metrics; `--baseline` prints the change against a saved run.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+
+from sqlalchemy import and_, create_engine, select, update
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.config.settings import get_settings
+from app.models.base import Base
+from app.models.entities import Agent, ResourceLock, Task, TaskClaim
+from app.repositories.common import utc_now
+from app.services.agents import AgentService
+from app.services.lock_stats import lock_stats_for
+from app.services.orchestrator import OrchestratorEngine
+from app.services.scheduler import ConflictGraph, task_footprint
+from app.services.session_table import session_table_for
+from app.services.tasks import TaskService
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@dataclass
+class Running:
+    agent_id: str
+    due_cycle: int
+    footprint: list[str]
+
+
+class Simulation:
+    def __init__(self, db: Session, args: argparse.Namespace) -> None:
+        self.db = db
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.engine = OrchestratorEngine()
+        self.agents: dict[str, int] = {}
+        # Consecutive heartbeats each agent has missed.
+        self.missed: dict[str, int] = {}
+        self.files = [f'src/pkg{index // 50}/mod{index}.py' for index in range(args.files)]
+        self.hot = self.files[: max(1, int(len(self.files) * 0.02))]
+        self.arrived_at: dict[str, int] = {}
+        self.queued: dict[str, list[str]] = {}
+        self.running: dict[str, Running] = {}
+        self.created = 0
+        self.completed = 0
+        self.failed = 0
+        self.cycle_ms: list[float] = []
+        self.assignment_ms: list[float] = []
+        self.waits: list[int] = []
+        self.utilization: list[float] = []
+        self.live_share: list[float] = []
+        self.blocked_share: list[float] = []
+
+    def setup_fleet(self) -> None:
+        service = AgentService(self.db)
+        for index in range(self.args.agents):
+            tiers = ['small', 'frontier'] if self.rng.random() < self.args.frontier_share else ['small']
+            capacity = self.rng.randint(1, self.args.max_concurrency)
+            agent = service.register(
+                name=f'sim-agent-{index}',
+                agent_type='cli',
+                capabilities={'model_tiers': tiers, 'max_concurrency': capacity},
+                repo_id=None,
+            )
+            self.agents[agent.id] = capacity
+
+    def run(self) -> dict:
+        self.setup_fleet()
+        started = time.perf_counter()
+        cycle = 0
+        while cycle < self.args.max_cycles:
+            cycle += 1
+            self._arrive(cycle)
+            self._heartbeat()
+            self._finish(cycle)
+            self._dispatch(cycle)
+            if self.created >= self.args.tasks and not self.queued and not self.running:
+                break
+        return self._metrics(cycles=cycle, wall_seconds=time.perf_counter() - started)
+
+    def _arrive(self, cycle: int) -> None:
+        count = min(self.args.arrivals_per_cycle, self.args.tasks - self.created)
+        if count <= 0:
+            return
+        tasks = [self._synthetic_task() for _ in range(count)]
+        self.db.add_all(tasks)
+        self.db.commit()
+        for task in tasks:
+            self.arrived_at[task.id] = cycle
+            self.queued[task.id] = task_footprint(task)
+        self.created += count
+
+    def _synthetic_task(self) -> Task:
+        files = set()
+        for _ in range(self.rng.randint(1, self.args.files_per_task)):
+            pool = self.hot if self.rng.random() < self.args.hot_share else self.files
+            files.add(self.rng.choice(pool))
+        scope: dict = {'files': sorted(files)}
+        if self.rng.random() < self.args.component_share:
+            scope['component'] = f'component-{self.rng.randrange(20)}'
+        priority = self.rng.choices([1, 2, 3, 4, 5], weights=[10, 20, 40, 20, 10])[0]
+        return Task(goal='simulated', description='simulated', scope=scope, priority=priority, status='pending')
+
+    def _heartbeat(self) -> None:
+        beats = []
+        for agent_id in self.agents:
+            if self.rng.random() >= self.args.heartbeat_jitter:
+                self.missed[agent_id] = 0
+                beats.append({'agent_id': agent_id, 'status': 'active'})
+            else:
+                self.missed[agent_id] = self.missed.get(agent_id, 0) + 1
+        if beats:
+            AgentService(self.db).heartbeat_many(beats=beats)
+        self._age_silent_agents()
+        window = get_settings().session_ttl_seconds * 2
+        live = sum(1 for missed in self.missed.values() if missed * self.args.cycle_seconds <= window)
+        self.live_share.append(live / len(self.agents) if self.agents else 0.0)
+
+    def _age_silent_agents(self) -> None:
+        """Back-date the last heartbeat of agents that missed cycles, in simulated time."""
+        silent = {agent_id: missed for agent_id, missed in self.missed.items() if missed}
+        if not silent:
+            return
+        now = utc_now()
+        table = session_table_for(self.db)
+        for agent_id, missed in silent.items():
+            at = now - timedelta(seconds=missed * self.args.cycle_seconds)
+            state = table.get(agent_id)
+            if state is not None:
+                table.beat(agent_id, current_task_id=state.current_task_id, at=at, expires_at=state.expires_at)
+            self.db.execute(update(Agent).where(Agent.id == agent_id).values(last_heartbeat_at=at))
+        self.db.commit()
+
+    def _finish(self, cycle: int) -> None:
+        due = [task_id for task_id, run in self.running.items() if run.due_cycle <= cycle]
+        if not due:
+            return
+        updates = []
+        for task_id in due:
+            failed = self.rng.random() < self.args.failure_rate
+            # A failed attempt goes back to the queue to be retried.
+            updates.append({'task_id': task_id, 'status': 'pending' if failed else 'completed'})
+            if failed:
+                self.failed += 1
+                self.queued[task_id] = self.running[task_id].footprint
+            else:
+                self.completed += 1
+        TaskService(self.db).update_many(updates)
+
+        now = utc_now()
+        claims = self.db.execute(
+            select(TaskClaim).where(TaskClaim.task_id.in_(due), TaskClaim.state == 'active')
+        ).scalars().all()
+        for claim in claims:
+            claim.state = 'released'
+            claim.released_at = now
+        for task_id in due:
+            run = self.running.pop(task_id)
+            locks = self.db.execute(
+                select(ResourceLock).where(
+                    and_(
+                        ResourceLock.owner_agent_id == run.agent_id,
+                        ResourceLock.resource_key.in_(run.footprint),
+                        ResourceLock.state == 'active',
+                    )
+                )
+            ).scalars().all()
+            for lock in locks:
+                lock.state = 'released'
+                lock.released_at = now
+        self.db.commit()
+
+    def _dispatch(self, cycle: int) -> None:
+        started = time.perf_counter()
+        result = self.engine.run_once(self.db, max_assignments=self.args.dispatch_limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        assignments = result['assignments']
+        self.cycle_ms.append(elapsed_ms)
+        if assignments:
+            self.assignment_ms.append(elapsed_ms / len(assignments))
+        for item in assignments:
+            footprint = self.queued.pop(item['task_id'])
+            self.waits.append(cycle - self.arrived_at[item['task_id']])
+            duration = max(1, math.ceil(self.rng.expovariate(1 / self.args.mean_duration)))
+            self.running[item['task_id']] = Running(agent_id=item['agent_id'], due_cycle=cycle + duration, footprint=footprint)
+
+        capacity = sum(self.agents.values())
+        self.utilization.append(len(self.running) / capacity if capacity else 0.0)
+        if self.queued:
+            footprints = {**{task_id: run.footprint for task_id, run in self.running.items()}, **self.queued}
+            graph = ConflictGraph(footprints)
+            blocked = sum(1 for task_id in self.queued if graph.neighbours(task_id) & self.running.keys())
+            self.blocked_share.append(blocked / len(self.queued))
+
+    def _metrics(self, *, cycles: int, wall_seconds: float) -> dict:
+        totals = lock_stats_for(self.db).report(top=0)['totals']
+        dispatched = len(self.waits)
+        return {
+            'agents': self.args.agents,
+            'tasks': self.created,
+            'cycles': cycles,
+            'dispatched': dispatched,
+            'completed': self.completed,
+            'failed_attempts': self.failed,
+            'wall_seconds': round(wall_seconds, 3),
+            'assignments_per_second': round(dispatched / wall_seconds, 1) if wall_seconds else 0.0,
+            'cycle_ms_p50': round(_percentile(self.cycle_ms, 50), 3),
+            'cycle_ms_p99': round(_percentile(self.cycle_ms, 99), 3),
+            'assignment_ms_mean': round(statistics.fmean(self.assignment_ms), 3) if self.assignment_ms else 0.0,
+            'queue_wait_cycles_p50': _percentile([float(wait) for wait in self.waits], 50),
+            'queue_wait_cycles_p99': _percentile([float(wait) for wait in self.waits], 99),
+            'utilization_mean': round(statistics.fmean(self.utilization), 4) if self.utilization else 0.0,
+            'live_agents_mean': round(statistics.fmean(self.live_share), 4) if self.live_share else 0.0,
+            'conflict_blocked_share_mean': round(statistics.fmean(self.blocked_share), 4) if self.blocked_share else 0.0,
+            'lock_conflicts': totals['conflicts'],
+        }
+
+
+def _print(metrics: dict, baseline: dict | None) -> None:
+    for key, value in metrics.items():
+        line = f'{key:<30} {value}'
+        before = (baseline or {}).get(key)
+        if isinstance(before, (int, float)) and isinstance(value, (int, float)) and before:
+            line += f'  (baseline {before}, {(value - before) / before:+.1%})'
+        print(line)
+
+
+def run(args: argparse.Namespace, database_url: str) -> dict:
+    options = {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}} if database_url == 'sqlite://' else {}
+    engine = create_engine(database_url, future=True, **options)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with Session() as db:
+        return Simulation(db, args).run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--in-memory', action='store_true')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--arrivals-per-cycle', type=int, default=100)
+    parser.add_argument('--dispatch-limit', type=int, default=50)
+    parser.add_argument('--max-cycles', type=int, default=10_000)
+    parser.add_argument('--max-concurrency', type=int, default=3, help='upper bound of each agent\'s declared capacity')
+    parser.add_argument('--frontier-share', type=float, default=0.3, help='share of agents that also serve the frontier tier')
+    parser.add_argument('--heartbeat-jitter', type=float, default=0.05, help='chance an agent misses a cycle\'s heartbeat')
+    parser.add_argument('--cycle-seconds', type=float, default=60.0, help='agent time one cycle stands for')
+    parser.add_argument('--mean-duration', type=float, default=3.0, help='mean cycles an agent works on a task')
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--files-per-task', type=int, default=3)
+    parser.add_argument('--hot-share', type=float, default=0.1, help='chance a file comes from the hot 2%% of the tree')
+    parser.add_argument('--component-share', type=float, default=0.05)
+    parser.add_argument('--json', type=Path, default=None, help='write the metrics here')
+    parser.add_argument('--baseline', type=Path, default=None, help='compare against metrics saved with --json')
+    args = parser.parse_args()
+
+    if args.database_url or args.in_memory:
+        metrics = run(args, args.database_url or 'sqlite://')
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            metrics = run(args, f"sqlite:///{Path(tmp) / 'sim.db'}")
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    _print(metrics, baseline)
+    if args.json:
+        args.json.write_text(json.dumps(metrics, indent=2))
+
+
+if __name__ == '__main__':
+    main()
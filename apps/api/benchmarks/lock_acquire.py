@@ -0,0 +1,95 @@
+"""Acquire-latency benchmark for LockService.
+
+Run from apps/api:
+
+    python -m benchmarks.lock_acquire --keys 2000 --contended 500
+
+Uses a file-backed SQLite database so commits hit disk like a real deployment.
+Pass --database-url to point at Postgres instead.
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+from app.models.entities import Agent
+from app.services.errors import AppError
+from app.services.locks import LockService
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _report(label: str, samples: list[float]) -> None:
+    print(
+        f'{label:<24} n={len(samples):<6} '
+        f'p50={_percentile(samples, 50):7.3f}ms p99={_percentile(samples, 99):7.3f}ms '
+        f'mean={statistics.fmean(samples):7.3f}ms'
+    )
+
+
+def run(*, database_url: str, keys: int, contended: int) -> None:
+    engine = create_engine(database_url, future=True)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+    with Session() as db:
+        owner = Agent(name='bench-owner', type='bench', capabilities={})
+        rival = Agent(name='bench-rival', type='bench', capabilities={})
+        db.add_all([owner, rival])
+        db.commit()
+        owner_id, rival_id = owner.id, rival.id
+
+        locks = LockService(db)
+        granted: list[float] = []
+        for idx in range(keys):
+            start = time.perf_counter()
+            locks.acquire(resource_key=f'file:bench/{idx}.py', agent_id=owner_id, ttl=600)
+            granted.append((time.perf_counter() - start) * 1000)
+
+        reacquired: list[float] = []
+        for idx in range(min(keys, contended)):
+            start = time.perf_counter()
+            locks.acquire(resource_key=f'file:bench/{idx}.py', agent_id=owner_id, ttl=600)
+            reacquired.append((time.perf_counter() - start) * 1000)
+
+        conflicts: list[float] = []
+        for idx in range(min(keys, contended)):
+            start = time.perf_counter()
+            try:
+                locks.acquire(resource_key=f'file:bench/{idx}.py', agent_id=rival_id, ttl=600)
+            except AppError:
+                pass
+            conflicts.append((time.perf_counter() - start) * 1000)
+
+    _report('acquire (uncontended)', granted)
+    _report('acquire (re-entrant)', reacquired)
+    _report('acquire (conflict)', conflicts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--keys', type=int, default=2000)
+    parser.add_argument('--contended', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.database_url:
+        run(database_url=args.database_url, keys=args.keys, contended=args.contended)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        run(database_url=f"sqlite:///{Path(tmp) / 'bench.db'}", keys=args.keys, contended=args.contended)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Wakeup-rate benchmark for the orchestrator runtime.
+
+Run from apps/api:
+
+    python -m benchmarks.orchestrator_wakeups --seconds 5 --tasks-per-second 200
+
+Replays a synthetic event stream: new tasks arrive at a steady rate and every
+assignment echoes back the orchestrator's own writes and `orchestrator.assignment`
+message. It reports how many cycles the stream triggers with one cycle per wake
+event (the previous loop) and with debounced, self-filtering wakeups.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from app.services.change_feed import CHANGE_CHANNEL
+from app.services.orchestrator_runtime import OrchestratorRuntime
+
+ORCHESTRATOR_ID = 'bench-orchestrator'
+
+
+def _legacy_wakes(item: dict) -> bool:
+    # The previous loop woke on every orchestration message, its own included.
+    if item.get('channel') != CHANGE_CHANNEL:
+        return True
+    return OrchestratorRuntime.should_wake(item)
+
+
+def _assignment_echo(task_id: str) -> list[dict]:
+    worker_id = str(uuid.uuid4())
+    return [
+        {'channel': CHANGE_CHANNEL, 'type': 'lock.acquired', 'entity_id': str(uuid.uuid4()), 'data': {}},
+        {'channel': CHANGE_CHANNEL, 'type': 'claim.created', 'entity_id': str(uuid.uuid4()), 'data': {'agent_id': worker_id}},
+        {'channel': CHANGE_CHANNEL, 'type': 'task.updated', 'entity_id': task_id, 'changed': ['status'], 'data': {'status': 'in_progress'}},
+        {'channel': 'orchestration', 'type': 'orchestrator.assignment', 'agent_id': ORCHESTRATOR_ID},
+    ]
+
+
+async def _run(*, seconds: float, tasks_per_second: int, debounce_seconds: float) -> None:
+    runtime = OrchestratorRuntime()
+    runtime._engine.agent_id = ORCHESTRATOR_ID
+    runtime._last_full_at = time.monotonic()
+    queue: asyncio.Queue[dict] = asyncio.Queue()
+    legacy = 0
+    produced = 0
+
+    async def produce() -> None:
+        nonlocal legacy, produced
+        interval = 1.0 / tasks_per_second
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            task_id = str(uuid.uuid4())
+            for item in [{'channel': CHANGE_CHANNEL, 'type': 'task.created', 'entity_id': task_id, 'data': {}}, *_assignment_echo(task_id)]:
+                produced += 1
+                legacy += _legacy_wakes(item)
+                queue.put_nowait(item)
+            await asyncio.sleep(interval)
+
+    producer = asyncio.create_task(produce())
+    batches = 0
+    while not producer.done() or not queue.empty():
+        batch = await runtime.collect_triggers(queue, poll_seconds=seconds * 2, debounce_seconds=debounce_seconds)
+        if batch.triggers:
+            batches += 1
+    await producer
+
+    print(f'events produced            {produced}')
+    print(f'cycles, one per wake       {legacy:<8} ({legacy / seconds:8.1f}/s)')
+    print(f'cycles, debounced          {batches:<8} ({batches / seconds:8.1f}/s)')
+    print(f'ignored self/no-op events  {runtime.status()["ignored_events"]}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--tasks-per-second', type=int, default=200)
+    parser.add_argument('--debounce-seconds', type=float, default=0.25)
+    args = parser.parse_args()
+    asyncio.run(_run(seconds=args.seconds, tasks_per_second=args.tasks_per_second, debounce_seconds=args.debounce_seconds))
+
+
+if __name__ == '__main__':
+    main()
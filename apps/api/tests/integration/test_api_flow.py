@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import math
 import time
+from datetime import datetime
 from pathlib import Path
 
+from app.db import get_db
+from app.main import app
+from app.models.entities import ResourceLock
+from app.repositories.common import as_utc
+
 
 def _headers() -> dict[str, str]:
     return {'x-repomesh-token': 'test-token'}
@@ -1211,3 +1218,552 @@ def test_summarizer_tick_compresses_completed_task_history(client):
     events = client.get('/v1/events', headers=_headers(), params={'task_id': task_id, 'type': 'summary.task', 'channel': 'summary', 'limit': 5})
     assert events.status_code == 200
     assert len(events.json()) == 1
+
+
+def test_task_priority_must_be_a_fair_queue_level(client):
+    rejected = client.post('/v1/tasks', headers=_headers(), json={'goal': 'g', 'description': 'd', 'priority': 1026})
+    assert rejected.status_code == 422
+
+    via_mcp = client.post(
+        '/mcp/http',
+        headers=_headers(),
+        json={
+            'jsonrpc': '2.0',
+            'id': 'prio',
+            'method': 'tool.call',
+            'params': {'name': 'task.create', 'arguments': {'goal': 'g', 'description': 'd', 'priority': 0}},
+        },
+    )
+    assert via_mcp.json()['error']['code'] == 'VALIDATION_ERROR'
+
+
+def test_task_patch_honours_if_match_version(client):
+    task = client.post(
+        '/v1/tasks',
+        headers=_headers(),
+        json={'goal': 'versioned update', 'description': 'optimistic concurrency', 'scope': {}},
+    )
+    assert task.status_code == 200
+    task_id = task.json()['id']
+    version = task.json()['version']
+
+    first = client.patch(
+        f'/v1/tasks/{task_id}',
+        headers={**_headers(), 'If-Match': f'"{version}"'},
+        json={'progress': 20},
+    )
+    assert first.status_code == 200
+    assert first.json()['version'] == version + 1
+    assert first.headers['etag'] == f'"{version + 1}"'
+
+    stale = client.patch(
+        f'/v1/tasks/{task_id}',
+        headers={**_headers(), 'If-Match': f'"{version}"'},
+        json={'progress': 30},
+    )
+    assert stale.status_code == 409
+    error = stale.json()['error']
+    assert error['code'] == 'CONFLICT'
+    assert error['details']['current_version'] == version + 1
+
+    via_body = client.patch(
+        f'/v1/tasks/{task_id}',
+        headers=_headers(),
+        json={'progress': 40, 'expected_version': version + 1},
+    )
+    assert via_body.status_code == 200
+    assert via_body.json()['progress'] == 40
+
+
+def test_task_batch_patch_is_all_or_nothing(client):
+    ids = []
+    for idx in range(3):
+        created = client.post(
+            '/v1/tasks',
+            headers=_headers(),
+            json={'goal': f'batch {idx}', 'description': 'batch update', 'scope': {}},
+        )
+        assert created.status_code == 200
+        ids.append(created.json()['id'])
+
+    batch = client.patch(
+        '/v1/tasks',
+        headers=_headers(),
+        json={
+            'updates': [
+                {'task_id': ids[0], 'status': 'in_progress', 'progress': 10},
+                {'task_id': ids[1], 'progress': 50, 'expected_version': 1},
+                {'task_id': ids[0], 'progress': 20, 'expected_version': 2},
+            ]
+        },
+    )
+    assert batch.status_code == 200
+    items = batch.json()
+    assert [item['id'] for item in items] == [ids[0], ids[1], ids[0]]
+    assert items[0]['progress'] == 20
+    assert items[0]['version'] == 3
+
+    rejected = client.patch(
+        '/v1/tasks',
+        headers=_headers(),
+        json={
+            'updates': [
+                {'task_id': ids[2], 'progress': 90},
+                {'task_id': ids[1], 'progress': 60, 'expected_version': 1},
+            ]
+        },
+    )
+    assert rejected.status_code == 409
+    assert rejected.json()['error']['details']['index'] == 1
+
+    listed = {item['id']: item for item in client.get('/v1/tasks', headers=_headers()).json()}
+    assert listed[ids[2]]['progress'] == 0
+    assert listed[ids[1]]['progress'] == 50
+
+    malformed = client.post(
+        '/mcp/http',
+        headers=_headers(),
+        json={
+            'jsonrpc': '2.0',
+            'id': 'batch-bad',
+            'method': 'tool.call',
+            'params': {'name': 'task.update_many', 'arguments': {'updates': [{'progress': 70}]}},
+        },
+    )
+    assert malformed.status_code == 200
+    assert malformed.json()['error']['code'] == 'VALIDATION_ERROR'
+
+
+def test_change_feed_streams_task_claim_and_lock_transitions(client):
+    worker = client.post(
+        '/v1/agents/register',
+        headers=_headers(),
+        json={'name': 'change-feed-worker', 'type': 'cli', 'capabilities': {}},
+    )
+    assert worker.status_code == 200
+    worker_id = worker.json()['id']
+
+    with client.websocket_connect('/v1/events/ws?token=test-token&channel=changes') as ws:
+        task = client.post(
+            '/v1/tasks',
+            headers=_headers(),
+            json={'goal': 'cdc', 'description': 'watch me', 'scope': {'component': 'api'}},
+        )
+        assert task.status_code == 200
+        task_id = task.json()['id']
+
+        created = ws.receive_json()
+        assert created['type'] == 'task.created'
+        assert created['entity_id'] == task_id
+        assert created['data']['component'] == 'api'
+
+        claim = client.post(
+            f'/v1/tasks/{task_id}/claim',
+            headers=_headers(),
+            json={'agent_id': worker_id, 'resource_key': f'task://{task_id}', 'lease_ttl': 60},
+        )
+        assert claim.status_code == 200
+
+        types = [ws.receive_json()['type'] for _ in range(3)]
+        assert 'lock.acquired' in types
+        assert 'claim.created' in types
+        assert 'task.updated' in types
+
+        heartbeat = client.post(f'/v1/agents/{worker_id}/heartbeat', headers=_headers(), json={'status': 'active'})
+        assert heartbeat.status_code == 200
+        done = client.patch(f'/v1/tasks/{task_id}', headers=_headers(), json={'status': 'completed'})
+        assert done.status_code == 200
+        # Heartbeats only touch liveness columns and are not emitted; completing
+        # the task ends its claim and releases the claim's lock.
+        received = {item['type']: item for item in (ws.receive_json() for _ in range(3))}
+        assert set(received) == {'task.updated', 'claim.released', 'lock.released'}
+        update = received['task.updated']
+        assert update['data']['status'] == 'completed'
+        assert update['seq'] > created['seq']
+
+
+def test_change_records_reach_only_streams_that_name_the_channel():
+    import asyncio
+
+    from app.services.event_stream import event_stream_broker
+
+    async def deliver() -> dict[str, list[str]]:
+        subscribers = {
+            'unfiltered': await event_stream_broker.subscribe(recipient_id=None, channel=None, include_broadcast=True),
+            'named': await event_stream_broker.subscribe(recipient_id=None, channel='changes', include_broadcast=True),
+            'listed': await event_stream_broker.subscribe(
+                recipient_id=None, channel=None, channels={'changes'}, include_broadcast=True
+            ),
+        }
+        try:
+            event_stream_broker.publish_nowait({'channel': 'changes', 'type': 'task.created', 'recipient_id': None})
+            event_stream_broker.publish_nowait({'channel': 'default', 'type': 'note', 'recipient_id': None})
+            await asyncio.sleep(0)
+            return {
+                name: [subscriber.queue.get_nowait()['type'] for _ in range(subscriber.queue.qsize())]
+                for name, subscriber in subscribers.items()
+            }
+        finally:
+            for subscriber in subscribers.values():
+                await event_stream_broker.unsubscribe(subscriber.id)
+
+    assert asyncio.run(deliver()) == {'unfiltered': ['note'], 'named': ['task.created'], 'listed': ['task.created']}
+
+
+def test_orchestrator_runtime_wakes_only_on_assignable_changes():
+    from app.services.orchestrator_runtime import OrchestratorRuntime
+
+    assert OrchestratorRuntime.should_wake({'channel': 'changes', 'type': 'task.created'})
+    assert OrchestratorRuntime.should_wake({'channel': 'changes', 'type': 'agent.registered'})
+    assert OrchestratorRuntime.should_wake({'channel': 'orchestration', 'type': 'chat.message'})
+    assert not OrchestratorRuntime.should_wake({'channel': 'changes', 'type': 'lock.acquired'})
+    assert not OrchestratorRuntime.should_wake(
+        {'channel': 'changes', 'type': 'task.updated', 'changed': ['progress'], 'data': {'status': 'in_progress'}}
+    )
+    assert OrchestratorRuntime.should_wake(
+        {'channel': 'changes', 'type': 'task.updated', 'changed': ['status'], 'data': {'status': 'pending'}}
+    )
+
+
+def test_orchestrator_runtime_coalesces_bursts_and_ignores_its_own_events():
+    import asyncio
+
+    from app.services.orchestrator_runtime import OrchestratorRuntime
+
+    runtime = OrchestratorRuntime()
+    runtime._engine.agent_id = 'orchestrator'
+    runtime._last_full_at = time.monotonic()
+
+    async def burst():
+        queue: asyncio.Queue = asyncio.Queue()
+        for index in range(20):
+            queue.put_nowait({'channel': 'changes', 'type': 'task.created', 'entity_id': f'task-{index}'})
+        queue.put_nowait({'channel': 'orchestration', 'type': 'orchestrator.assignment', 'agent_id': 'orchestrator'})
+        queue.put_nowait({'channel': 'changes', 'type': 'agent.activated', 'entity_id': 'orchestrator'})
+        queue.put_nowait({'channel': 'changes', 'type': 'claim.released', 'data': {'agent_id': 'worker-1'}})
+        return await runtime.collect_triggers(queue, poll_seconds=60, debounce_seconds=0.05)
+
+    batch = asyncio.run(burst())
+    assert not batch.full
+    assert len(batch.task_ids) == 20
+    assert batch.worker_ids == {'worker-1'}
+    status = runtime.status()
+    assert status['ignored_events'] == 2
+    assert status['coalesced_triggers'] == 20
+
+
+def test_task_watch_ws_sends_snapshot_then_diffs_and_resumes(client):
+    worker = client.post('/v1/agents/register', headers=_headers(), json={'name': 'watch-worker', 'type': 'cli', 'capabilities': {}})
+    assert worker.status_code == 200
+    worker_id = worker.json()['id']
+
+    existing = client.post(
+        '/v1/tasks',
+        headers=_headers(),
+        json={'goal': 'already pending', 'description': 'in snapshot', 'scope': {'component': 'watch'}},
+    )
+    assert existing.status_code == 200
+    existing_id = existing.json()['id']
+
+    with client.websocket_connect('/v1/tasks/watch/ws?token=test-token&status=pending&scope=watch') as ws:
+        snapshot = ws.receive_json()
+        assert snapshot['type'] == 'snapshot'
+        assert [item['id'] for item in snapshot['items']] == [existing_id]
+
+        created = client.post(
+            '/v1/tasks',
+            headers=_headers(),
+            json={'goal': 'new pending', 'description': 'diff', 'scope': {'component': 'watch'}},
+        )
+        assert created.status_code == 200
+        new_id = created.json()['id']
+        client.post('/v1/tasks', headers=_headers(), json={'goal': 'other scope', 'description': 'ignored', 'scope': {'component': 'elsewhere'}})
+
+        added = ws.receive_json()
+        assert added['type'] == 'diff'
+        assert added['op'] == 'upsert'
+        assert added['task_id'] == new_id
+        assert added['version'] > snapshot['version']
+
+        claim = client.post(
+            f'/v1/tasks/{existing_id}/claim',
+            headers=_headers(),
+            json={'agent_id': worker_id, 'resource_key': f'task://{existing_id}', 'lease_ttl': 60},
+        )
+        assert claim.status_code == 200
+        removed = ws.receive_json()
+        assert removed['op'] == 'remove'
+        assert removed['task_id'] == existing_id
+        assert removed['task']['status'] == 'claimed'
+
+    progress = client.patch(f'/v1/tasks/{new_id}', headers=_headers(), json={'progress': 5})
+    assert progress.status_code == 200
+
+    resume_url = f"/v1/tasks/watch/ws?token=test-token&status=pending&scope=watch&since_version={removed['version']}"
+    with client.websocket_connect(resume_url) as ws:
+        missed = ws.receive_json()
+        assert missed['type'] == 'diff'
+        assert missed['task_id'] == new_id
+        assert 'progress' in missed['changed']
+
+
+def test_task_watch_resume_from_a_version_ahead_of_the_feed_sends_a_snapshot(client):
+    from app.services.change_feed import change_feed
+
+    # A token from before a restart: the sequence has started over below it.
+    ahead = change_feed.last_seq + 1000
+    with client.websocket_connect(f'/v1/tasks/watch/ws?token=test-token&status=pending&since_version={ahead}') as ws:
+        snapshot = ws.receive_json()
+        assert snapshot['type'] == 'snapshot'
+        assert snapshot['version'] == change_feed.last_seq
+
+        created = client.post('/v1/tasks', headers=_headers(), json={'goal': 'after restart', 'description': 'd', 'scope': {}})
+        diff = ws.receive_json()
+        assert (diff['type'], diff['task_id']) == ('diff', created.json()['id'])
+
+
+def test_task_watch_ws_releases_its_session_after_the_snapshot(client, db_session):
+    open_sessions = []
+
+    def tracked_get_db():
+        open_sessions.append(db_session)
+        try:
+            yield db_session
+        finally:
+            open_sessions.remove(db_session)
+
+    app.dependency_overrides[get_db] = tracked_get_db
+    with client.websocket_connect('/v1/tasks/watch/ws?token=test-token&status=pending') as ws:
+        assert ws.receive_json()['type'] == 'snapshot'
+        assert open_sessions == []
+
+
+def test_lock_batch_grants_all_or_none(client):
+    holder_id = client.post('/v1/agents/register', headers=_headers(), json={'name': 'batch-holder', 'type': 'cli', 'capabilities': {}}).json()['id']
+    other_id = client.post('/v1/agents/register', headers=_headers(), json={'name': 'batch-other', 'type': 'cli', 'capabilities': {}}).json()['id']
+
+    held = client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'file:batch/b.py', 'agent_id': holder_id, 'ttl': 60})
+    assert held.status_code == 200
+
+    denied = client.post(
+        '/v1/locks/batch',
+        headers=_headers(),
+        json={'resource_keys': ['file:batch/c.py', 'file:batch/a.py', 'file:batch/b.py'], 'agent_id': other_id, 'ttl': 60},
+    )
+    assert denied.status_code == 409
+    conflicts = denied.json()['error']['details']['conflicts']
+    assert [item['resource_key'] for item in conflicts] == ['file:batch/b.py']
+    assert conflicts[0]['holders'][0]['owner_agent_id'] == holder_id
+
+    # Nothing from the failed batch was granted.
+    free = client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'file:batch/a.py', 'agent_id': holder_id, 'ttl': 60})
+    assert free.status_code == 200
+    client.post(f"/v1/locks/{free.json()['id']}/release", headers=_headers(), json={'agent_id': holder_id})
+    client.post(f"/v1/locks/{held.json()['id']}/release", headers=_headers(), json={'agent_id': holder_id})
+
+    granted = client.post(
+        '/mcp/http',
+        headers=_headers(),
+        json={
+            'jsonrpc': '2.0',
+            'id': '1',
+            'method': 'tool.call',
+            'params': {
+                'name': 'lock.acquire_many',
+                'arguments': {'resource_keys': ['file:batch/c.py', 'file:batch/a.py', 'file:batch/b.py', 'file:batch/a.py'], 'agent_id': other_id},
+            },
+        },
+    )
+    assert granted.status_code == 200
+    result = granted.json()['result']
+    assert result['count'] == 3
+    assert [item['resource_key'] for item in result['items']] == ['file:batch/a.py', 'file:batch/b.py', 'file:batch/c.py']
+
+
+def test_shared_claims_run_concurrently_while_writers_stay_exclusive(client):
+    reviewers = [
+        client.post('/v1/agents/register', headers=_headers(), json={'name': f'reviewer-{index}', 'type': 'cli', 'capabilities': {}}).json()['id']
+        for index in range(2)
+    ]
+    writer_id = client.post('/v1/agents/register', headers=_headers(), json={'name': 'writer', 'type': 'cli', 'capabilities': {}}).json()['id']
+    tasks = [
+        client.post('/v1/tasks', headers=_headers(), json={'goal': f'review {index}', 'description': 'read only', 'scope': {}}).json()['id']
+        for index in range(2)
+    ]
+
+    for task_id, reviewer_id in zip(tasks, reviewers):
+        claim = client.post(
+            f'/v1/tasks/{task_id}/claim',
+            headers=_headers(),
+            json={'agent_id': reviewer_id, 'resource_key': 'component:billing', 'lease_ttl': 60, 'mode': 'shared'},
+        )
+        assert claim.status_code == 200
+        assert claim.json()['mode'] == 'shared'
+
+    denied = client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'component:billing', 'agent_id': writer_id, 'ttl': 60})
+    assert denied.status_code == 409
+    holders = denied.json()['error']['details']['holders']
+    assert {item['mode'] for item in holders} == {'shared'}
+    assert {item['owner_agent_id'] for item in holders} == set(reviewers)
+
+    bad_mode = client.post(
+        '/v1/locks/acquire',
+        headers=_headers(),
+        json={'resource_key': 'component:billing', 'agent_id': writer_id, 'ttl': 60, 'mode': 'upgradeable'},
+    )
+    assert bad_mode.status_code == 422
+
+
+def test_failed_lock_write_releases_the_reservation(client, monkeypatch):
+    import pytest
+
+    from app.services.locks import LockService
+
+    first_id = client.post('/v1/agents/register', headers=_headers(), json={'name': 'write-fails', 'type': 'cli', 'capabilities': {}}).json()['id']
+    second_id = client.post('/v1/agents/register', headers=_headers(), json={'name': 'write-next', 'type': 'cli', 'capabilities': {}}).json()['id']
+
+    def failing_write(self, grant, *, commit=True):
+        raise RuntimeError('database went away')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(LockService, 'write_grant', failing_write)
+        with pytest.raises(RuntimeError):
+            client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'file:leak.py', 'agent_id': first_id, 'ttl': 600})
+
+    # The key is free again rather than held in memory until the lease lapses.
+    taken = client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'file:leak.py', 'agent_id': second_id, 'ttl': 60})
+    assert taken.status_code == 200
+    assert taken.json()['owner_agent_id'] == second_id
+
+
+def test_lock_stats_rank_hot_keys(client):
+    owner_id = client.post('/v1/agents/register', headers=_headers(), json={'name': 'stats-owner', 'type': 'cli', 'capabilities': {}}).json()['id']
+    other_id = client.post('/v1/agents/register', headers=_headers(), json={'name': 'stats-other', 'type': 'cli', 'capabilities': {}}).json()['id']
+
+    hot = client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'component:hot', 'agent_id': owner_id, 'ttl': 60}).json()
+    client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'component:cold', 'agent_id': owner_id, 'ttl': 60})
+    for _ in range(2):
+        denied = client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'component:hot', 'agent_id': other_id, 'ttl': 60})
+        assert denied.status_code == 409
+    timed_out = client.post(
+        '/v1/locks/acquire',
+        headers=_headers(),
+        json={'resource_key': 'component:hot', 'agent_id': other_id, 'ttl': 60, 'wait_seconds': 0.05},
+    )
+    assert timed_out.status_code == 409
+    client.post(f"/v1/locks/{hot['id']}/release", headers=_headers(), json={'agent_id': owner_id})
+
+    stats = client.get('/v1/locks/stats?top=1', headers=_headers())
+    assert stats.status_code == 200
+    body = stats.json()
+    assert body['totals']['keys'] >= 2
+    (top,) = body['keys']
+    assert top['resource_key'] == 'component:hot'
+    assert top['conflicts'] == 2
+    assert top['timeouts'] == 1
+    assert top['wait']['count'] == 1
+    assert top['wait']['max_ms'] >= 50
+    assert top['hold']['count'] == 1
+
+
+def test_fleet_heartbeat_renews_locks_and_claims(client, db_session):
+    ids = [
+        client.post('/v1/agents/register', headers=_headers(), json={'name': f'fleet-{index}', 'type': 'cli', 'capabilities': {}}).json()['id']
+        for index in range(3)
+    ]
+    lock = client.post('/v1/locks/acquire', headers=_headers(), json={'resource_key': 'file:fleet/a.py', 'agent_id': ids[0], 'ttl': 30})
+    task_id = client.post('/v1/tasks', headers=_headers(), json={'goal': 'fleet', 'description': 'd'}).json()['id']
+    claim = client.post(
+        f'/v1/tasks/{task_id}/claim',
+        headers=_headers(),
+        json={'agent_id': ids[1], 'resource_key': f'task://{task_id}', 'lease_ttl': 600},
+    )
+    assert claim.status_code == 200
+
+    missing = client.post(
+        '/v1/agents/heartbeats',
+        headers=_headers(),
+        json={'heartbeats': [{'agent_id': ids[0], 'status': 'active'}, {'agent_id': 'ghost', 'status': 'active'}]},
+    )
+    assert missing.status_code == 404
+    assert missing.json()['error']['details']['agent_ids'] == ['ghost']
+
+    beat = client.post(
+        '/v1/agents/heartbeats',
+        headers=_headers(),
+        json={
+            'heartbeats': [{'agent_id': agent_id, 'status': 'active'} for agent_id in ids] + [{'agent_id': ids[2], 'status': 'busy'}],
+            'renew_leases': True,
+            'lock_ttl': 900,
+        },
+    )
+    assert beat.status_code == 200
+    body = beat.json()
+    assert [agent['id'] for agent in body['agents']] == ids
+    assert [agent['status'] for agent in body['agents']] == ['active', 'active', 'busy']
+    # The claim's task lock is renewed along with the explicit lock.
+    assert body['renewed_locks'] == 2
+    assert body['renewed_claims'] == 1
+
+    renewed = db_session.get(ResourceLock, lock.json()['id'])
+    db_session.refresh(renewed)
+    assert as_utc(renewed.expires_at) > as_utc(datetime.fromisoformat(lock.json()['expires_at']))
+
+    mcp = client.post(
+        '/mcp/http',
+        headers=_headers(),
+        json={
+            'jsonrpc': '2.0',
+            'id': '1',
+            'method': 'tool.call',
+            'params': {'name': 'agent.heartbeat_many', 'arguments': {'heartbeats': [{'agent_id': ids[0], 'status': 'active'}]}},
+        },
+    )
+    assert mcp.status_code == 200
+    assert mcp.json()['result']['items'][0]['id'] == ids[0]
+
+    oversized = client.post(
+        '/mcp/http',
+        headers=_headers(),
+        json={
+            'jsonrpc': '2.0',
+            'id': '2',
+            'method': 'tool.call',
+            'params': {
+                'name': 'agent.heartbeat_many',
+                'arguments': {'heartbeats': [{'agent_id': ids[0], 'status': 'active'}] * 1001},
+            },
+        },
+    )
+    assert oversized.status_code == 200
+    assert oversized.json()['error']['code'] == 'VALIDATION_ERROR'
+
+
+def test_api_latency_unaffected_while_runtime_cycle_is_busy(client, monkeypatch):
+    import threading
+
+    from app.services.summarizer_runtime import summarizer_runtime
+
+    cycle_started = threading.Event()
+
+    def slow_cycle(**_kwargs):
+        cycle_started.set()
+        time.sleep(1.5)
+        return {'count': 0}
+
+    monkeypatch.setattr(summarizer_runtime, 'run_once_sync', slow_cycle)
+    started = client.post('/v1/summarizer/start', headers=_headers())
+    assert started.status_code == 200
+    try:
+        assert cycle_started.wait(timeout=5)
+        latencies = []
+        for _ in range(30):
+            begin = time.perf_counter()
+            assert client.get('/healthz').status_code == 200
+            latencies.append(time.perf_counter() - begin)
+        latencies.sort()
+        # Nearest-rank p99; with 30 samples that is the slowest request.
+        p99 = latencies[math.ceil(len(latencies) * 0.99) - 1]
+        assert p99 < 0.25, f'p99 {p99:.3f}s while the summarizer cycle was running'
+    finally:
+        client.post('/v1/summarizer/stop', headers=_headers())
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from app.services import adapter_runtime
+from app.services.adapter_runtime import AdapterRuntime
+
+
+def test_a_long_build_does_not_hold_up_the_next_cycle(monkeypatch):
+    runtime = AdapterRuntime()
+    release = threading.Event()
+    assigned = {'slow': 'a', 'fast': 'b'}
+    submitted: list[str] = []
+
+    def execute_one(agent_id: str, task_id: str) -> dict:
+        submitted.append(task_id)
+        if task_id == 'slow':
+            release.wait(5)
+        assigned.pop(task_id)
+        return {'agent_id': agent_id, 'requested_task_id': task_id, 'executed': [{'task_id': task_id}], 'skipped': []}
+
+    monkeypatch.setattr(adapter_runtime, 'task_workers', lambda: 4)
+    monkeypatch.setattr(runtime, '_execute_one', execute_one)
+    monkeypatch.setattr(
+        AdapterRuntime, '_pending_work', staticmethod(lambda db, **kwargs: [(agent, task) for task, agent in assigned.items()])
+    )
+
+    try:
+        start = time.monotonic()
+        first = runtime.run_once_sync()
+        assert time.monotonic() - start < 1
+        assert first['runs'] == []
+
+        runtime._in_flight['fast'].result(timeout=5)
+        second = runtime.run_once_sync()
+        # The finished task is reported; the one still building is not submitted again.
+        assert [run['agent_id'] for run in second['runs']] == ['b']
+        assert second['in_flight'] == ['slow']
+        assert sorted(submitted) == ['fast', 'slow']
+    finally:
+        release.set()
+
+    runtime._in_flight['slow'].result(timeout=5)
+    third = runtime.run_once_sync()
+    assert [run['agent_id'] for run in third['runs']] == ['a']
+    assert third['in_flight'] == []
+    assert runtime.status()['executed_tasks'] == 2
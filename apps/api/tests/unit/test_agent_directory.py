@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import event
+
+from app.services.agent_directory import resolve_agent_ref
+from app.services.agents import AgentService
+from app.services.errors import AppError
+
+
+def test_recipient_resolution_is_cached_and_invalidated_on_register(db_session, engine):
+    agents = AgentService(db_session)
+    first = agents.register(name='reviewer', agent_type='cli', capabilities={}, repo_id=None)
+    assert resolve_agent_ref(db_session, reference='reviewer', repo_id=None) == first.id
+    assert resolve_agent_ref(db_session, reference=first.id, repo_id=None) == first.id
+
+    statements: list[str] = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    for _ in range(10):
+        assert resolve_agent_ref(db_session, reference='reviewer', repo_id=None) == first.id
+        assert resolve_agent_ref(db_session, reference=first.id, repo_id=None) == first.id
+    assert statements == []
+
+    second = agents.register(name='reviewer', agent_type='cli', capabilities={}, repo_id=None, reuse_existing=False)
+    assert resolve_agent_ref(db_session, reference='reviewer', repo_id=None) == second.id
+
+
+def test_unknown_recipient_is_rejected(db_session):
+    with pytest.raises(AppError) as raised:
+        resolve_agent_ref(db_session, reference='nobody', repo_id=None)
+    assert raised.value.status_code == 400
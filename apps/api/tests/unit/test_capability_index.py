@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from sqlalchemy import update
+
+from app.models.entities import Agent
+from app.services.agents import AgentService
+from app.services.routing import RouteDecision, capability_index_for
+
+
+def _route(tier: str, profile: str = 'generic-shell') -> RouteDecision:
+    return RouteDecision(tier=tier, adapter_profile=profile, reason='test')
+
+
+def test_capability_index_matches_declared_routes_and_wildcards(db_session):
+    agents = AgentService(db_session)
+    anything = agents.register(name='any', agent_type='cli', capabilities={}, repo_id=None)
+    frontier = agents.register(name='frontier', agent_type='cli', capabilities={'model_tiers': ['frontier']}, repo_id=None)
+    codex = agents.register(
+        name='codex', agent_type='cli', capabilities={'model_tiers': ['small'], 'adapter_profiles': ['codex']}, repo_id=None
+    )
+
+    index = capability_index_for(db_session)
+
+    assert index.eligible(_route('frontier')) == {anything.id, frontier.id}
+    assert index.eligible(_route('small')) == {anything.id}
+    assert index.eligible(_route('small', 'codex')) == {anything.id, codex.id}
+    assert index.eligible(_route('medium', 'codex')) == {anything.id}
+
+
+def test_capability_index_follows_registration_and_capability_changes(db_session):
+    agents = AgentService(db_session)
+    worker = agents.register(name='worker', agent_type='cli', capabilities={'model_tiers': ['small']}, repo_id=None)
+    index = capability_index_for(db_session)
+    assert index.eligible(_route('frontier')) == frozenset()
+
+    agents.register(name='worker', agent_type='cli', capabilities={'model_tiers': ['frontier']}, repo_id=None)
+    late = agents.register(name='late', agent_type='cli', capabilities={}, repo_id=None)
+
+    assert index.eligible(_route('frontier')) == {worker.id, late.id}
+    assert index.eligible(_route('small')) == {late.id}
+
+
+def test_capability_index_picks_up_changes_committed_by_another_process(db_session):
+    worker = AgentService(db_session).register(name='worker', agent_type='cli', capabilities={}, repo_id=None)
+    index = capability_index_for(db_session)
+    assert index.eligible(_route('small')) == {worker.id}
+
+    # A Core UPDATE bypasses this process's change feed, like a write from another worker.
+    db_session.execute(update(Agent).where(Agent.id == worker.id).values(capabilities={'model_tiers': ['frontier']}))
+    db_session.commit()
+    db_session.expire_all()
+    assert index.eligible(_route('small')) == {worker.id}
+
+    index.observe([db_session.get(Agent, worker.id)])
+
+    assert index.eligible(_route('small')) == frozenset()
+    assert index.eligible(_route('frontier')) == {worker.id}
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from sqlalchemy import event, select
+
+from app.config.settings import get_settings
+from app.models.entities import Agent, AgentSession, ResourceLock, Task, TaskClaim
+from app.repositories.common import utc_now
+from app.services.agents import AgentService
+from app.services.expiry import ExpiryService, expiry_deadlines_for
+from app.services.locks import LockService
+from app.services.session_retention import SessionRetentionService
+
+
+def _count_statements(engine) -> list[str]:
+    statements: list[str] = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_expiry_sweeps_all_lease_kinds_in_batches(db_session):
+    now = utc_now()
+    past = now - timedelta(minutes=1)
+    agent = Agent(name='expiring', type='cli', capabilities={}, status='active')
+    db_session.add(agent)
+    db_session.flush()
+    tasks = [Task(goal=f'g{index}', description='d', scope={}, status='claimed', assignee_agent_id=agent.id) for index in range(3)]
+    db_session.add_all(tasks)
+    db_session.flush()
+    db_session.add_all(
+        [ResourceLock(resource_key=f'file:x{index}.py', owner_agent_id=agent.id, state='active', expires_at=past) for index in range(7)]
+        + [
+            TaskClaim(task_id=task.id, agent_id=agent.id, resource_key=f'task:{task.id}', lease_ttl_seconds=60, state='active', expires_at=past)
+            for task in tasks
+        ]
+        + [AgentSession(agent_id=agent.id, status='active', expires_at=past)]
+    )
+    db_session.commit()
+
+    result = ExpiryService(db_session, batch_size=3).run_due(now=now)
+    assert result == {'locks': 7, 'claims': 3, 'sessions': 1}
+    assert {task.status for task in tasks} == {'stalled'}
+    db_session.refresh(agent)
+    assert agent.status == 'inactive'
+
+
+def test_idle_expiry_check_issues_no_queries(db_session, engine):
+    service = ExpiryService(db_session)
+    service.run_due()
+
+    statements = _count_statements(engine)
+    for _ in range(20):
+        assert service.run_due() == {'locks': 0, 'claims': 0, 'sessions': 0}
+    assert statements == []
+
+
+def test_new_lease_pulls_the_next_deadline_forward(db_session):
+    agent = Agent(name='short-ttl', type='cli', capabilities={}, status='active')
+    db_session.add(agent)
+    db_session.commit()
+    service = ExpiryService(db_session)
+    service.run_due()
+    assert service.deadlines.next_deadline() is None
+
+    lock = LockService(db_session).acquire(resource_key='file:short.py', agent_id=agent.id, ttl=1)
+    assert service.deadlines.next_deadline() is not None
+
+    assert service.run_due(now=utc_now() + timedelta(seconds=2))['locks'] == 1
+    db_session.refresh(lock)
+    assert lock.state == 'expired'
+    assert LockService(db_session).table.holder('file:short.py') is None
+
+
+def test_stale_session_sweep_uses_constant_queries(db_session, engine):
+    def sweep(fleet: int) -> int:
+        past = utc_now() - timedelta(minutes=1)
+        agents = [Agent(name=f'fleet-{fleet}-{index}', type='cli', capabilities={}, status='active') for index in range(fleet)]
+        db_session.add_all(agents)
+        db_session.flush()
+        db_session.add_all([AgentSession(agent_id=agent.id, status='active', expires_at=past) for agent in agents])
+        # Half the fleet reconnected with a fresh session and stays active.
+        db_session.add_all(
+            [AgentSession(agent_id=agent.id, status='active', expires_at=past + timedelta(hours=1)) for agent in agents[::2]]
+        )
+        db_session.commit()
+
+        statements = _count_statements(engine)
+        assert ExpiryService(db_session).expire_sessions(utc_now()) == fleet
+        count = len(statements)
+        db_session.expire_all()
+        inactive = [agent for agent in agents if db_session.get(Agent, agent.id).status == 'inactive']
+        assert len(inactive) == fleet // 2
+        return count
+
+    assert sweep(4) == sweep(40)
+
+
+def test_session_retention_folds_old_sessions_into_uptime(db_session):
+    service = AgentService(db_session)
+    agent = service.register(name='reconnecting', agent_type='cli', capabilities={}, repo_id=None)
+    long_ago = utc_now() - timedelta(days=3)
+    db_session.add_all(
+        [
+            AgentSession(
+                agent_id=agent.id,
+                status='stale',
+                started_at=long_ago,
+                last_heartbeat_at=long_ago + timedelta(minutes=10),
+                expires_at=long_ago + timedelta(minutes=12),
+            )
+            for _ in range(4)
+        ]
+    )
+    db_session.commit()
+    current = agent.current_session_id
+
+    assert SessionRetentionService(db_session).compact() == {'compacted_sessions': 4, 'agents': 1}
+    remaining = db_session.execute(select(AgentSession.id).where(AgentSession.agent_id == agent.id)).scalars().all()
+    assert remaining == [current]
+    uptime = SessionRetentionService(db_session).uptime(agent.id)
+    assert uptime['sessions'] == 5
+    assert uptime['compacted_sessions'] == 4
+    assert uptime['uptime_seconds'] >= 4 * 600
+
+    heartbeat = service.heartbeat(agent_id=agent.id, status='busy', current_task=None)
+    assert heartbeat.current_session_id == current
+
+
+def test_request_path_sweeps_lapsed_sessions_in_batches(db_session, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'expiry_batch_size', 2)
+    service = AgentService(db_session)
+    agents = [service.register(name=f'lapsing-{index}', agent_type='cli', capabilities={}, repo_id=None) for index in range(5)]
+    past = utc_now() - timedelta(minutes=1)
+    for agent in agents:
+        db_session.get(AgentSession, agent.current_session_id).expires_at = past
+    db_session.commit()
+    expiry_deadlines_for(db_session).note('sessions', past)
+
+    # No background runtime is running: listing agents is enough to retire them.
+    listed = {agent.id: agent.status for agent in service.list(repo_id=None)}
+    assert [listed[agent.id] for agent in agents] == ['inactive'] * 5
+
+
+def test_claim_sweep_rereads_a_task_updated_under_it(db_session, monkeypatch):
+    from sqlalchemy import update
+
+    now = utc_now()
+    agent = Agent(name='racing-sweep', type='cli', capabilities={}, status='active')
+    db_session.add(agent)
+    db_session.flush()
+    task = Task(goal='g', description='d', scope={}, status='in_progress', assignee_agent_id=agent.id)
+    db_session.add(task)
+    db_session.flush()
+    db_session.add(
+        TaskClaim(
+            task_id=task.id, agent_id=agent.id, resource_key=f'task:{task.id}', lease_ttl_seconds=60,
+            state='active', expires_at=now - timedelta(minutes=1),
+        )
+    )
+    db_session.commit()
+
+    release_claimed = LockService.release_claimed
+    raced: list[bool] = []
+
+    def patched_between_read_and_write(self, claims, *, now):
+        if not raced:
+            # A PATCH from another connection bumps the version under the sweep.
+            raced.append(True)
+            tasks = Task.__table__
+            self.db.execute(update(tasks).where(tasks.c.id == task.id).values(version=tasks.c.version + 1))
+        return release_claimed(self, claims, now=now)
+
+    monkeypatch.setattr(LockService, 'release_claimed', patched_between_read_and_write)
+    assert ExpiryService(db_session).expire_claims(now) == 1
+
+    db_session.expire_all()
+    assert db_session.get(Task, task.id).status == 'stalled'
+    assert db_session.execute(select(TaskClaim.state)).scalar_one() == 'expired'
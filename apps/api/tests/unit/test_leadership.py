@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.models.entities import Repo, RuntimeLease, Task, TaskClaim
+from app.repositories.common import utc_now
+from app.services.agents import AgentService
+from app.services.errors import AppError
+from app.services.leadership import LeaderScope, LeaseService, lease_name, shard_of
+from app.services.orchestrator import OrchestratorEngine
+
+
+def _lapse(db_session, name: str) -> None:
+    db_session.execute(update(RuntimeLease).where(RuntimeLease.name == name).values(expires_at=utc_now() - timedelta(seconds=1)))
+    db_session.commit()
+
+
+def test_lease_changes_hands_only_after_lapse_with_a_new_fencing_token(db_session):
+    first = LeaseService(db_session, holder_id='replica-a')
+    second = LeaseService(db_session, holder_id='replica-b')
+
+    assert first.acquire('adapter', ttl_seconds=30) == 1
+    assert second.acquire('adapter', ttl_seconds=30) is None
+    assert first.acquire('adapter', ttl_seconds=30) == 1
+
+    _lapse(db_session, 'adapter')
+    assert second.acquire('adapter', ttl_seconds=30) == 2
+    with pytest.raises(AppError) as raised:
+        first.fence('adapter', 1)
+    assert raised.value.details == {'lease': 'adapter', 'fencing_token': 1}
+
+    second.release('adapter')
+    assert first.acquire('adapter', ttl_seconds=30) == 3
+
+
+def test_sharded_orchestrator_assigns_its_repos_and_is_fenced_after_takeover(db_session):
+    repos = [Repo(id=f'repo-{index}', name=f'repo-{index}', root_path='.') for index in range(8)]
+    owned = next(repo for repo in repos if shard_of(repo.id, 2) == 0)
+    foreign = next(repo for repo in repos if shard_of(repo.id, 2) == 1)
+    db_session.add_all(repos)
+    db_session.add_all([Task(goal=repo.id, description='d', scope={}, repo_id=repo.id) for repo in (owned, foreign)])
+    db_session.commit()
+    AgentService(db_session).register(name='worker', agent_type='cli', capabilities={}, repo_id=None)
+
+    name = lease_name('orchestrator', 0, 2)
+    token = LeaseService(db_session).acquire(name, ttl_seconds=30)
+    scope = LeaderScope(runtime='orchestrator', shards=2, tokens={0: token})
+    engine = OrchestratorEngine()
+
+    result = engine.run_once(db_session, scope=scope)
+    assert [db_session.get(Task, item['task_id']).repo_id for item in result['assignments']] == [owned.id]
+
+    _lapse(db_session, name)
+    assert LeaseService(db_session, holder_id='replica-b').acquire(name, ttl_seconds=30) == token + 1
+    db_session.add(Task(goal='late', description='d', scope={}, repo_id=owned.id))
+    db_session.commit()
+    claims = db_session.query(TaskClaim).count()
+
+    with pytest.raises(AppError):
+        engine.run_once(db_session, scope=scope)
+    assert db_session.query(TaskClaim).count() == claims
+
+
+
+
+def test_shard_leader_checks_capacity_and_footprints_against_other_replicas_rows(db_session, monkeypatch):
+    from sqlalchemy import insert
+
+    from app.models.entities import ResourceLock
+    from app.services.locks import LockService
+    from app.services.tasks import TaskService
+
+    repo = next(Repo(id=f'repo-{index}', name=f'repo-{index}', root_path='.') for index in range(8) if shard_of(f'repo-{index}', 2) == 0)
+    db_session.add(repo)
+    agents = AgentService(db_session)
+    busy = agents.register(name='busy', agent_type='cli', capabilities={'max_concurrency': 1}, repo_id=None)
+    idle = agents.register(name='idle', agent_type='cli', capabilities={'max_concurrency': 1}, repo_id=None)
+    overlapping = Task(goal='overlapping', description='d', scope={'files': ['src/a.py']}, repo_id=repo.id)
+    free = Task(goal='free', description='d', scope={'files': ['docs/x.md']}, repo_id=repo.id)
+    running = Task(goal='running', description='d', scope={}, status='in_progress', repo_id=repo.id)
+    db_session.add_all([overlapping, free, running])
+    db_session.commit()
+    # This process's lock table is loaded before the other replica writes.
+    LockService(db_session)
+    live_claimants = TaskService.live_claimants
+
+    def other_replica_commits_after_the_pool_is_read(self, task_ids, *, now):
+        # Written by the other shard's leader, past this process's lock table and change feed.
+        later = now + timedelta(seconds=60)
+        self.db.execute(
+            insert(ResourceLock).values(
+                id='theirs', resource_key='file:src/', owner_agent_id=busy.id, mode='exclusive',
+                state='active', created_at=now, expires_at=later,
+            )
+        )
+        self.db.execute(
+            insert(TaskClaim).values(
+                id='theirs', task_id=running.id, agent_id=busy.id, resource_key=f'task:{running.id}',
+                mode='exclusive', lease_ttl_seconds=60, state='active', claimed_at=now, expires_at=later,
+            )
+        )
+        return live_claimants(self, task_ids, now=now)
+
+    monkeypatch.setattr(TaskService, 'live_claimants', other_replica_commits_after_the_pool_is_read)
+    name = lease_name('orchestrator', 0, 2)
+    scope = LeaderScope(runtime='orchestrator', shards=2, tokens={0: LeaseService(db_session).acquire(name, ttl_seconds=30)})
+
+    result = OrchestratorEngine().run_once(db_session, scope=scope)
+
+    # `busy` is full and `idle` cannot take `overlapping` while the other replica holds `file:src/`.
+    assert [(item['task_id'], item['agent_id']) for item in result['assignments']] == [(free.id, idle.id)]
+    db_session.expire_all()
+    assert db_session.query(TaskClaim).filter(TaskClaim.agent_id == busy.id).count() == 1
+    assert db_session.get(Task, overlapping.id).status == 'pending'
@@ -21,3 +21,69 @@ def test_lock_conflict(db_session):
         assert False, 'Expected conflict'
     except AppError as exc:
         assert exc.code == 'CONFLICT'
+
+
+def test_shared_acquire_emits_one_record_and_sees_other_workers_exclusive_rows(db_session, monkeypatch):
+    from datetime import timedelta
+
+    import pytest
+    from sqlalchemy import insert
+
+    from app.models.entities import ResourceLock
+    from app.repositories.common import utc_now
+    from app.services import change_feed as change_feed_module
+
+    reader, writer = Agent(name='reader', type='cli', capabilities={}), Agent(name='writer', type='cli', capabilities={})
+    db_session.add_all([reader, writer])
+    db_session.commit()
+    published: list[dict] = []
+    monkeypatch.setattr(change_feed_module.event_stream_broker, 'publish_nowait', published.append)
+
+    locks = LockService(db_session)
+    locks.acquire(resource_key='component:docs', agent_id=reader.id, ttl=60, mode='shared')
+    assert [item['type'] for item in published if item['entity'] == 'lock'] == ['lock.acquired']
+
+    # Written by another worker, past this process's lock table.
+    now = utc_now()
+    db_session.execute(
+        insert(ResourceLock).values(
+            id='elsewhere', resource_key='component:api', owner_agent_id=writer.id, mode='exclusive',
+            state='active', created_at=now, expires_at=now + timedelta(seconds=60),
+        )
+    )
+    db_session.commit()
+    with pytest.raises(AppError) as raised:
+        locks.acquire(resource_key='component:api', agent_id=reader.id, ttl=60, mode='shared')
+    assert raised.value.details['holders'][0]['owner_agent_id'] == writer.id
+
+
+def test_claim_of_a_task_updated_concurrently_is_a_version_conflict(db_session):
+    from sqlalchemy import event, update
+
+    from app.models.entities import Task
+    from app.services.tasks import TaskService
+
+    agent = Agent(name='claimer', type='cli', capabilities={})
+    task = Task(goal='g', description='d', scope={})
+    db_session.add_all([agent, task])
+    db_session.commit()
+
+    raced: list[bool] = []
+
+    def bump_before_the_claim_flush(session, flush_context, instances):
+        if not raced and any(isinstance(obj, Task) for obj in session.dirty):
+            raced.append(True)
+            # A PATCH from another connection lands between the claim's read and write.
+            tasks = Task.__table__
+            session.execute(update(tasks).where(tasks.c.id == task.id).values(version=tasks.c.version + 1))
+
+    event.listen(db_session, 'before_flush', bump_before_the_claim_flush)
+    try:
+        TaskService(db_session).claim(task_id=task.id, agent_id=agent.id, resource_key=f'task:{task.id}', lease_ttl=60)
+    except AppError as exc:
+        assert exc.status_code == 409
+        assert exc.code == 'CONFLICT'
+    else:
+        raise AssertionError('expected a version conflict')
+    db_session.expire_all()
+    assert db_session.get(Task, task.id).status == 'pending'
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.models.entities import Agent, ResourceLock
+from app.repositories.common import as_utc, utc_now
+from app.services.errors import AppError
+from app.services.lock_table import (
+    LockConflict,
+    LockTable,
+    LockWaitersExhausted,
+    LockWaitTimeout,
+    lock_table_for,
+    stage_undo,
+)
+from app.services.locks import LockService
+
+
+def _agents(db_session, *names: str) -> list[Agent]:
+    agents = [Agent(name=name, type='cli', capabilities={}) for name in names]
+    db_session.add_all(agents)
+    db_session.commit()
+    return agents
+
+
+def test_acquire_is_answered_from_memory_and_written_through(db_session):
+    agent_a, agent_b = _agents(db_session, 'a', 'b')
+    locks = LockService(db_session)
+
+    lock = locks.acquire(resource_key='file:src/a.py', agent_id=agent_a.id, ttl=60)
+    assert db_session.get(ResourceLock, lock.id).state == 'active'
+    assert locks.table.holder('file:src/a.py').id == lock.id
+
+    again = locks.acquire(resource_key='file:src/a.py', agent_id=agent_a.id, ttl=120)
+    assert again.id == lock.id
+
+    try:
+        locks.acquire(resource_key='file:src/a.py', agent_id=agent_b.id, ttl=60)
+        assert False, 'Expected conflict'
+    except AppError as exc:
+        assert exc.details['holders'][0]['owner_agent_id'] == agent_a.id
+
+
+def test_lock_table_recovers_active_rows_on_startup(db_session):
+    (agent,) = _agents(db_session, 'recover')
+    now = utc_now()
+    db_session.add_all(
+        [
+            ResourceLock(resource_key='component:api', owner_agent_id=agent.id, state='active', expires_at=now + timedelta(minutes=5)),
+            ResourceLock(resource_key='component:old', owner_agent_id=agent.id, state='active', expires_at=now - timedelta(minutes=5)),
+            ResourceLock(resource_key='component:gone', owner_agent_id=agent.id, state='released', expires_at=now + timedelta(minutes=5)),
+        ]
+    )
+    db_session.commit()
+
+    table = lock_table_for(db_session)
+    assert table.holder('component:api') is not None
+    assert table.holder('component:old') is None
+    assert table.holder('component:gone') is None
+
+
+def test_database_rejects_a_second_active_lock_for_a_key(db_session):
+    agent_a, agent_b = _agents(db_session, 'db-a', 'db-b')
+    expires_at = utc_now() + timedelta(minutes=5)
+    db_session.add(ResourceLock(resource_key='file:dup.py', owner_agent_id=agent_a.id, state='active', expires_at=expires_at))
+    db_session.commit()
+    db_session.add(ResourceLock(resource_key='file:dup.py', owner_agent_id=agent_b.id, state='active', expires_at=expires_at))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+
+def test_acquire_upsert_handles_rows_unknown_to_this_process(db_session):
+    agent_a, agent_b = _agents(db_session, 'worker-a', 'worker-b')
+    now = utc_now()
+    lapsed = ResourceLock(resource_key='file:lapsed.py', owner_agent_id=agent_a.id, state='active', expires_at=now - timedelta(minutes=1))
+    db_session.add(lapsed)
+    db_session.commit()
+
+    held = LockService(db_session).acquire(resource_key='file:other-worker.py', agent_id=agent_a.id, ttl=60)
+
+    # A second API worker: its own table has not seen either row.
+    locks = LockService(db_session)
+    locks.table = LockTable()
+    locks.table._loaded = True
+
+    lock = locks.acquire(resource_key='file:lapsed.py', agent_id=agent_b.id, ttl=60)
+    assert lock.owner_agent_id == agent_b.id
+    db_session.refresh(lapsed)
+    assert lapsed.state == 'expired'
+
+    with pytest.raises(AppError) as exc:
+        locks.acquire(resource_key='file:other-worker.py', agent_id=agent_b.id, ttl=60)
+    assert exc.value.details['holders'][0]['lock_id'] == held.id
+    assert locks.table.holder('file:other-worker.py').id == held.id
+
+
+def test_expired_holders_are_evicted_via_heap():
+    table = LockTable()
+    now = utc_now()
+    table.try_acquire(resource_key='k', agent_id='a', expires_at=now + timedelta(seconds=1), now=now)
+
+    later = now + timedelta(seconds=2)
+    grant = table.try_acquire(resource_key='k', agent_id='b', expires_at=later + timedelta(seconds=5), now=later)
+    assert grant.created
+    assert [item.owner_agent_id for item in grant.evicted] == ['a']
+
+
+def test_rollback_undoes_in_memory_grant(db_session):
+    (agent,) = _agents(db_session, 'rollback')
+    locks = LockService(db_session)
+    locks.acquire(resource_key='file:x', agent_id=agent.id, ttl=60)
+
+    grant = locks.table.try_acquire(resource_key='file:z', agent_id=agent.id, expires_at=utc_now() + timedelta(seconds=60), now=utc_now())
+    stage_undo(db_session, lambda: locks.table.forget(grant.entry.id))
+    db_session.rollback()
+    assert locks.table.holder('file:z') is None
+    assert locks.table.holder('file:x') is not None
+
+
+def test_release_through_orm_is_synced_into_table(db_session):
+    (agent,) = _agents(db_session, 'sync')
+    locks = LockService(db_session)
+    lock = locks.acquire(resource_key='file:sync.py', agent_id=agent.id, ttl=60)
+
+    # Simulates a code path (e.g. the adapter) releasing the row directly.
+    lock.state = 'released'
+    db_session.commit()
+    assert locks.table.holder('file:sync.py') is None
+
+
+def _wait_until(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.005)
+
+
+def test_waiters_are_granted_in_fifo_order():
+    table = LockTable()
+    now = utc_now()
+    held = table.try_acquire(resource_key='file:q.py', agent_id='a', expires_at=now + timedelta(minutes=5), now=now)
+    grants: dict[str, object] = {}
+
+    def wait(agent_id: str) -> None:
+        grants[agent_id] = table.wait_acquire(resource_key='file:q.py', agent_id=agent_id, ttl=60, wait_seconds=5)
+
+    first = threading.Thread(target=wait, args=('b',))
+    first.start()
+    _wait_until(lambda: table.waiting('file:q.py') == 1)
+    second = threading.Thread(target=wait, args=('c',))
+    second.start()
+    _wait_until(lambda: table.waiting('file:q.py') == 2)
+
+    table.forget(held.entry.id)
+    first.join(timeout=2)
+    assert grants['b'].queue_position == 0
+    assert 'c' not in grants
+
+    table.forget(grants['b'].entry.id)
+    second.join(timeout=2)
+    assert grants['c'].queue_position == 1
+    assert table.waiting('file:q.py') == 0
+
+
+def test_waiter_is_woken_when_the_holder_lease_lapses():
+    table = LockTable()
+    now = utc_now()
+    table.try_acquire(resource_key='file:lapse.py', agent_id='a', expires_at=now + timedelta(milliseconds=100), now=now)
+
+    grant = table.wait_acquire(resource_key='file:lapse.py', agent_id='b', ttl=60, wait_seconds=2)
+    assert grant.created
+    assert [item.owner_agent_id for item in grant.evicted] == ['a']
+    assert 0.05 < grant.waited_seconds < 1.5
+
+
+def test_wait_times_out_with_queue_details():
+    table = LockTable()
+    now = utc_now()
+    table.try_acquire(resource_key='file:busy.py', agent_id='a', expires_at=now + timedelta(minutes=5), now=now)
+
+    with pytest.raises(LockWaitTimeout) as exc:
+        table.wait_acquire(resource_key='file:busy.py', agent_id='b', ttl=60, wait_seconds=0.05)
+    assert exc.value.waited_seconds >= 0.05
+    assert exc.value.queue_position == 0
+    assert [item.owner_agent_id for item in exc.value.holders] == ['a']
+    assert table.waiting('file:busy.py') == 0
+
+
+def test_async_waiters_park_on_the_loop_and_thread_waiters_are_capped():
+    table = LockTable(max_blocking_waiters=1)
+    now = utc_now()
+    held = table.try_acquire(resource_key='file:hot.py', agent_id='a', expires_at=now + timedelta(minutes=5), now=now)
+
+    async def scenario() -> list[str]:
+        waiters = [
+            asyncio.create_task(table.wait_acquire_async(resource_key='file:hot.py', agent_id=f'w{index}', ttl=60, wait_seconds=5))
+            for index in range(50)
+        ]
+        while table.waiting('file:hot.py') < 50:
+            await asyncio.sleep(0.001)
+        # A releasing thread wakes the head parked on the loop.
+        releaser = threading.Thread(target=table.forget, args=(held.entry.id,))
+        releaser.start()
+        granted = []
+        for task in waiters:
+            grant = await task
+            granted.append(grant.entry.owner_agent_id)
+            table.forget(grant.entry.id)
+        releaser.join()
+        return granted
+
+    assert asyncio.run(scenario()) == [f'w{index}' for index in range(50)]
+
+    table.try_acquire(resource_key='file:hot.py', agent_id='a', expires_at=utc_now() + timedelta(minutes=5), now=utc_now())
+    outcomes: list[Exception] = []
+
+    def park() -> None:
+        try:
+            table.wait_acquire(resource_key='file:hot.py', agent_id='b', ttl=60, wait_seconds=0.5)
+        except LockWaitTimeout as exc:
+            outcomes.append(exc)
+
+    parked = threading.Thread(target=park)
+    parked.start()
+    _wait_until(lambda: table.waiting('file:hot.py') == 1)
+    with pytest.raises(LockWaitersExhausted):
+        table.wait_acquire(resource_key='file:hot.py', agent_id='c', ttl=60, wait_seconds=0.5)
+    parked.join()
+    assert len(outcomes) == 1
+
+
+def test_descendant_acquire_cannot_jump_a_waiter_on_its_ancestor():
+    table = LockTable()
+    now = utc_now()
+    held = table.try_acquire(resource_key='file:src/a.py', agent_id='a', expires_at=now + timedelta(minutes=5), now=now)
+    grants: dict[str, object] = {}
+    waiter = threading.Thread(
+        target=lambda: grants.update(b=table.wait_acquire(resource_key='file:src/', agent_id='b', ttl=60, wait_seconds=5))
+    )
+    waiter.start()
+    _wait_until(lambda: table.waiting('file:src/') == 1)
+
+    with pytest.raises(LockConflict) as exc:
+        table.try_acquire(resource_key='file:src/b.py', agent_id='c', expires_at=now + timedelta(minutes=1), now=utc_now())
+    assert exc.value.queued == 1
+    # The holder itself may still take more of the tree it already blocks.
+    table.try_acquire(resource_key='file:src/c.py', agent_id='a', expires_at=now + timedelta(minutes=1), now=utc_now())
+
+    table.forget(held.entry.id)
+    table.forget(table.held('file:src/c.py', 'a').id)
+    waiter.join(timeout=2)
+    assert grants['b'].entry.resource_key == 'file:src/'
+
+
+def test_upgrade_conflicting_with_another_worker_is_a_lock_conflict(db_session):
+    agent_a, agent_b = _agents(db_session, 'upgrader', 'other-writer')
+    locks = LockService(db_session)
+    shared = locks.acquire(resource_key='file:up.py', agent_id=agent_a.id, ttl=60, mode='shared')
+
+    # A second API worker grants an exclusive lock its own table sees no conflict for.
+    other = LockService(db_session)
+    other.table = LockTable()
+    other.acquire(resource_key='file:up.py', agent_id=agent_b.id, ttl=60)
+
+    with pytest.raises(AppError) as exc:
+        locks.acquire(resource_key='file:up.py', agent_id=agent_a.id, ttl=60, mode='exclusive')
+    assert exc.value.status_code == 409
+    assert exc.value.details['holders'][0]['owner_agent_id'] == agent_b.id
+    db_session.refresh(shared)
+    assert shared.mode == 'shared'
+    assert locks.table.held('file:up.py', agent_a.id).mode == 'shared'
+
+
+def test_renew_held_never_shortens_and_covers_locks_from_other_workers(db_session):
+    (agent,) = _agents(db_session, 'renewer')
+    locks = LockService(db_session)
+    long_lease = locks.acquire(resource_key='file:long.py', agent_id=agent.id, ttl=7200)
+    long_deadline = as_utc(long_lease.expires_at)
+
+    # Taken through another worker: this process's table never saw it.
+    other = LockService(db_session)
+    other.table = LockTable()
+    foreign = other.acquire(resource_key='file:foreign.py', agent_id=agent.id, ttl=30)
+    locks.table.forget(foreign.id)
+
+    now = utc_now()
+    assert locks.renew_held(agent_ids=[agent.id], ttl=600, now=now) == 2
+    db_session.commit()
+    assert as_utc(db_session.get(ResourceLock, long_lease.id).expires_at) == long_deadline
+    assert locks.table.get(long_lease.id).expires_at == long_deadline
+    assert as_utc(db_session.get(ResourceLock, foreign.id).expires_at) == now + timedelta(seconds=600)
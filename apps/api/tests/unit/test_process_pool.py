@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from app.services.process_pool import ProcessPool
+
+SLEEP = f'"{sys.executable}" -c "import time; time.sleep(0.3)"'
+
+
+def _elapsed(pool: ProcessPool, agent_ids: list[str]) -> float:
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(agent_ids)) as threads:
+        list(threads.map(lambda agent_id: pool.run(SLEEP, cwd='.', timeout_seconds=10, agent_id=agent_id), agent_ids))
+    return time.monotonic() - start
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        # A killed child nobody has reaped yet is a zombie, not a running command.
+        return Path(f'/proc/{pid}/stat').read_text().split()[2] != 'Z'
+    except OSError:
+        return True
+
+
+def test_commands_run_in_parallel_across_agents_but_not_past_the_per_agent_limit():
+    pool = ProcessPool(max_processes=4, per_agent=1)
+
+    assert _elapsed(pool, ['a', 'b', 'c']) < 0.8
+    assert _elapsed(pool, ['a', 'a', 'a']) >= 0.85
+    assert pool.status()['running'] == 0
+
+
+def test_pool_captures_output_and_enforces_timeouts():
+    pool = ProcessPool(max_processes=2, per_agent=1)
+
+    result = pool.run('echo out && echo err 1>&2 && exit 3', cwd='.', timeout_seconds=10, agent_id='a')
+    assert (result['exit_code'], result['stdout'], result['stderr']) == (3, 'out', 'err')
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.run(SLEEP, cwd='.', timeout_seconds=0.05, agent_id='a')
+
+
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    pool = ProcessPool(max_processes=1, per_agent=1)
+    pid_file = tmp_path / 'child.pid'
+
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.run(f'sleep 30 & echo $! > "{pid_file}"; wait', cwd='.', timeout_seconds=0.3, agent_id='a')
+    assert time.monotonic() - start < 5
+
+    child = int(pid_file.read_text())
+    deadline = time.monotonic() + 2
+    while _alive(child):
+        if time.monotonic() > deadline:
+            pytest.fail('the shell\'s child outlived the timeout')
+        time.sleep(0.02)
+
+
+def test_task_workers_stay_below_the_database_pool(monkeypatch):
+    from types import SimpleNamespace
+
+    from sqlalchemy.pool import QueuePool
+
+    from app.services import adapter_runtime
+
+    monkeypatch.setattr(adapter_runtime.process_pool, 'max_processes', 32)
+    monkeypatch.setattr(adapter_runtime, 'engine', SimpleNamespace(pool=QueuePool(lambda: None, pool_size=5)))
+    assert adapter_runtime.task_workers() == 4
+
+    monkeypatch.setenv('ADAPTER_TASK_WORKERS', '8')
+    adapter_runtime.get_settings.cache_clear()
+    try:
+        assert adapter_runtime.task_workers() == 8
+    finally:
+        monkeypatch.delenv('ADAPTER_TASK_WORKERS')
+        adapter_runtime.get_settings.cache_clear()
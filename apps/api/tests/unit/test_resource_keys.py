@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pytest
+
+from app.repositories.common import utc_now
+from app.services.lock_table import LockConflict, LockTable
+from app.services.resource_keys import ResourceTrie, keys_overlap, split_resource_key
+
+
+def test_split_resource_key_normalizes_prefix_forms():
+    assert split_resource_key('file:src/') == ('file', 'src')
+    assert split_resource_key('file:src/**') == ('file', 'src')
+    assert split_resource_key('file:./src\\a.py') == ('file', 'src', 'a.py')
+    assert split_resource_key('task://abc') == split_resource_key('task:abc')
+    assert keys_overlap('file:src/', 'file:src/a.py')
+    assert not keys_overlap('file:src/a.py', 'file:src/b.py')
+    assert not keys_overlap('file:src', 'component:src')
+
+
+def test_trie_reports_ancestor_and_descendant_conflicts():
+    trie: ResourceTrie[str] = ResourceTrie()
+    trie.insert(split_resource_key('file:src/api/app.py'), 'a', 'deep')
+    trie.insert(split_resource_key('file:docs'), 'b', 'docs')
+
+    assert trie.conflicts(split_resource_key('file:src/'), 'b') == ['deep']
+    assert trie.conflicts(split_resource_key('file:src/'), 'a') == []
+    assert trie.conflicts(split_resource_key('file:docs/guide.md'), 'a') == ['docs']
+    assert sorted(trie.conflicts(split_resource_key('file:'), 'c')) == ['deep', 'docs']
+
+    assert trie.remove(split_resource_key('file:src/api/app.py'), 'a') == 'deep'
+    assert trie.conflicts(split_resource_key('file:src/'), 'b') == []
+    assert trie.exact(split_resource_key('file:src/api/app.py')) == {}
+
+
+def test_lock_table_prefix_locks_conflict_with_nested_keys():
+    table = LockTable()
+    now = utc_now()
+    later = now + timedelta(minutes=5)
+    table.try_acquire(resource_key='file:src/api/app.py', agent_id='a', expires_at=later, now=now)
+
+    with pytest.raises(LockConflict) as exc:
+        table.try_acquire(resource_key='file:src/', agent_id='b', expires_at=later, now=now)
+    assert [item.resource_key for item in exc.value.holders] == ['file:src/api/app.py']
+
+    # The same agent may widen its own lock.
+    assert table.try_acquire(resource_key='file:src/', agent_id='a', expires_at=later, now=now).created
+    with pytest.raises(LockConflict):
+        table.try_acquire(resource_key='file:src/web/page.ts', agent_id='b', expires_at=later, now=now)
+
+
+def test_lock_table_scales_to_thousands_of_fine_grained_locks():
+    table = LockTable()
+    now = utc_now()
+    later = now + timedelta(minutes=5)
+    for index in range(5000):
+        table.try_acquire(
+            resource_key=f'file:pkg{index % 50}/mod{index}.py', agent_id=f'agent-{index % 50}', expires_at=later, now=now
+        )
+    assert len(table) == 5000
+
+    # Unrelated keys never walk the populated subtrees.
+    grant = table.try_acquire(resource_key='file:other/x.py', agent_id='z', expires_at=later, now=now)
+    assert grant.created
+    # A directory owned by one agent is free for that agent and blocked for others.
+    assert table.try_acquire(resource_key='file:pkg7/', agent_id='agent-7', expires_at=later, now=now).created
+    with pytest.raises(LockConflict) as exc:
+        table.try_acquire(resource_key='file:pkg8', agent_id='agent-7', expires_at=later, now=now)
+    assert 0 < len(exc.value.holders) <= 20
+
+
+def test_shared_locks_coexist_and_block_exclusive_ones():
+    table = LockTable()
+    now = utc_now()
+    later = now + timedelta(minutes=5)
+    table.try_acquire(resource_key='component:api', agent_id='reader-1', expires_at=later, now=now, mode='shared')
+    table.try_acquire(resource_key='component:api/routes.py', agent_id='reader-2', expires_at=later, now=now, mode='shared')
+
+    with pytest.raises(LockConflict) as exc:
+        table.try_acquire(resource_key='component:api', agent_id='writer', expires_at=later, now=now)
+    assert {item.owner_agent_id for item in exc.value.holders} == {'reader-1', 'reader-2'}
+
+    # A sole reader may upgrade once the other reader is gone.
+    with pytest.raises(LockConflict):
+        table.try_acquire(resource_key='component:api', agent_id='reader-1', expires_at=later, now=now)
+    table.forget(table.held('component:api/routes.py', 'reader-2').id)
+    upgraded = table.try_acquire(resource_key='component:api', agent_id='reader-1', expires_at=later, now=now)
+    assert not upgraded.created
+    assert upgraded.entry.mode == 'exclusive'
+    with pytest.raises(LockConflict):
+        table.try_acquire(resource_key='component:api/x.py', agent_id='reader-2', expires_at=later, now=now, mode='shared')
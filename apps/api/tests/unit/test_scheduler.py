@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import timedelta
+
+from app.models.entities import Task, TaskClaim
+from app.repositories.common import utc_now
+from app.schemas.common import MAX_PRIORITY
+from app.services.agents import AgentService
+from app.services.orchestrator import OrchestratorEngine
+from app.services.scheduler import ConflictGraph, FairQueue, WorkerPool, task_footprint
+
+
+def _drain(queue: FairQueue, buckets, count: int) -> Counter:
+    served: Counter = Counter()
+    for _ in range(count):
+        level = queue.pick(buckets)
+        buckets[level].popleft()
+        queue.charge(level)
+        served[level] += 1
+    return served
+
+
+def test_fair_queue_shares_dispatches_by_priority_weight():
+    now = utc_now()
+    tasks = [Task(goal='g', description='d', priority=priority, created_at=now) for priority in (5, 3, 1) for _ in range(100)]
+    queue = FairQueue()
+    served = _drain(queue, queue.buckets(tasks, now=now, aging_seconds=0), 42)
+    # Weights 16 : 4 : 1.
+    assert served == {5: 32, 3: 8, 1: 2}
+
+
+def test_aging_lifts_old_tasks_to_higher_levels():
+    now = utc_now()
+    old = Task(goal='g', description='d', priority=1, created_at=now - timedelta(seconds=650))
+    ancient = Task(goal='g', description='d', priority=1, created_at=now - timedelta(days=1))
+    assert FairQueue.level(old, now=now, aging_seconds=300) == 3
+    assert FairQueue.level(ancient, now=now, aging_seconds=300) == 5
+
+
+def test_out_of_range_priorities_are_clamped_to_the_levels():
+    now = utc_now()
+    huge = Task(goal='g', description='d', priority=2000, created_at=now)
+    negative = Task(goal='g', description='d', priority=-4, created_at=now)
+    assert FairQueue.level(huge, now=now, aging_seconds=300) == MAX_PRIORITY
+    assert FairQueue.level(negative, now=now, aging_seconds=300) == 1
+    queue = FairQueue()
+    served = _drain(queue, queue.buckets([huge, negative] * 20, now=now, aging_seconds=0), 17)
+    assert served == {MAX_PRIORITY: 16, 1: 1}
+
+
+def test_worker_pool_ignores_lapsed_claims(db_session):
+    worker = AgentService(db_session).register(name='lapsed', agent_type='cli', capabilities={'max_concurrency': 1}, repo_id=None)
+    task = Task(goal='g', description='d', scope={}, status='claimed', assignee_agent_id=worker.id)
+    db_session.add(task)
+    db_session.flush()
+    db_session.add(
+        TaskClaim(
+            task_id=task.id,
+            agent_id=worker.id,
+            resource_key=f'task:{task.id}',
+            lease_ttl_seconds=60,
+            state='active',
+            expires_at=utc_now() - timedelta(minutes=1),
+        )
+    )
+    db_session.commit()
+    assert WorkerPool(db_session, [worker]).by_id[worker.id].has_room
+
+
+def test_orchestrator_respects_declared_capacity_and_balances_load(db_session):
+    agents = AgentService(db_session)
+    small = agents.register(name='small', agent_type='cli', capabilities={'max_concurrency': 1}, repo_id=None)
+    large = agents.register(name='large', agent_type='cli', capabilities={'max_concurrency': 2}, repo_id=None)
+    db_session.add_all([Task(goal=f'g{index}', description='d', scope={}, priority=3) for index in range(5)])
+    db_session.commit()
+
+    result = OrchestratorEngine().run_once(db_session, max_assignments=10)
+
+    per_agent = Counter(item['agent_id'] for item in result['assignments'])
+    assert per_agent == {small.id: 1, large.id: 2}
+    assert db_session.query(Task).filter(Task.status == 'pending').count() == 2
+
+
+def test_incremental_cycle_assigns_only_triggered_tasks(db_session):
+    worker = AgentService(db_session).register(name='worker', agent_type='cli', capabilities={}, repo_id=None)
+    engine = OrchestratorEngine()
+    engine.run_once(db_session)
+    triggered, other = Task(goal='new', description='d', scope={}), Task(goal='old', description='d', scope={})
+    db_session.add_all([triggered, other])
+    db_session.commit()
+
+    result = engine.run_incremental(db_session, task_ids={triggered.id}, worker_ids=set())
+
+    assert [(item['task_id'], item['agent_id']) for item in result['assignments']] == [(triggered.id, worker.id)]
+    db_session.refresh(other)
+    assert other.status == 'pending'
+
+
+def test_assignment_cycle_commits_once_and_publishes_after_commit(db_session, monkeypatch):
+    from sqlalchemy import event
+
+    from app.db import ends_transaction
+    from app.models.entities import Event, TaskClaim
+    from app.services import events as events_module
+
+    worker = AgentService(db_session).register(name='worker', agent_type='cli', capabilities={}, repo_id=None)
+    engine = OrchestratorEngine()
+    engine.run_once(db_session)
+    db_session.add_all([Task(goal=f'g{index}', description='d', scope={}) for index in range(10)])
+    db_session.commit()
+
+    commits: list[int] = []
+    published: list[tuple[int, dict]] = []
+    event.listen(db_session, 'after_commit', lambda session: ends_transaction(session) and commits.append(len(commits)))
+
+    def publish(item: dict) -> None:
+        if item['channel'] == 'orchestration':
+            published.append((len(commits), item))
+
+    monkeypatch.setattr(events_module.event_stream_broker, 'publish_nowait', publish)
+
+    result = engine.run_incremental(db_session, task_ids=set(), worker_ids={worker.id})
+
+    assert len(result['assignments']) == 10
+    assert len(commits) == 1
+    assert [committed for committed, _ in published] == [1] * 10
+    assert {item['task_id'] for _, item in published} == {item['task_id'] for item in result['assignments']}
+    assert db_session.query(TaskClaim).filter(TaskClaim.state == 'active').count() == 10
+    assert db_session.query(Event).filter(Event.type == 'orchestrator.assignment').count() == 10
+    assert db_session.query(Task).filter(Task.status == 'in_progress').count() == 10
+
+
+def test_concurrent_task_update_skips_only_that_assignment(db_session, monkeypatch):
+    from sqlalchemy import update
+
+    from app.services.locks import LockService
+
+    worker = AgentService(db_session).register(name='racing', agent_type='cli', capabilities={}, repo_id=None)
+    raced, other = Task(goal='raced', description='d', scope={}), Task(goal='other', description='d', scope={})
+    db_session.add_all([raced, other])
+    db_session.commit()
+
+    acquire_many = LockService.acquire_many
+
+    def patched_between_read_and_write(self, **kwargs):
+        if kwargs['resource_keys'][0] == f'task:{raced.id}':
+            # A PATCH from another connection bumps the version under the cycle.
+            tasks = Task.__table__
+            self.db.execute(update(tasks).where(tasks.c.id == raced.id).values(version=tasks.c.version + 1))
+        return acquire_many(self, **kwargs)
+
+    monkeypatch.setattr(LockService, 'acquire_many', patched_between_read_and_write)
+    result = OrchestratorEngine().run_once(db_session, max_assignments=10)
+
+    assert [item['task_id'] for item in result['assignments']] == [other.id]
+    db_session.expire_all()
+    assert db_session.get(Task, other.id).status == 'in_progress'
+    assert db_session.get(Task, raced.id).status == 'pending'
+    assert LockService(db_session).table.holder(f'task:{raced.id}') is None
+
+
+def test_footprint_covers_every_file_and_conflict_graph_joins_overlaps():
+    refactor = Task(id='refactor', scope={'files': ['src/a.py', 'src/b.py'], 'component': 'core'})
+    sibling = Task(id='sibling', scope={'files': ['src/c.py'], 'component': 'core'})
+    docs = Task(id='docs', scope={'files': ['docs/x.md']})
+    tree = Task(id='tree', scope={'resource_key': 'file:src/'})
+    component = Task(id='component', scope={'component': 'core'})
+    bare = Task(id='bare', scope={})
+
+    assert task_footprint(refactor) == ['file:src/a.py', 'file:src/b.py']
+    assert task_footprint(component) == ['component:core']
+    assert task_footprint(bare) == ['task:bare']
+
+    graph = ConflictGraph({task.id: task_footprint(task) for task in (refactor, sibling, docs, tree, component, bare)})
+    assert graph.neighbours('refactor') == {'tree'}
+    assert graph.neighbours('tree') == {'refactor', 'sibling'}
+    assert graph.neighbours('sibling') == {'tree'}
+    assert graph.neighbours('docs') == set()
+
+
+def test_claim_releases_its_stored_footprint_however_it_ends(db_session):
+    from app.models.entities import ResourceLock
+    from app.services.expiry import ExpiryService
+    from app.services.tasks import TaskService
+
+    AgentService(db_session).register(name='external', agent_type='cli', capabilities={}, repo_id=None)
+    finished = Task(goal='finished', description='d', scope={'files': ['src/a.py', 'src/b.py']})
+    lapsed = Task(goal='lapsed', description='d', scope={'files': ['docs/x.md'], 'resource_key': 'repo:docs'})
+    db_session.add_all([finished, lapsed])
+    db_session.commit()
+    OrchestratorEngine().run_once(db_session)
+
+    def active_keys() -> set[str]:
+        return {key for (key,) in db_session.query(ResourceLock.resource_key).filter(ResourceLock.state == 'active')}
+
+    assert active_keys() == {'file:src/a.py', 'file:src/b.py', 'repo:docs', 'file:docs/x.md'}
+
+    # The scope changes after dispatch; release follows what was locked, not the current scope.
+    finished.scope = {'files': ['src/c.py']}
+    db_session.commit()
+    TaskService(db_session).update(
+        task_id=finished.id, status='completed', progress=None, summary=None, blocked_reason=None
+    )
+    assert active_keys() == {'repo:docs', 'file:docs/x.md'}
+
+    claim = db_session.query(TaskClaim).filter(TaskClaim.task_id == lapsed.id).one()
+    claim.expires_at = utc_now() - timedelta(seconds=1)
+    db_session.commit()
+    ExpiryService(db_session).expire_claims(utc_now())
+
+    assert active_keys() == set()
+    assert {claim.state for claim in db_session.query(TaskClaim)} == {'released', 'expired'}
+
+
+def test_cycle_dispatches_a_maximal_non_conflicting_set(db_session):
+    from app.models.entities import ResourceLock
+
+    agents = AgentService(db_session)
+    for index in range(4):
+        agents.register(name=f'worker-{index}', agent_type='cli', capabilities={}, repo_id=None)
+    now = utc_now()
+    scopes = {
+        'wide': {'files': ['src/a.py', 'src/b.py']},
+        'narrow': {'files': ['src/b.py']},
+        'docs': {'files': ['docs/x.md']},
+        'tree': {'resource_key': 'file:src/'},
+    }
+    for offset, (goal, scope) in enumerate(scopes.items()):
+        db_session.add(Task(goal=goal, description='d', scope=scope, created_at=now + timedelta(seconds=offset)))
+    db_session.commit()
+
+    result = OrchestratorEngine().run_once(db_session, max_assignments=10)
+
+    dispatched = {db_session.get(Task, item['task_id']).goal for item in result['assignments']}
+    assert dispatched == {'wide', 'docs'}
+    locked = {lock.resource_key for lock in db_session.query(ResourceLock).filter(ResourceLock.state == 'active')}
+    assert locked == {'file:src/a.py', 'file:src/b.py', 'file:docs/x.md'}
+
+    # The deferred tasks stay blocked by the held locks until the wide task finishes.
+    assert OrchestratorEngine().run_once(db_session, max_assignments=10)['assignments'] == []
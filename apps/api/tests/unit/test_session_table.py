@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from sqlalchemy import event, select
+
+from app.models.entities import Agent, AgentSession
+from app.repositories.common import as_utc
+from app.services.agents import AgentService
+from app.services.orchestrator import OrchestratorEngine
+
+
+def _writes(engine) -> list[str]:
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, *args) -> None:
+        if not statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    return statements
+
+
+def test_heartbeats_are_coalesced_until_flush(db_session, engine):
+    service = AgentService(db_session)
+    agents = [
+        service.register(name=f'worker-{index}', agent_type='cli', capabilities={}, repo_id=None) for index in range(3)
+    ]
+    service.sessions.flush_seconds = 3600
+
+    writes = _writes(engine)
+    for _ in range(5):
+        for agent in agents:
+            beat = service.heartbeat(agent_id=agent.id, status='active', current_task=None)
+    assert writes == []
+    assert service.sessions.pending() == 3
+    assert as_utc(beat.last_heartbeat_at) == service.sessions.last_seen(beat.id)
+
+    assert service.flush_heartbeats() == 3
+    assert len([statement for statement in writes if statement.lstrip().upper().startswith('UPDATE')]) == 2
+    stored = db_session.execute(select(AgentSession).where(AgentSession.agent_id == beat.id)).scalar_one()
+    assert as_utc(stored.last_heartbeat_at) == service.sessions.last_seen(beat.id)
+
+
+def test_status_change_is_written_through(db_session):
+    service = AgentService(db_session)
+    agent = service.register(name='worker', agent_type='cli', capabilities={}, repo_id=None)
+    service.sessions.flush_seconds = 3600
+
+    service.heartbeat(agent_id=agent.id, status='busy', current_task=None)
+    db_session.expire_all()
+    assert db_session.get(Agent, agent.id).status == 'busy'
+    assert service.sessions.pending() == 0
+
+
+def test_active_workers_read_in_memory_liveness(db_session):
+    service = AgentService(db_session)
+    agent = service.register(name='worker', agent_type='cli', capabilities={}, repo_id=None)
+    service.sessions.flush_seconds = 3600
+    service.heartbeat(agent_id=agent.id, status='active', current_task=None)
+
+    workers = OrchestratorEngine._active_workers(db_session, exclude_agent_id='none')
+    assert [worker.id for worker in workers] == [agent.id]